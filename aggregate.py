@@ -0,0 +1,610 @@
+##
+# aggregate.py
+# 2026-10-18
+# Adds up what every till sold, per product and per day, so the kitchen knows what to make.
+
+# KaiUI - A cool little shop made for an assignment
+# Copyright (C) 2023  Sofia
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Usage:
+#   python aggregate.py --unix /tmp/orders.sock --summary demand.json
+#       tills started with --submit-to unix:/tmp/orders.sock send their orders here
+#   python aggregate.py --journal till1.jsonl --journal till2.jsonl --follow --summary demand.json
+#       reads the files tills write with --submit-to, and keeps reading as they grow
+#   python aggregate.py --simulate 8 --orders 5000
+#       load test, 8 made up tills on this machine sending as fast as they can
+#
+# The orders get parsed here, and their items are handed to a pool of processes, each of
+# which owns some of the products (picked by their product id). So every product is only
+# ever counted in one place and nothing has to be locked. The summary is put together by
+# asking every shard for its part.
+#
+# Memory stays bounded: only the last KEEP_DAYS dates are kept, older ones get dropped
+# (they're in the summaries written before), and only the last SEEN_IDS order ids are
+# remembered for throwing out orders a till sent twice.
+
+from collections import deque
+import argparse
+import json
+import multiprocessing
+import os
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+
+from order_server import UnixBatchHandler
+
+# Processes counting, each gets its own share of the products
+SHARDS = max((os.cpu_count() or 2) - 1, 1)
+
+# How many dates are kept, anything older gets dropped
+KEEP_DAYS = 7
+
+# How many order ids are remembered to spot duplicates
+SEEN_IDS = 100000
+
+# Items are sent to a shard in lists of this many
+SHARD_BATCH = 1000
+
+# Lists that can be waiting for a shard before ingesting has to wait for it to catch up
+SHARD_QUEUE = 64
+
+# How often items that didn't fill a whole list get sent anyway, in seconds
+FLUSH_INTERVAL = 0.1
+
+# How often the summary gets written, in seconds
+SUMMARY_INTERVAL = 5.0
+
+# How often files being followed are checked for more, in seconds
+POLL_INTERVAL = 0.2
+
+
+def shard_of(product_id: int, shards: int) -> int:
+    # Product ids are already a hash of the type and name, the same in every process
+    return product_id % shards
+
+
+def evict(table: dict, keep_days: int):
+    """Drops the buckets of table that are older than the newest keep_days dates"""
+    dates = sorted({date for date, _ in table})
+    if len(dates) <= keep_days:
+        return
+
+    oldest = dates[-keep_days]
+    for key in [key for key in table if key[0] < oldest]:
+        del table[key]
+
+
+def fold(table: dict, items: list[tuple], keep_days: int = KEEP_DAYS):
+    """
+    Adds items, (date, day, product_id, category, name, quantity, price_cents), into table,
+    which is (date, day) -> product_id -> [quantity, revenue_cents, category, name].
+    Products are told apart by their id, the category and name are only for showing
+    """
+    for date, day, product_id, category, name, quantity, cents in items:
+        bucket = table.get((date, day))
+        if bucket is None:
+            bucket = table[date, day] = {}
+            evict(table, keep_days)
+
+            # Older than anything kept
+            if (date, day) not in table:
+                continue
+
+        counts = bucket.get(product_id)
+        if counts is None:
+            bucket[product_id] = [quantity, quantity * cents, category, name]
+        else:
+            counts[0] += quantity
+            counts[1] += quantity * cents
+
+
+def _shard_main(inbox, outbox, keep_days: int):
+    """What every process in the pool runs"""
+    table = {}
+    while True:
+        message = inbox.get()
+        if message is None:
+            return
+
+        kind, payload = message
+        if kind == "items":
+            fold(table, payload, keep_days)
+        elif kind == "summary":
+            outbox.put(table)
+
+
+class Aggregator:
+    """
+    Takes orders as JSON lines (what submit.py sends) and gets them counted by the shards.
+    ingest can be called from any number of threads.
+    """
+
+    def __init__(self, shards: int = SHARDS, keep_days: int = KEEP_DAYS):
+        self.shards = shards
+        self.keep_days = keep_days
+
+        # Spawned and not forked, this process has threads that fork wouldn't copy properly
+        context = multiprocessing.get_context("spawn")
+        self._inboxes = [context.Queue(SHARD_QUEUE) for _ in range(shards)]
+        self._outboxes = [context.Queue() for _ in range(shards)]
+        self._processes = [
+            context.Process(
+                target=_shard_main,
+                args=(inbox, outbox, keep_days),
+                name=f"aggregate shard {i}",
+                daemon=True,
+            )
+            for i, (inbox, outbox) in enumerate(zip(self._inboxes, self._outboxes))
+        ]
+        for process in self._processes:
+            process.start()
+
+        self.lock = threading.Lock()
+
+        # Items not sent to their shard yet
+        self._buffers = [[] for _ in range(shards)]
+
+        # (date, day) -> [orders, revenue_cents], same dates as the shards keep
+        self._orders = {}
+
+        self._seen = set()
+        self._seen_order = deque()
+
+        self.orders = 0
+        self.items = 0
+        self.duplicates = 0
+        self.rejected = 0
+
+    def ingest(self, lines: list[bytes]):
+        """Counts some orders, one JSON line each. Lines that aren't orders get rejected"""
+        with self.lock:
+            for line in lines:
+                if line.strip():
+                    self._ingest(line)
+
+    def _ingest(self, line: bytes):
+        try:
+            record = json.loads(line)
+            order_id = record["id"]
+            date = time.strftime("%Y-%m-%d", time.localtime(record["created"]))
+            day = record["day"]
+            items = [
+                (
+                    date,
+                    day,
+                    int(item["product_id"]),
+                    item["category"],
+                    # Tills from before the pretty name was sent only have the plain one
+                    item.get("pretty_name", item["name"]),
+                    int(item["quantity"]),
+                    int(item["price_cents"]),
+                )
+                for item in record["items"]
+            ]
+            total = int(record["total_cents"])
+        except (ValueError, TypeError, KeyError, OverflowError):
+            self.rejected += 1
+            return
+
+        # Tills send a whole batch again if they didn't hear back, some of it can be repeats
+        if order_id in self._seen:
+            self.duplicates += 1
+            return
+
+        self._seen.add(order_id)
+        self._seen_order.append(order_id)
+        if len(self._seen_order) > SEEN_IDS:
+            self._seen.discard(self._seen_order.popleft())
+
+        counts = self._orders.get((date, day))
+        if counts is None:
+            counts = self._orders[date, day] = [0, 0]
+            evict(self._orders, self.keep_days)
+        counts[0] += 1
+        counts[1] += total
+
+        self.orders += 1
+        for item in items:
+            self.items += item[5]
+
+            shard = shard_of(item[2], self.shards)
+            buffer = self._buffers[shard]
+            buffer.append(item)
+            if len(buffer) >= SHARD_BATCH:
+                self._send(shard)
+
+    def _send(self, shard: int):
+        # Waits if the shard is behind, which in turn makes the tills wait for their "ok"
+        self._inboxes[shard].put(("items", self._buffers[shard]))
+        self._buffers[shard] = []
+
+    def flush(self):
+        """Sends the shards whatever items are still waiting here"""
+        with self.lock:
+            for shard, buffer in enumerate(self._buffers):
+                if buffer:
+                    self._send(shard)
+
+    def stats(self) -> dict:
+        return {
+            "orders": self.orders,
+            "items": self.items,
+            "duplicates": self.duplicates,
+            "rejected": self.rejected,
+        }
+
+    def summary(self, top: int | None = None) -> dict:
+        """
+        Everything counted so far, per date, with the products sold most first.
+        top only keeps that many products per date
+        """
+        with self.lock:
+            for shard, buffer in enumerate(self._buffers):
+                if buffer:
+                    self._send(shard)
+
+            # The shards do their queue in order, so their answer has everything sent above
+            for inbox in self._inboxes:
+                inbox.put(("summary", None))
+
+            orders = {key: list(counts) for key, counts in self._orders.items()}
+            stats = self.stats()
+
+            # Every product is only in one shard, so merging is just putting them together
+            table = {}
+            for outbox in self._outboxes:
+                for key, bucket in outbox.get().items():
+                    table.setdefault(key, {}).update(bucket)
+
+        days = []
+        # Orders with no day picked have None for it, and some products no category
+        for date, day in sorted(set(table) | set(orders), key=lambda k: (k[0], k[1] or "")):
+            bucket = table.get((date, day), {})
+            products = sorted(
+                (
+                    {
+                        "product_id": product_id,
+                        "category": category,
+                        "name": name,
+                        "quantity": quantity,
+                        "revenue_cents": cents,
+                    }
+                    for product_id, (quantity, cents, category, name) in bucket.items()
+                ),
+                key=lambda p: (
+                    -p["quantity"],
+                    p["category"] or "",
+                    p["name"],
+                    p["product_id"],
+                ),
+            )
+            order_count, revenue = orders.get((date, day), (0, 0))
+            days.append(
+                {
+                    "date": date,
+                    "day": day,
+                    "orders": order_count,
+                    "quantity": sum(p["quantity"] for p in products),
+                    "revenue_cents": revenue,
+                    "products": products[:top] if top is not None else products,
+                }
+            )
+
+        return {"created": time.time(), **stats, "days": days}
+
+    def close(self):
+        self.flush()
+        for inbox in self._inboxes:
+            inbox.put(None)
+        for process in self._processes:
+            process.join()
+
+    def follow(self, path: str, stop: threading.Event | None = None):
+        """
+        Counts the orders in a file written by submit.JournalSink. With stop it keeps reading
+        as the file grows until stop is set, otherwise it returns at the end of the file
+        """
+        rest = b""
+        with open(path, "rb") as f:
+            while True:
+                data = f.read(1 << 20)
+                if data:
+                    # Only whole lines, the last one might still be getting written
+                    data = rest + data
+                    end = data.rfind(b"\n") + 1
+                    rest = data[end:]
+                    self.ingest(data[:end].splitlines())
+                    continue
+
+                if stop is None or stop.wait(POLL_INTERVAL):
+                    return
+
+
+class AggregatorServer(socketserver.ThreadingUnixStreamServer):
+    """Listens where tills send their orders with --submit-to unix:path"""
+
+    daemon_threads = True
+
+    def __init__(self, path: str, aggregator: Aggregator):
+        super().__init__(path, UnixBatchHandler)
+        self.aggregator = aggregator
+
+    def received(self, body: bytes):
+        self.aggregator.ingest(body.splitlines())
+
+
+def write_summary(summary: dict, path: str):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=1)
+
+    os.replace(tmp, path)
+
+
+def _till_main(path: str, count: int, seed: int, catalogue_size: int, go, results):
+    """One made up till for --simulate, sends count random orders through submit.py"""
+    import random
+
+    import bench
+    import orders
+    import submit
+    from products import Day
+
+    products = bench.make_products(catalogue_size)
+    everything = [p for category in products.values() for p in category]
+    days = list(Day)
+    rnd = random.Random(seed)
+
+    engine = orders.OrderEngine()
+    queue = submit.SubmissionQueue(submit.UnixSocketSink(path))
+
+    sent = quantity = cents = 0
+    results.put(("ready", seed))
+    go.wait()
+
+    for n in range(count):
+        engine.set_day(days[n % len(days)])
+        engine.apply(
+            (rnd.choice(everything), rnd.randint(1, 3))
+            for _ in range(rnd.randint(1, 8))
+        )
+        if not engine.order:
+            continue
+
+        record = submit.order_record(engine.order, engine.day)
+        while not queue.submit(record):
+            # Full, a real till would tell someone. This one just waits for room
+            time.sleep(0.001)
+
+        sent += 1
+        quantity += sum(item["quantity"] for item in record["items"])
+        cents += record["total_cents"]
+        engine.clear()
+
+    queue.close()
+    results.put(("done", sent, quantity, cents, queue.stats()["failed"]))
+
+
+def simulate(tills: int, count: int, shards: int, catalogue_size: int) -> dict:
+    """
+    Runs tills processes sending count orders each to an aggregator, as fast as they can.
+    Gives how long it took and if everything added up
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "aggregate.sock")
+        aggregator = Aggregator(shards)
+        server = AggregatorServer(path, aggregator)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        context = multiprocessing.get_context("spawn")
+        go = context.Event()
+        results = context.Queue()
+        processes = [
+            context.Process(
+                target=_till_main,
+                args=(path, count, seed, catalogue_size, go, results),
+                daemon=True,
+            )
+            for seed in range(tills)
+        ]
+        for process in processes:
+            process.start()
+
+        # Starting python and making the products isn't what's being measured
+        for _ in processes:
+            results.get()
+
+        start = time.perf_counter()
+        go.set()
+
+        sent = quantity = cents = failed = 0
+        for _ in processes:
+            _, *done = results.get()
+            sent += done[0]
+            quantity += done[1]
+            cents += done[2]
+            failed += done[3]
+
+        # Every till got its "ok"s, so it's all been ingested. The summary waits for the shards
+        summary = aggregator.summary()
+        seconds = time.perf_counter() - start
+
+        for process in processes:
+            process.join()
+
+        server.shutdown()
+        server.server_close()
+        aggregator.close()
+
+    counted = sum(day["quantity"] for day in summary["days"])
+    revenue = sum(
+        p["revenue_cents"] for day in summary["days"] for p in day["products"]
+    )
+    return {
+        "tills": tills,
+        "shards": shards,
+        "seconds": seconds,
+        "orders": summary["orders"],
+        "items": summary["items"],
+        "orders_per_second": summary["orders"] / seconds,
+        "items_per_second": summary["items"] / seconds,
+        "failed": failed,
+        "duplicates": summary["duplicates"],
+        "adds_up": (summary["orders"], counted, revenue) == (sent, quantity, cents),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Adds up the orders of many tills, per product and per day"
+    )
+    parser.add_argument(
+        "--unix", metavar="PATH", help="listen for tills on this unix socket"
+    )
+    parser.add_argument(
+        "--journal",
+        metavar="FILE",
+        action="append",
+        default=[],
+        help="read the orders a till wrote to FILE, can be given more than once",
+    )
+    parser.add_argument(
+        "--follow",
+        action="store_true",
+        help="keep reading the --journal files as they grow",
+    )
+    parser.add_argument(
+        "--summary",
+        metavar="FILE",
+        help="write the summary to FILE as JSON every --interval seconds and at the end, "
+        "otherwise it gets printed at the end",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=SUMMARY_INTERVAL,
+        help="seconds between summaries (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--top", type=int, help="only the best selling N products of every date"
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=SHARDS,
+        help="processes doing the counting (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--keep-days",
+        type=int,
+        default=KEEP_DAYS,
+        help="how many dates are kept (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--simulate",
+        type=int,
+        metavar="TILLS",
+        help="load test with this many made up tills instead, prints how fast it went",
+    )
+    parser.add_argument(
+        "--orders",
+        type=int,
+        default=2000,
+        help="orders per till for --simulate (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--products",
+        type=int,
+        default=1000,
+        help="catalogue size for --simulate (default: %(default)s)",
+    )
+    args = parser.parse_args()
+
+    if args.simulate:
+        json.dump(
+            simulate(args.simulate, args.orders, args.shards, args.products),
+            sys.stdout,
+            indent=1,
+        )
+        print()
+        return
+
+    if not args.unix and not args.journal:
+        parser.error("nothing to read orders from, give --unix or --journal")
+
+    aggregator = Aggregator(args.shards, args.keep_days)
+    stop = threading.Event()
+
+    server = None
+    if args.unix:
+        server = AggregatorServer(args.unix, aggregator)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    followers = [
+        threading.Thread(
+            target=aggregator.follow,
+            args=(path, stop if args.follow else None),
+            daemon=True,
+        )
+        for path in args.journal
+    ]
+    for follower in followers:
+        follower.start()
+
+    print(
+        f"aggregate: {args.shards} shards, reading "
+        + ", ".join([f"unix:{args.unix}"] * bool(args.unix) + args.journal),
+        file=sys.stderr,
+    )
+
+    try:
+        last_summary = time.monotonic()
+        while server is not None or any(f.is_alive() for f in followers):
+            time.sleep(FLUSH_INTERVAL)
+            aggregator.flush()
+
+            if time.monotonic() - last_summary >= args.interval:
+                last_summary = time.monotonic()
+                if args.summary:
+                    write_summary(aggregator.summary(args.top), args.summary)
+                print(f"aggregate: {aggregator.stats()}", file=sys.stderr)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+            os.unlink(args.unix)
+
+        for follower in followers:
+            follower.join()
+
+        summary = aggregator.summary(args.top)
+        aggregator.close()
+
+        if args.summary:
+            write_summary(summary, args.summary)
+        else:
+            json.dump(summary, sys.stdout, indent=1)
+            print()
+
+
+if __name__ == "__main__":
+    main()
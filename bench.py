@@ -0,0 +1,404 @@
+##
+# bench.py
+# 2026-10-18
+# Benchmarks for building the window and clicking around in it, no screen needed.
+
+# KaiUI - A cool little shop made for an assignment
+# Copyright (C) 2023  Sofia
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Usage:
+#   python bench.py                                 everything, as a table
+#   python bench.py --output new.json               and save the results
+#   python bench.py --baseline old.json             compare, exits with 1 if anything got slower
+#   python bench.py --products 20,1000 --lines 1    only some sizes
+#
+# Every group of benchmarks runs in its own process, so they don't warm each other up and
+# the peak memory (max RSS) of each group means something.
+
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+PRODUCT_SIZES = [20, 1000, 10000, 100000]
+ORDER_LINES = [1, 100, 1000, 10000]
+
+# How many times each benchmark is run, the median is what gets compared
+REPEAT = 5
+
+# Clicks per run of the click benchmarks
+CLICKS = 200
+
+# How much slower than the baseline something can be before it counts as a regression
+TOLERANCE = 0.25
+
+# Anything quicker than this is noise, it doesn't get flagged whatever the ratio
+MIN_MS = 0.05
+
+
+def make_products(size: int, seed: int = 0) -> dict:
+    """A made up catalogue with size products, split evenly over the categories"""
+    # Here and not at the top, so --help doesn't need the whole shop
+    import catalogue
+    from products import SushiType, ProductAttribute, Day
+
+    rnd = random.Random(seed)
+    keys = list(catalogue.CATEGORY_CLASSES)
+    attributes = [
+        ProductAttribute.NONE,
+        ProductAttribute.VEGAN | ProductAttribute.VEGETARIAN,
+        ProductAttribute.VEGETARIAN,
+        ProductAttribute.HAS_SUGAR,
+    ]
+    days = list(Day)
+
+    columns = {key: [] for key in keys}
+    for i in range(size):
+        key = keys[i % len(keys)]
+        name = f"{key} {i}"
+        price = rnd.randrange(100, 2000) / 100
+        attribute = rnd.choice(attributes)
+
+        if key == "sushi":
+            columns[key].append((SushiType.PIECES, name, price, attribute, 6))
+        elif key == "specials":
+            columns[key].append(
+                (days[i % len(days)], "Nowhere", name, price, attribute)
+            )
+        else:
+            columns[key].append((name, price, attribute))
+
+    products = catalogue.build_products(columns)
+    return {key: products.get(key, []) for key in keys}
+
+
+def measure(func, repeat: int = REPEAT, setup=None) -> list[float]:
+    """Runs func repeat times, gives how long each took in ms. setup isn't timed"""
+    times = []
+    for _ in range(repeat):
+        state = setup() if setup is not None else None
+
+        start = time.perf_counter()
+        func(state)
+        times.append((time.perf_counter() - start) * 1000)
+
+    return times
+
+
+class Group:
+    """Runs the benchmarks of a group, in a process of its own"""
+
+    def __init__(self, products: int, lines: int, virtualized: bool | None):
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+        from PySide6 import QtWidgets
+        import main
+
+        self.main = main
+        self.app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+        self.size = products
+        self.lines = lines
+        self.virtualized = (
+            products > main.VIRTUALIZE_OVER if virtualized is None else virtualized
+        )
+        self.results = []
+
+    def record(self, name: str, times: list[float], per: int = 1, **extra):
+        """per is how many operations a run was, the times get divided by it"""
+        times = [t / per for t in times]
+        self.results.append(
+            {
+                "name": name,
+                "products": self.size,
+                "lines": self.lines,
+                "virtualized": self.virtualized,
+                "median_ms": statistics.median(times),
+                "min_ms": min(times),
+                "runs": len(times),
+                **extra,
+            }
+        )
+
+    def window(self, products=None):
+        return self.main.KaiUI(
+            products if products is not None else make_products(self.size),
+            virtualized=self.virtualized,
+        )
+
+    def flush(self):
+        # Lets Qt do whatever got posted, like deleting windows
+        self.app.processEvents()
+
+    def build(self):
+        """Building the window, the tabs, and changing the day"""
+        products = make_products(self.size)
+
+        windows = []
+
+        def construct(_):
+            windows.append(self.window(products))
+
+        self.record("construct", measure(construct))
+        self.close(windows)
+
+        # setup_tab_widget of every tab, the first one is already done by the constructor
+        for key in self.main.KaiUI.ACCEPTABLE_KEYS:
+            times = measure(
+                lambda w: w.setup_tab_widget(key),
+                setup=lambda: windows.append(self.window(products)) or windows[-1],
+            )
+            self.close(windows)
+            self.record(f"setup_tab_widget[{key}]", times)
+
+        w = self.window(products)
+        w.build_tab("specials")
+        days = range(w.order_info_day_combobox.count())
+
+        def change_day(_):
+            for idx in days:
+                w.day_combobox_currentIndexChanged(idx)
+
+        self.record("day_combobox_currentIndexChanged", measure(change_day), len(days))
+        self.close([w])
+
+    def order(self):
+        """Clicking add and remove, and updating the total, with self.lines in the order"""
+        products = make_products(self.size)
+        everything = [
+            p for key in ("sandwiches", "sushi", "drinks") for p in products[key]
+        ]
+
+        w = self.window(products)
+        w.order_engine.apply((p, 1) for p in everything[: self.lines])
+        in_order = everything[: self.lines]
+        not_in_order = everything[self.lines :] or everything[:1]
+
+        rnd = random.Random(1)
+
+        # The sidebar gets updated on the next go of the event loop, so every click here
+        # gets its own update straight after, like clicks far enough apart would
+        def clicks(func, pick):
+            def run(_):
+                for _ in range(CLICKS):
+                    func(pick())
+                    w.flush_order_info()
+
+            return run
+
+        picks = lambda: rnd.choice(in_order)
+        self.record(
+            "product_button_add_clicked",
+            measure(clicks(w.product_button_add_clicked, picks)),
+            CLICKS,
+        )
+        self.record(
+            "product_button_remove_clicked",
+            measure(clicks(w.product_button_remove_clicked, picks)),
+            CLICKS,
+        )
+
+        # Adding something new makes a row, taking it out again removes it
+        def new_line(_):
+            for _ in range(CLICKS):
+                product = rnd.choice(not_in_order)
+                w.product_button_add_clicked(product)
+                w.flush_order_info()
+                w.product_button_remove_clicked(product)
+                w.flush_order_info()
+
+        self.record("add_remove_new_line", measure(new_line), CLICKS)
+
+        # Clicks faster than the event loop goes around (or a barcode scanner), which all
+        # end up in one update
+        def burst(_):
+            for _ in range(CLICKS):
+                w.product_button_add_clicked(picks())
+            w.flush_order_info()
+
+        self.record("add_burst", measure(burst), CLICKS)
+
+        def price(_):
+            for _ in range(CLICKS):
+                w.update_price_label()
+
+        self.record("update_price_label", measure(price), CLICKS)
+        self.close([w])
+
+    def close(self, windows: list):
+        for w in windows:
+            w.deleteLater()
+        windows.clear()
+        self.flush()
+
+
+def run_group(kind: str, products: int, lines: int, virtualized: bool | None) -> list:
+    """Runs a group in this process and gives its results, with the peak RSS in each"""
+    group = Group(products, lines, virtualized)
+    getattr(group, kind)()
+
+    # Kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak //= 1024
+
+    for result in group.results:
+        result["peak_rss_kb"] = peak
+
+    return group.results
+
+
+def groups(product_sizes: list[int], order_lines: list[int]) -> list[tuple]:
+    todo = [("build", size, 0) for size in product_sizes]
+
+    # The order only has one of each product, and drinks, sushi and sandwiches are 3/4 of them
+    for size in product_sizes:
+        for lines in order_lines:
+            if lines <= size * 3 // 4:
+                todo.append(("order", size, lines))
+
+    return todo
+
+
+def key(result: dict) -> tuple:
+    return result["name"], result["products"], result["lines"], result["virtualized"]
+
+
+def compare(results: list, baseline: list, tolerance: float) -> list:
+    """Adds the ratio to the baseline to every result, gives the ones that got slower"""
+    old = {key(r): r for r in baseline}
+    slower = []
+
+    for result in results:
+        before = old.get(key(result))
+        if before is None or not before["median_ms"]:
+            continue
+
+        result["baseline_ms"] = before["median_ms"]
+        result["ratio"] = result["median_ms"] / before["median_ms"]
+        if result["ratio"] > 1 + tolerance and result["median_ms"] > MIN_MS:
+            slower.append(result)
+
+    return slower
+
+
+def print_table(results: list):
+    print(
+        f"{'benchmark':<36} {'products':>8} {'lines':>6} {'virt':>4} "
+        f"{'median ms':>11} {'min ms':>10} {'rss MB':>7} {'vs base':>8}"
+    )
+    for r in results:
+        ratio = f"{r['ratio']:.2f}x" if "ratio" in r else ""
+        print(
+            f"{r['name']:<36} {r['products']:>8} {r['lines']:>6} "
+            f"{'yes' if r['virtualized'] else 'no':>4} {r['median_ms']:>11.3f} "
+            f"{r['min_ms']:>10.3f} {r['peak_rss_kb'] / 1024:>7.0f} {ratio:>8}"
+        )
+
+
+def sizes(text: str) -> list[int]:
+    return [int(size) for size in text.split(",") if size]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for KaiUI")
+    parser.add_argument(
+        "--products",
+        type=sizes,
+        default=PRODUCT_SIZES,
+        help="catalogue sizes, comma separated (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--lines",
+        type=sizes,
+        default=ORDER_LINES,
+        help="order sizes, comma separated (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--virtualized",
+        action=argparse.BooleanOptionalAction,
+        help="force virtualized tabs on or off, by default it's the same as the shop",
+    )
+    parser.add_argument("--output", help="write the results here as JSON")
+    parser.add_argument(
+        "--baseline", help="JSON from an earlier --output to compare to"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=TOLERANCE,
+        help="how much slower counts as a regression (default: %(default)s)",
+    )
+    parser.add_argument("--group", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # A single group, run by the parent process below. Prints its results as JSON
+    if args.group:
+        kind, products, lines = args.group
+        json.dump(
+            run_group(kind, int(products), int(lines), args.virtualized), sys.stdout
+        )
+        return
+
+    results = []
+    for kind, products, lines in groups(args.products, args.lines):
+        print(f"bench: {kind} {products} products {lines} lines", file=sys.stderr)
+
+        command = [sys.executable, __file__, "--group", kind, str(products), str(lines)]
+        if args.virtualized is not None:
+            command.append("--virtualized" if args.virtualized else "--no-virtualized")
+
+        done = subprocess.run(command, stdout=subprocess.PIPE, text=True)
+        if done.returncode:
+            print(f"bench: {kind} {products} {lines} failed", file=sys.stderr)
+            continue
+
+        results.extend(json.loads(done.stdout))
+
+    slower = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            slower = compare(results, json.load(f)["results"], args.tolerance)
+
+    print_table(results)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "created": time.time(),
+                    "results": results,
+                },
+                f,
+                indent=1,
+            )
+
+    if slower:
+        print(f"\n{len(slower)} got slower than the baseline:")
+        print_table(slower)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
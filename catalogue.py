@@ -0,0 +1,532 @@
+##
+# catalogue.py
+# 2026-10-18
+# Reads the catalogue from JSON Lines or CSV files, a chunk at a time.
+
+# KaiUI - A cool little shop made for an assignment
+# Copyright (C) 2023  Sofia
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# A record looks like this (as a JSON line):
+#   {"category": "sushi", "name": "Chicken", "price": 4.5, "attributes": ["vegan"],
+#    "sushi_type": "pieces", "pieces": 3}
+# Specials also have "day" and "country". CSV files use the same names for the header,
+# with the attributes separated by "|".
+
+from collections.abc import Iterator
+import csv
+import functools
+import json
+import math
+import operator
+import os
+
+from products import (
+    SushiType,
+    ProductAttribute,
+    Day,
+    Product,
+    Sandwich,
+    Sushi,
+    Drink,
+    Special,
+    ALL_DAYS,
+    DAY_BITS,
+)
+from search import iter_bits, mask_from_ids
+
+# Which class the products of each category are
+CATEGORY_CLASSES = {
+    "sandwiches": Sandwich,
+    "sushi": Sushi,
+    "drinks": Drink,
+    "specials": Special,
+}
+
+# And the other way around, the category of a product is CATEGORY_KEYS[type(product)]
+CATEGORY_KEYS = {cls: key for key, cls in CATEGORY_CLASSES.items()}
+
+# The first chunk is small so the window has something to show straight away,
+# after that bigger chunks mean less signals going around
+FIRST_CHUNK_SIZE = 200
+CHUNK_SIZE = 5000
+
+
+class CatalogueError(ValueError):
+    """A single bad record. The line is where it is in the file, starting from 1"""
+
+    def __init__(self, line: int, message: str):
+        super().__init__(f"line {line}: {message}")
+        self.line = line
+        self.message = message
+
+
+def parse_attributes(attributes) -> ProductAttribute:
+    # CSV gives a string, JSON gives a list
+    if isinstance(attributes, str):
+        attributes = attributes.split("|")
+
+    try:
+        return _attributes_from_names(tuple(attributes or ()))
+    except TypeError:
+        raise ValueError(f"bad attributes {attributes!r}")
+
+
+@functools.lru_cache(maxsize=None)
+def _attributes_from_names(names: tuple[str, ...]) -> ProductAttribute:
+    # There's only a few different combinations in a catalogue, so this is cached.
+    # Or-ing flags together is slow enough to show up when there's a million of them
+    flags = ProductAttribute.NONE
+    for attribute in names:
+        if not attribute:
+            continue
+
+        try:
+            flags |= ProductAttribute[attribute.strip().upper()]
+        except (KeyError, AttributeError):
+            raise ValueError(f"unknown attribute {attribute!r}")
+
+    return flags
+
+
+def parse_day(day) -> Day:
+    try:
+        return Day[str(day).strip().upper()]
+    except KeyError:
+        raise ValueError(f"unknown day {day!r}")
+
+
+# Where the name is in the rows parse_record gives, for each category
+_NAME_COLUMN = {"sushi": 1, "specials": 2}
+
+
+def row_key(category: str, row: tuple):
+    """
+    What tells a row from parse_record apart from the others in its category. The same
+    things the product's id comes from, so sushi go by their type and pieces too
+    """
+    if category == "sushi":
+        type_, name, _, _, pieces = row
+        return name, type_, pieces
+
+    return row[_NAME_COLUMN.get(category, 0)]
+
+
+def parse_record(record: dict) -> tuple[str, tuple]:
+    """
+    Checks a record and turns it into its category and the arguments for bulk_create of the
+    category's class, as a tuple in the same order. Raises ValueError if anything is wrong.
+    """
+    category = record.get("category")
+    if category not in CATEGORY_CLASSES:
+        raise ValueError(f"unknown category {category!r}")
+
+    name = record.get("name")
+    if not isinstance(name, str) or not name:
+        raise ValueError("name is missing")
+
+    try:
+        price = float(record.get("price"))
+    except (TypeError, ValueError):
+        raise ValueError(f"bad price {record.get('price')!r}")
+
+    # NaN and inf aren't prices, and inf can't be turned into cents
+    if price < 0 or not math.isfinite(price):
+        raise ValueError(f"bad price {record.get('price')!r}")
+
+    attributes = parse_attributes(record.get("attributes"))
+
+    if category == "sushi":
+        try:
+            type_ = SushiType[str(record.get("sushi_type")).strip().upper()]
+        except KeyError:
+            raise ValueError(f"unknown sushi type {record.get('sushi_type')!r}")
+
+        try:
+            # Bowls don't have pieces, whatever the file says
+            pieces = 0
+            if type_ is SushiType.PIECES:
+                pieces = int(record.get("pieces") or 0)
+        except (TypeError, ValueError, OverflowError):
+            raise ValueError(f"bad pieces {record.get('pieces')!r}")
+
+        # Snapshots keep it as an unsigned 32 bit number
+        if not 0 <= pieces < 1 << 32:
+            raise ValueError(f"bad pieces {record.get('pieces')!r}")
+
+        return category, (type_, name, price, attributes, pieces)
+
+    if category == "specials":
+        country = record.get("country")
+        if not isinstance(country, str) or not country:
+            raise ValueError("country is missing")
+
+        return category, (
+            parse_day(record.get("day")),
+            country,
+            name,
+            price,
+            attributes,
+        )
+
+    return category, (name, price, attributes)
+
+
+def read_records(path: str) -> Iterator[tuple[int, dict | Exception]]:
+    """
+    Gives (line, record) for every record in a .csv or JSON Lines file. If a line can't even
+    be read the exception is given instead of the record, so the caller can report it.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".csv"):
+            reader = csv.DictReader(f)
+            for record in reader:
+                yield reader.line_num, record
+            return
+
+        for line, text in enumerate(f, 1):
+            if not text.strip():
+                continue
+
+            try:
+                yield line, json.loads(text)
+            except json.JSONDecodeError as e:
+                yield line, e
+
+
+def build_products(columns: dict[str, list[tuple]]) -> dict[str, list[Product]]:
+    """Turns the rows from parse_record into products, a whole category at a time"""
+    products = {}
+    for category, rows in columns.items():
+        if rows:
+            products[category] = CATEGORY_CLASSES[category].bulk_create(*zip(*rows))
+
+    return products
+
+
+def iter_rows(path: str) -> Iterator[tuple[str, tuple] | CatalogueError]:
+    """
+    Gives (category, row) from parse_record for every record, or a CatalogueError for the
+    ones that are wrong. A product can only be in a category once (see row_key), two of
+    them would have the same id.
+    """
+    # (category, row_key) -> line it was first on
+    seen = {}
+
+    for line, record in read_records(path):
+        if isinstance(record, Exception):
+            yield CatalogueError(line, str(record))
+            continue
+
+        try:
+            if not isinstance(record, dict):
+                raise ValueError("record is not an object")
+
+            category, row = parse_record(record)
+        except ValueError as e:
+            yield CatalogueError(line, str(e))
+            continue
+
+        first = seen.setdefault((category, row_key(category, row)), line)
+        if first != line:
+            name = row[_NAME_COLUMN.get(category, 0)]
+            yield CatalogueError(
+                line, f"{name!r} is already in {category} on line {first}"
+            )
+            continue
+
+        yield category, row
+
+
+def read_rows(path: str) -> tuple[dict[str, list[tuple]], list[CatalogueError]]:
+    """The rows of the whole file by category, without making any products"""
+    columns = {key: [] for key in CATEGORY_CLASSES}
+    errors = []
+
+    for row in iter_rows(path):
+        if isinstance(row, CatalogueError):
+            errors.append(row)
+        else:
+            columns[row[0]].append(row[1])
+
+    return columns, errors
+
+
+def iter_row_chunks(
+    path: str, first_chunk_size=FIRST_CHUNK_SIZE, chunk_size=CHUNK_SIZE
+) -> Iterator[tuple[dict[str, list[tuple]], list[CatalogueError]]]:
+    """
+    Reads the catalogue bit by bit. Every chunk is the rows from parse_record, by category,
+    and the records that were wrong. A bad record never stops the rest from loading.
+    """
+    columns = {key: [] for key in CATEGORY_CLASSES}
+    errors = []
+    size = 0
+    limit = first_chunk_size
+
+    for row in iter_rows(path):
+        if isinstance(row, CatalogueError):
+            errors.append(row)
+            continue
+
+        category, row = row
+        columns[category].append(row)
+        size += 1
+
+        if size >= limit:
+            yield columns, errors
+
+            columns = {key: [] for key in CATEGORY_CLASSES}
+            errors = []
+            size = 0
+            limit = chunk_size
+
+    if size or errors:
+        yield columns, errors
+
+
+def iter_chunks(
+    path: str, first_chunk_size=FIRST_CHUNK_SIZE, chunk_size=CHUNK_SIZE
+) -> Iterator[tuple[dict[str, list[Product]], list[CatalogueError]]]:
+    """iter_row_chunks, but with the products made from the rows"""
+    for columns, errors in iter_row_chunks(path, first_chunk_size, chunk_size):
+        yield build_products(columns), errors
+
+
+def estimate_size(path: str, sample: int = 1 << 16) -> int:
+    """
+    Roughly how many products are in the file, from how long the lines at the start are.
+    Good enough to pick how to show them before the file has been read.
+    """
+    try:
+        total = os.path.getsize(path)
+        with open(path, "rb") as f:
+            head = f.read(sample)
+    except OSError:
+        return 0
+
+    lines = head.count(b"\n")
+    if len(head) == total or not lines:
+        return lines
+
+    return total * lines // len(head)
+
+
+def load(path: str) -> tuple[dict[str, list[Product]], list[CatalogueError]]:
+    """Reads the whole catalogue in one go, for when there's no window to keep responsive"""
+    products = {key: [] for key in CATEGORY_CLASSES}
+    errors = []
+
+    for chunk, chunk_errors in iter_chunks(path):
+        for key, chunk_products in chunk.items():
+            products[key].extend(chunk_products)
+        errors.extend(chunk_errors)
+
+    return products, errors
+
+
+def update_product(product: Product, new: Product):
+    """
+    Makes product the same as new, in place. Anything pointing at product (like an order)
+    keeps pointing at the same object and just sees the new price and so on
+    """
+    for cls in type(new).__mro__:
+        for slot in getattr(cls, "__slots__", ()):
+            if hasattr(new, slot):
+                setattr(product, slot, getattr(new, slot))
+            elif hasattr(product, slot):
+                # Like pieces, which bowls don't have
+                delattr(product, slot)
+
+
+class CatalogueDiff:
+    """
+    What changed between two reads of a catalogue file, by category. Rows are indexes into
+    the products lists as they were before, like KaiUI.products.
+    """
+
+    def __init__(self):
+        # Category -> [(row, product with what it is now)]
+        self.changed = {}
+
+        # Category -> rows that are gone, from the last one to the first so they can be
+        # deleted one after the other
+        self.removed = {}
+
+        # Category -> new products, they go at the end
+        self.added = {}
+
+    def __bool__(self):
+        return bool(self.changed or self.removed or self.added)
+
+    def counts(self) -> tuple[int, int, int]:
+        """How many products were changed, removed and added"""
+        return tuple(
+            sum(map(len, d.values())) for d in (self.changed, self.removed, self.added)
+        )
+
+
+class CatalogueTracker:
+    """
+    Remembers the rows of a catalogue in the same order as the products lists the window
+    has, so the file can be read again and turned into a CatalogueDiff without making a
+    product for everything that stayed the same. Products are matched by category and
+    row_key, the same way their ids are.
+    """
+
+    def __init__(self, columns: dict[str, list[tuple]]):
+        self.columns = {key: list(columns.get(key, [])) for key in CATEGORY_CLASSES}
+
+    def diff(self, columns: dict[str, list[tuple]]) -> CatalogueDiff:
+        """What changed since last time, remembering the new rows for next time"""
+        diff = CatalogueDiff()
+
+        for key in CATEGORY_CLASSES:
+            old = self.columns[key]
+            new = columns.get(key, [])
+            # Only ever one of each in a category, iter_rows makes sure of that
+            new_by_key = {row_key(key, row): row for row in new}
+
+            kept = []
+            changed = []
+            removed = []
+            for idx, row in enumerate(old):
+                new_row = new_by_key.pop(row_key(key, row), None)
+                if new_row is None:
+                    removed.append(idx)
+                    continue
+
+                if new_row != row:
+                    changed.append((idx, new_row))
+                kept.append(new_row)
+
+            # Whatever didn't get matched is new, in the order it's in the file
+            added = [row for row in new if row_key(key, row) in new_by_key]
+
+            cls = CATEGORY_CLASSES[key]
+            if changed:
+                products = cls.bulk_create(*zip(*(row for _, row in changed)))
+                diff.changed[key] = [
+                    (idx, product) for (idx, _), product in zip(changed, products)
+                ]
+            if removed:
+                diff.removed[key] = removed[::-1]
+            if added:
+                diff.added[key] = cls.bulk_create(*zip(*added))
+
+            self.columns[key] = kept + added
+
+        return diff
+
+
+_get_days = operator.attrgetter("days")
+
+
+class DayIndex:
+    """
+    Which products can't be ordered on which day, for every category, worked out once
+    instead of every time the day changes. Every category has a bitset per Day of the rows
+    that can't be ordered that day, bit i being row i. Most products can be ordered any day
+    so they're mostly empty.
+
+    Rows are indexes into the products lists, like KaiUI.products. The lists are kept, not
+    copied, and a category only gets indexed the first time it's asked about, so a tab
+    nobody opens costs nothing. The index has to be made again if rows get taken out.
+    """
+
+    def __init__(self, products: dict[str, list[Product]] | None = None):
+        self.products = {}
+
+        # Category -> how many of its rows are in the bitsets
+        self._indexed = {}
+
+        # (category, day) -> bitset of the rows that can't be ordered that day.
+        # None is a day too, see DAY_BITS
+        self._blocked = {}
+
+        # Day -> ids of every product that can't be ordered that day
+        self._unavailable_ids = {}
+
+        for key, category in (products or {}).items():
+            self.add(key, category)
+
+    def add(self, key: str, products: list[Product]):
+        """Adds the list of a category, call it again when the list gets longer"""
+        self.products[key] = products
+        self._unavailable_ids.clear()
+
+    def _catch_up(self, key: str):
+        """Indexes the rows of a category that aren't yet"""
+        products = self.products.get(key)
+        first_row = self._indexed.get(key, 0)
+        if products is None or first_row >= len(products):
+            return
+
+        # Snapshots read it off their day column, without making every product
+        limited_days = getattr(products, "limited_days", None)
+        if limited_days is not None:
+            limited = limited_days(first_row).items()
+        else:
+            new = products[first_row:]
+            limited = ()
+
+            # Only classes that work it out per product (or aren't every day) need every
+            # product looked at, which is one pass in C for the rest
+            if any(cls.days != ALL_DAYS for cls in set(map(type, new))):
+                limited = enumerate(map(_get_days, new), first_row)
+
+        # There's only a few different sets of days, so the rows get grouped by them
+        # and every group is one bitset
+        rows_by_days = {}
+        for row, days in limited:
+            if days != ALL_DAYS:
+                rows_by_days.setdefault(days, []).append(row)
+
+        masks = {days: mask_from_ids(rows) for days, rows in rows_by_days.items()}
+        for day, bit in DAY_BITS.items():
+            blocked = self._blocked.get((key, day), 0)
+            for days, mask in masks.items():
+                if days & bit != bit:
+                    blocked |= mask
+
+            self._blocked[(key, day)] = blocked
+
+        self._indexed[key] = len(products)
+        if masks:
+            self._unavailable_ids.clear()
+
+    def blocked(self, key: str, day: Day | None) -> int:
+        """The rows of a category that can't be ordered on day, as a bitset"""
+        self._catch_up(key)
+        return self._blocked.get((key, day), 0)
+
+    def changed_rows(self, key: str, old: Day | None, new: Day | None) -> Iterator[int]:
+        """The rows of a category that can be ordered on one of the days but not the other"""
+        return iter_bits(self.blocked(key, old) ^ self.blocked(key, new))
+
+    def unavailable_ids(self, day: Day | None) -> frozenset[int]:
+        """The ids of every product that can't be ordered on day"""
+        for key in self.products:
+            self._catch_up(key)
+
+        ids = self._unavailable_ids.get(day)
+        if ids is None:
+            ids = self._unavailable_ids[day] = frozenset(
+                self.products[key][row].id
+                for key in self.products
+                for row in iter_bits(self._blocked.get((key, day), 0))
+            )
+
+        return ids
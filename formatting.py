@@ -0,0 +1,115 @@
+##
+# formatting.py
+# 2026-10-18
+# The text shown for products, made once and then kept.
+
+# KaiUI - A cool little shop made for an assignment
+# Copyright (C) 2023  Sofia
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# The same few strings come up over and over (there's only 8 combinations of attributes and
+# 7 days), so the pieces are cached by what they're made from, and so are the lines of a whole
+# product: its price, attributes, day and country, not the product itself. So the cache never
+# keeps a product alive, and a product changed in place just looks up its new values.
+# Locales are just names of the tables in STRINGS, only English so far.
+
+import functools
+
+from products import ProductAttribute, Day, Product, Special
+import orders
+
+DEFAULT_LOCALE = "en"
+
+STRINGS = {
+    "en": {
+        "vegetarian": "Vegetarian",
+        "vegan": "Vegan",
+        "has_sugar": "Has sugar",
+        "yes": "Yes",
+        "no": "No",
+        "day": "Day available",
+        "country": "Country of origin",
+        "currency": "$",
+        "decimal": ".",
+    },
+}
+
+# How many sets of lines are kept around, enough for every card that's likely to be
+# on screen and a good bit more
+CACHE_SIZE = 1 << 14
+
+
+@functools.lru_cache(maxsize=None)
+def price(cents: int, locale: str = DEFAULT_LOCALE) -> str:
+    """Like orders.format_cents, with the currency and decimal separator of the locale"""
+    strings = STRINGS[locale]
+    sign = "-" if cents < 0 else ""
+    cents = abs(cents)
+    return f"{sign}{strings['currency']}{cents // 100}{strings['decimal']}{cents % 100:02d}"
+
+
+@functools.lru_cache(maxsize=None)
+def attribute_lines(
+    attributes: ProductAttribute, locale: str = DEFAULT_LOCALE
+) -> tuple[str, str, str]:
+    strings = STRINGS[locale]
+
+    def line(key, attribute):
+        return f"{strings[key]}: {strings['yes'] if attributes & attribute else strings['no']}"
+
+    return (
+        line("vegetarian", ProductAttribute.VEGETARIAN),
+        line("vegan", ProductAttribute.VEGAN),
+        line("has_sugar", ProductAttribute.HAS_SUGAR),
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def day_line(day: Day, locale: str = DEFAULT_LOCALE) -> str:
+    return f"{STRINGS[locale]['day']}: {Day.name(day)}"
+
+
+@functools.lru_cache(maxsize=4096)
+def country_line(country: str, locale: str = DEFAULT_LOCALE) -> str:
+    return f"{STRINGS[locale]['country']}: {country}"
+
+
+def product_lines(product: Product, locale: str = DEFAULT_LOCALE) -> tuple[str, ...]:
+    """
+    The lines shown under a product's name, in order: price, vegetarian, vegan, has sugar,
+    and for specials the day and the country.
+    """
+    if isinstance(product, Special):
+        special = (product.day, product.country)
+    else:
+        special = None
+
+    return _lines(orders.price_cents(product), product.attributes, special, locale)
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _lines(
+    cents: int,
+    attributes: ProductAttribute,
+    special: tuple[Day, str] | None,
+    locale: str,
+) -> tuple[str, ...]:
+    lines = (price(cents, locale), *attribute_lines(attributes, locale))
+
+    if special is not None:
+        day, country = special
+        lines += (day_line(day, locale), country_line(country, locale))
+
+    return lines
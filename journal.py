@@ -0,0 +1,438 @@
+##
+# journal.py
+# 2026-10-18
+# A write-ahead log of the open order, so a crash doesn't lose what was being rung up.
+
+# KaiUI - A cool little shop made for an assignment
+# Copyright (C) 2023  Sofia
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# There's two files, the log and next to it a snapshot (the log's name plus SNAPSHOT_SUFFIX).
+# The snapshot is JSON with the whole order at some point, and a generation number.
+# The log is everything that happened since, and starts with the generation of the snapshot
+# it follows on from. Taking a snapshot means writing it with the next generation and then
+# starting an empty log, if it crashes in between the old log is just ignored.
+#
+# Log layout, little endian:
+#   header      LOG_HEADER, magic, version and generation
+#   frames      one per commit: FRAME (payload size, crc32 of the payload, record count),
+#               then the records, then the strings the records need one after the other
+# Every record is RECORD, an op and two numbers:
+#   DEFINE  id, string size     the string is "category\tpretty name", ids only last one log
+#   SET     id, count           there's count of it now, 0 meaning it's gone
+#   CLEAR   -, -                the order was emptied
+#   SUBMIT  -, string size      the order with the id in the string got submitted
+#   DAY     day value or 0, -
+# A crash halfway through writing a frame leaves a frame with the wrong crc (or too short)
+# at the end, everything from there on is cut off when the log is opened again.
+
+import json
+import os
+import struct
+import sys
+import threading
+import zlib
+
+from products import Day, Product
+from catalogue import CATEGORY_KEYS
+import orders
+
+MAGIC = b"KAIW"
+VERSION = 1
+
+LOG_HEADER = struct.Struct("<4sII")
+FRAME = struct.Struct("<III")
+RECORD = struct.Struct("<BIi")
+
+DEFINE = 1
+SET = 2
+CLEAR = 3
+SUBMIT = 4
+DAY = 5
+
+SNAPSHOT_SUFFIX = ".snap"
+
+# How long appends get collected for before they're written and fsynced together.
+# A crash loses at most this much
+COMMIT_INTERVAL = 0.05
+
+# Records after which the log gets folded into a new snapshot. Submitting does it too
+SNAPSHOT_EVERY = 10000
+
+# What an order is stored as, no products so it can be read before the catalogue is
+# (category, pretty name) -> count
+Items = dict[tuple[str, str], int]
+
+
+def product_key(product: Product) -> tuple[str, str]:
+    # The pretty name, the plain one is the same for a bowl and a plate of the same sushi
+    return CATEGORY_KEYS[type(product)], product.pretty_name
+
+
+def _fsync_dir(path: str):
+    # So the rename itself survives a crash too
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _write_atomic(path: str, data: bytes):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp, path)
+    _fsync_dir(path)
+
+
+def read_snapshot(path: str) -> tuple[int, Day | None, Items, str | None]:
+    """Gives generation, day, items and the last submitted order id. All empty if theres none"""
+    try:
+        with open(path, "rb") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return 0, None, {}, None
+
+    items = {(category, name): count for category, name, count in data["items"]}
+    return (
+        data["generation"],
+        Day.from_name(data["day"]),
+        items,
+        data.get("last_submitted"),
+    )
+
+
+def replay(
+    data: bytes, day: Day | None, items: Items, names: dict[int, tuple[str, str]]
+) -> tuple[int, Day | None, str | None]:
+    """
+    Replays the frames of a log (without its header) onto day, items and names (the ids the
+    log has defined so far), the last two get changed in place.
+    Gives how many bytes of it were good, the day, and the last submitted id in it if any.
+    """
+    view = memoryview(data)
+    days = {d.value: d for d in Day}
+    last_submitted = None
+    offset = 0
+
+    while offset + FRAME.size <= len(view):
+        size, crc, count = FRAME.unpack_from(view, offset)
+        start = offset + FRAME.size
+        payload = view[start : start + size]
+
+        if len(payload) < size or zlib.crc32(payload) != crc:
+            break
+
+        # Strings start after the records, and get taken in order
+        strings = count * RECORD.size
+
+        for op, a, b in RECORD.iter_unpack(payload[: count * RECORD.size]):
+            if op == SET:
+                if b:
+                    items[names[a]] = b
+                else:
+                    items.pop(names[a], None)
+            elif op == DEFINE:
+                text = bytes(payload[strings : strings + b]).decode("utf-8")
+                names[a] = tuple(text.split("\t", 1))
+                strings += b
+            elif op == CLEAR:
+                items.clear()
+            elif op == SUBMIT:
+                last_submitted = bytes(payload[strings : strings + b]).decode("utf-8")
+                strings += b
+            elif op == DAY:
+                day = days.get(a)
+
+        offset = start + size
+
+    return offset, day, last_submitted
+
+
+class OrderJournal:
+    """
+    Keeps the log for an OrderEngine. Appending only packs a record into a buffer, a thread
+    writes the buffer out and fsyncs it every COMMIT_INTERVAL, so clicking never waits on disk.
+
+    Opening it replays what's there, the order it ends up with is in day and items.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        commit_interval: float = COMMIT_INTERVAL,
+        snapshot_every: int = SNAPSHOT_EVERY,
+    ):
+        self.path = path
+        self.snapshot_path = path + SNAPSHOT_SUFFIX
+        self.commit_interval = commit_interval
+        self.snapshot_every = snapshot_every
+
+        # What the order is as far as the journal knows, kept up to date with every append
+        # so a snapshot can be taken without asking anyone
+        self.generation, self.day, self.items, self.last_submitted = read_snapshot(
+            self.snapshot_path
+        )
+
+        # The ids of this generation of the log
+        self._names = {}
+        self._ids = {}
+
+        # Set when the log has to be started over, with the generation it should have
+        self._new_log = None
+        self._file = None
+        self._open_log()
+
+        # What was open when the shop last closed, or crashed. Doesn't change after this
+        self.recovered = (self.day, dict(self.items))
+
+        self._cond = threading.Condition()
+        self._records = bytearray()
+        self._strings = bytearray()
+        self._count = 0
+        self._since_snapshot = 0
+        self._snapshot = None
+        self._urgent = False
+        self._closing = False
+
+        self._thread = threading.Thread(
+            target=self._run, name="order journal", daemon=True
+        )
+        self._thread.start()
+
+    def _open_log(self):
+        """Replays the log if it follows on from the snapshot, and cuts off anything torn"""
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = b""
+
+        if len(data) >= LOG_HEADER.size:
+            magic, version, generation = LOG_HEADER.unpack_from(data)
+        else:
+            magic, version, generation = None, None, None
+
+        if magic != MAGIC or version != VERSION or generation != self.generation:
+            # Either there's no log yet, or it's older than the snapshot and already in it
+            if data and generation is not None and generation > self.generation:
+                print(
+                    f"journal: {self.path} is newer than its snapshot, starting over",
+                    file=sys.stderr,
+                )
+
+            self._new_log = self.generation
+            return
+
+        good, self.day, last_submitted = replay(
+            data[LOG_HEADER.size :], self.day, self.items, self._names
+        )
+        self.last_submitted = last_submitted or self.last_submitted
+        self._ids = {key: id_ for id_, key in self._names.items()}
+
+        self._file = open(self.path, "r+b")
+        if LOG_HEADER.size + good != len(data):
+            print(
+                f"journal: {self.path} was cut off, dropping the last "
+                f"{len(data) - LOG_HEADER.size - good} bytes",
+                file=sys.stderr,
+            )
+            self._file.truncate(LOG_HEADER.size + good)
+
+        self._file.seek(0, os.SEEK_END)
+
+    def attach(self, engine: orders.OrderEngine):
+        engine.subscribe(self.order_changed)
+        engine.subscribe_day(self.day_changed)
+
+    def restart_from(self, engine: orders.OrderEngine):
+        """
+        Makes the journal match the engine and snapshots it. For after the recovered order
+        has been put back, in case some of it isn't in the catalogue anymore.
+        """
+        with self._cond:
+            self.day = engine.day
+            self.items = {product_key(p): count for p, count in engine.order.items()}
+            self._take_snapshot()
+            self._cond.notify()
+
+    def _append(self, op: int, a: int = 0, b: int = 0, string: bytes = b""):
+        # Only called with the lock held
+        self._records += RECORD.pack(op, a, b)
+        self._strings += string
+        self._count += 1
+        self._since_snapshot += 1
+
+    def _id(self, key: tuple[str, str]) -> int:
+        id_ = self._ids.get(key)
+        if id_ is None:
+            id_ = self._ids[key] = len(self._ids)
+            self._append(DEFINE, id_, *self._encoded(f"{key[0]}\t{key[1]}"))
+
+        return id_
+
+    @staticmethod
+    def _encoded(text: str) -> tuple[int, bytes]:
+        data = text.encode("utf-8")
+        return len(data), data
+
+    def order_changed(self, changes: orders.Changes):
+        with self._cond:
+            if changes is None:
+                self.items.clear()
+                self._append(CLEAR)
+
+                # Nothing to keep from before, so this is the cheapest time for a snapshot
+                self._take_snapshot()
+            else:
+                for product, count in changes.items():
+                    key = product_key(product)
+                    if count:
+                        self.items[key] = count
+                    else:
+                        self.items.pop(key, None)
+
+                    self._append(SET, self._id(key), count)
+
+                if self._since_snapshot >= self.snapshot_every:
+                    self._take_snapshot()
+
+            self._cond.notify()
+
+    def day_changed(self, day: Day | None):
+        with self._cond:
+            self.day = day
+            self._append(DAY, day.value if day is not None else 0)
+            self._cond.notify()
+
+    def submitted(self, order_id: str):
+        """Notes that the order got submitted, and has it written straight away"""
+        with self._cond:
+            self.last_submitted = order_id
+            self._append(SUBMIT, 0, *self._encoded(order_id))
+            self._urgent = True
+            self._cond.notify()
+
+    def _take_snapshot(self):
+        """
+        Replaces whatever hasn't been written yet with a snapshot of the whole order,
+        the thread writes it and starts the next log. Only called with the lock held.
+        """
+        self.generation += 1
+        self._snapshot = json.dumps(
+            {
+                "generation": self.generation,
+                "day": Day.name(self.day) if self.day is not None else None,
+                "items": [[*key, count] for key, count in self.items.items()],
+                "last_submitted": self.last_submitted,
+            }
+        ).encode("utf-8")
+
+        self._records.clear()
+        self._strings.clear()
+        self._count = 0
+        self._since_snapshot = 0
+        self._names = {}
+        self._ids = {}
+        self._new_log = self.generation
+
+    def _take_frame(self) -> bytes | None:
+        if not self._count:
+            return None
+
+        payload = bytes(self._records + self._strings)
+        frame = FRAME.pack(len(payload), zlib.crc32(payload), self._count) + payload
+
+        self._records.clear()
+        self._strings.clear()
+        self._count = 0
+        return frame
+
+    def _run(self):
+        retried = False
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._count or self._snapshot or self._closing
+                )
+
+                # Group commit: whatever else turns up in the meantime goes in the same write
+                self._cond.wait_for(
+                    lambda: self._urgent or self._closing, self.commit_interval
+                )
+
+                snapshot, self._snapshot = self._snapshot, None
+                new_log, self._new_log = self._new_log, None
+                frame = self._take_frame()
+                self._urgent = False
+                closing = self._closing
+
+            try:
+                self._commit(snapshot, new_log, frame)
+            except Exception as e:
+                # Anything here would stop the thread, and nothing would get written again
+                print(f"journal: couldn't write {self.path}: {e}", file=sys.stderr)
+
+                # What didn't make it might be needed by the frames after it, so the log is
+                # started over from a snapshot of the order, which is all in items anyway
+                with self._cond:
+                    self._take_snapshot()
+
+                # Otherwise the next round has a go, but when closing there isn't one
+                if closing and not retried:
+                    retried = True
+                    continue
+
+            if closing:
+                if self._file is not None:
+                    self._file.close()
+                return
+
+    def _commit(self, snapshot: bytes | None, new_log: int | None, frame: bytes | None):
+        if snapshot is not None:
+            _write_atomic(self.snapshot_path, snapshot)
+
+        if new_log is not None:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+            _write_atomic(self.path, LOG_HEADER.pack(MAGIC, VERSION, new_log))
+            self._file = open(self.path, "r+b")
+            self._file.seek(0, os.SEEK_END)
+
+        # No log open means starting one failed, and a snapshot is on its way to replace it
+        if frame is not None and self._file is not None:
+            self._file.write(frame)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        """Writes out what's left and stops the thread"""
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+
+        self._thread.join()
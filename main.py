@@ -20,150 +20,87 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
-from PySide6 import QtWidgets, QtCore
-from enum import Flag, Enum, auto
-
-
-class SushiType(Enum):
-    PIECES = auto()
-    BOWL = auto()
-
-
-class ProductAttribute(Flag):
-    NONE = auto()
-    VEGAN = auto()
-    VEGETARIAN = auto()
-    HAS_SUGAR = auto()
-
-
-class Day(Enum):
-    MONDAY = auto()
-    TUESDAY = auto()
-    WEDNESDAY = auto()
-    THURSDAY = auto()
-    FRIDAY = auto()
-    SATURDAY = auto()
-    SUNDAY = auto()
-
-    @classmethod
-    def name(cls, day):
-        return cls.name_dict.get(day, "Unknown")
-
-    @classmethod
-    @property
-    def name_dict(cls):
-        names = {
-            cls.MONDAY: "Monday",
-            cls.TUESDAY: "Tuesday",
-            cls.WEDNESDAY: "Wednesday",
-            cls.THURSDAY: "Thursday",
-            cls.FRIDAY: "Friday",
-            cls.SATURDAY: "Saturday",
-            cls.SUNDAY: "Sunday",
-        }
-
-        return names
+# First, so the imports below make it into the startup trace
+import sys
+import tracing
+
+# Only when started as the shop with --trace, bench.py and simulate.py import this too
+if __name__ == "__main__" and any(
+    arg == "--trace" or arg.startswith("--trace=") for arg in sys.argv[1:]
+):
+    tracing.enable()
+
+_import_start = tracing.now()
+
+from PySide6 import QtWidgets, QtCore, QtGui
+
+tracing.complete("import PySide6", _import_start)
+
+from collections.abc import Iterable
+import argparse
+import bisect
+import contextlib
+import functools
+import itertools
+import os
+
+import catalogue
+import formatting
+import journal
+import metrics
+import orders
+import search
+import snapshot
+import submit
+import theme
+import thumbnails
+
+from products import (
+    ProductAttribute,
+    Day,
+    Product,
+    Sandwich,
+    Sushi,
+    Drink,
+    Special,
+    ALL_DAYS,
+)
+
+tracing.complete("import", _import_start)
+
+
+class Thumbnail(QtWidgets.QWidget):
+    """
+    A product's photo. It only asks for it when it gets painted, which Qt only does when
+    it's actually on screen, so scrolled away cards never get theirs decoded
+    """
+
+    def __init__(self, product: Product, loader: thumbnails.ThumbnailLoader, *args):
+        super().__init__(*args)
+        self.product = product
+        self.loader = loader
+        self.setFixedSize(thumbnails.SIZE, thumbnails.SIZE)
+
+    def paintEvent(self, event):
+        pixmap = self.loader.pixmap(self.product, self.size(), self)
+
+        # Centered, photos that aren't square don't fill the whole thing
+        painter = QtGui.QPainter(self)
+        painter.drawPixmap(
+            (self.width() - pixmap.width()) // 2,
+            (self.height() - pixmap.height()) // 2,
+            pixmap,
+        )
 
 
-class Product:
+class ProductInfo(QtWidgets.QFrame):
     def __init__(
         self,
-        name: str,
-        price: float,
-        attributes: ProductAttribute = ProductAttribute.NONE,
+        product: Product,
+        *args,
+        thumbnail_loader: thumbnails.ThumbnailLoader | None = None,
     ):
-        self.attributes = attributes | ProductAttribute.NONE
-        self.name = name
-        self.price = price
-
-    @property
-    def pretty_name(self):
-        return self.name
-
-    @property
-    def name(self):
-        return self._name
-
-    @name.setter
-    def name(self, new):
-        if not isinstance(new, str):
-            raise ValueError("Name must be type string")
-        self._name = new
-
-    @property
-    def price(self):
-        return self._price
-
-    @price.setter
-    def price(self, new):
-        if not isinstance(new, float):
-            raise ValueError("Price must be type float")
-        self._price = new
-
-    @property
-    def attributes(self):
-        return self._attributes
-
-    @attributes.setter
-    def attributes(self, new):
-        if not isinstance(new, ProductAttribute):
-            raise ValueError("Attribute must be type ProductAttribure")
-        self._attributes = new
-
-
-class Sandwich(Product):
-    pass
-
-
-class Sushi(Product):
-    def __init__(self, type_: SushiType, *args, pieces: int = 0):
-        super().__init__(*args)
-        self.type = type_
-
-        if self.type is SushiType.PIECES:
-            self.pieces = pieces
-
-    @property
-    def pretty_name(self):
-        if self.type is SushiType.BOWL:
-            return f"{self.name} bowl"
-        elif self.type is SushiType.PIECES:
-            return f"{self.name} sushi ({self.pieces} pcs)"
-
-
-class Drink(Product):
-    pass
-
-
-class Special(Product):
-    def __init__(self, day: Day, country: str, *args):
-        super().__init__(*args)
-        self.day = day
-        self.country = country
-
-    @property
-    def country(self):
-        return self._country
-
-    @country.setter
-    def country(self, new):
-        if not isinstance(new, str):
-            raise ValueError("country must be type str")
-        self._country = new
-
-    @property
-    def day(self):
-        return self._day
-
-    @day.setter
-    def day(self, new):
-        if not isinstance(new, Day):
-            raise ValueError("Day must be type Day")
-        self._day = new
-
-
-class ProductInfo(QtWidgets.QFrame):
-    def __init__(self, product: Product, *args):
+        """Without a thumbnail_loader there's no photo at all, not even the placeholder"""
         super().__init__(*args)
 
         # Im not gonna bother with a setter because i think its better if it just doesnt change
@@ -176,7 +113,9 @@ class ProductInfo(QtWidgets.QFrame):
         # Use a central widget of sorts so that the frame occupies the full width
         self.main_widget = QtWidgets.QWidget()
 
-        # TODO: Image label
+        self.thumbnail = None
+        if thumbnail_loader is not None:
+            self.thumbnail = Thumbnail(product, thumbnail_loader, self.main_widget)
 
         self.name_label = QtWidgets.QLabel(self.main_widget)
         self.price_label = QtWidgets.QLabel(self.main_widget)
@@ -196,6 +135,11 @@ class ProductInfo(QtWidgets.QFrame):
 
         self.initUI()
 
+    def set_available(self, available: bool):
+        """Enables or disables both buttons"""
+        self.add_button.setEnabled(available)
+        self.remove_button.setEnabled(available)
+
     def set_add_button_clicked(self, func):
         """this function connects the buttons signal to the one given
         sends this objects product as an argument"""
@@ -204,6 +148,22 @@ class ProductInfo(QtWidgets.QFrame):
     def set_remove_button_clicked(self, func):
         self.remove_button.clicked.connect(lambda: func(self.product))
 
+    def update_text(self):
+        """Sets the labels from the product, call it again if the product changes"""
+        # self.name_label.setText(self.product.name)
+        self.name_label.setText(self.product.pretty_name)
+
+        # The same text the delegate paints, made once per product
+        lines = formatting.product_lines(self.product)
+        self.price_label.setText(lines[0])
+        self.vegetarian_label.setText(lines[1])
+        self.vegan_label.setText(lines[2])
+        self.has_sugar_label.setText(lines[3])
+
+        if isinstance(self.product, Special):
+            self.day_label.setText(lines[4])
+            self.country_label.setText(lines[5])
+
     def initUI(self):
         self.setFrameStyle(QtWidgets.QFrame.StyledPanel)
 
@@ -213,29 +173,16 @@ class ProductInfo(QtWidgets.QFrame):
         # self.setLineWidth(2)
 
         # Set up labels
-        # self.name_label.setText(self.product.name)
-        self.name_label.setText(self.product.pretty_name)
-        self.name_label.setStyleSheet("font-size: 15pt")
-
-        self.price_label.setText(f"${self.product.price:.02f}")
-
-        self.vegetarian_label.setText(
-            # f"Vegetarian: {'✅' if self.product.attributes & ProductAttribute.VEGETARIAN else '❎'}"
-            f"Vegetarian: {'Yes' if self.product.attributes & ProductAttribute.VEGETARIAN else 'No'}"
-        )
-
-        self.vegan_label.setText(
-            # f"Vegan: {'✅' if self.product.attributes & ProductAttribute.VEGAN else '❎'}"
-            f"Vegan: {'Yes' if self.product.attributes & ProductAttribute.VEGAN else 'No'}"
-        )
+        self.update_text()
 
-        self.has_sugar_label.setText(
-            # f"Sugar: {'✅' if self.product.attributes & ProductAttribute.HAS_SUGAR else '❎'}"
-            f"Has sugar: {'Yes' if self.product.attributes & ProductAttribute.HAS_SUGAR else 'No'}"
-        )
+        # The size comes from the app's stylesheet, see theme.py
+        self.name_label.setObjectName("product_name")
 
         main_hbox = QtWidgets.QHBoxLayout()
 
+        if self.thumbnail is not None:
+            main_hbox.addWidget(self.thumbnail)
+
         # Shove em all into a layout
         vbox_info = QtWidgets.QVBoxLayout()
 
@@ -249,10 +196,7 @@ class ProductInfo(QtWidgets.QFrame):
         vbox_info.addWidget(self.has_sugar_label)
 
         if isinstance(self.product, Special):
-            self.day_label.setText(f"Day available: {Day.name(self.product.day)}")
             vbox_info.addWidget(self.day_label)
-
-            self.country_label.setText(f"Country of origin: {self.product.country}")
             vbox_info.addWidget(self.country_label)
 
         main_hbox.addLayout(vbox_info)
@@ -273,7 +217,589 @@ class ProductInfo(QtWidgets.QFrame):
         self.layout().addWidget(self.main_widget)
 
         self.main_widget.setLayout(main_hbox)
-        self.show()
+
+
+class ProductListModel(QtCore.QAbstractListModel):
+    """
+    A list model that sits on top of one of the product lists. It doesnt copy the list,
+    so the view only ever asks for the rows it actually needs to show.
+    """
+
+    ProductRole = QtCore.Qt.UserRole + 1
+    AvailableRole = QtCore.Qt.UserRole + 2
+
+    def __init__(self, products: list[Product], *args):
+        super().__init__(*args)
+        self._products = products
+
+        # Same as KaiUI.day, only matters for products that can't be ordered every day
+        self.day = None
+
+        # When searching, the rows of the products list that are shown, in order.
+        # None means all of them
+        self._visible = None
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        # Its a list, so nothing has children
+        if parent.isValid():
+            return 0
+
+        if self._visible is not None:
+            return len(self._visible)
+
+        return len(self._products)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < self.rowCount():
+            return None
+
+        product = self.product(index.row())
+
+        if role == QtCore.Qt.DisplayRole:
+            return product.pretty_name
+        elif role == self.ProductRole:
+            return product
+        elif role == self.AvailableRole:
+            return self.is_available(product)
+
+        return None
+
+    def product(self, row: int) -> Product:
+        if self._visible is not None:
+            row = self._visible[row]
+
+        return self._products[row]
+
+    def view_row(self, row: int) -> int | None:
+        """Where a row of the products list is in the view, None if it's filtered out"""
+        if self._visible is None:
+            return row
+
+        idx = bisect.bisect_left(self._visible, row)
+        if idx < len(self._visible) and self._visible[idx] == row:
+            return idx
+
+        return None
+
+    def set_visible_rows(self, rows: list[int] | None):
+        """Only shows these rows of the products list (sorted), or all of them for None"""
+        self.beginResetModel()
+        self._visible = rows
+        self.endResetModel()
+
+    def extend(self, products: list[Product]):
+        """
+        Adds products to the end of the list, telling the view about it.
+        While searching they stay hidden until set_visible_rows says otherwise.
+        """
+        if not products:
+            return
+
+        first = len(self._products)
+        if self._visible is None:
+            self.beginInsertRows(QtCore.QModelIndex(), first, first + len(products) - 1)
+
+        self._products.extend(products)
+
+        if self._visible is None:
+            self.endInsertRows()
+
+    def products_changed(self, rows: list[int]):
+        """Tells the view these rows of the products list got changed in place"""
+        for row in rows:
+            row = self.view_row(row)
+            if row is not None:
+                idx = self.index(row)
+                self.dataChanged.emit(idx, idx)
+
+    def remove(self, rows: list[int]):
+        """Removes these rows of the products list, they have to go from last to first"""
+        if self._visible is not None:
+            # Every shown row after a removed one moves, easier to start the view over
+            self.beginResetModel()
+            for row in rows:
+                del self._products[row]
+            self._visible = None
+            self.endResetModel()
+        else:
+            for row in rows:
+                self.beginRemoveRows(QtCore.QModelIndex(), row, row)
+                del self._products[row]
+                self.endRemoveRows()
+
+    def is_available(self, product: Product) -> bool:
+        return orders.is_available(product, self.day)
+
+    def set_day(self, day: Day, rows: Iterable[int]):
+        """
+        rows are the rows of the products list that can be ordered on one of the days but
+        not the other, see catalogue.DayIndex.changed_rows. Only those get repainted
+        """
+        old_day = self.day
+        self.day = day
+
+        if old_day is day:
+            return
+
+        shown = [row for row in map(self.view_row, rows) if row is not None]
+        if not shown:
+            return
+
+        # One signal from the first to the last. The view only repaints what's on screen
+        # anyway, and a signal per row was most of the time spent with big catalogues
+        self.dataChanged.emit(
+            self.index(min(shown)), self.index(max(shown)), [self.AvailableRole]
+        )
+
+
+class ProductDelegate(QtWidgets.QStyledItemDelegate):
+    """
+    Paints a product the same way ProductInfo lays it out, Add and Remove buttons included.
+    The buttons are only drawn, so there are no widgets per row at all.
+    """
+
+    add_clicked = QtCore.Signal(object)
+    remove_clicked = QtCore.Signal(object)
+
+    MARGIN = 8
+    SPACING = 2
+    BUTTON_WIDTH = 90
+
+    def __init__(self, *args):
+        super().__init__(*args)
+
+        # (row, "add" | "remove") of the button being held down, so it can be drawn sunken
+        self._pressed = None
+
+        # Asking a real button once is easier than guessing what the style wants
+        self._button_height = None
+
+        # Set to a thumbnails.ThumbnailLoader to paint photos next to the products
+        self.thumbnail_loader = None
+
+    @staticmethod
+    def _name_font(option):
+        font = QtWidgets.QApplication.font(option.widget)
+        font.setPointSizeF(theme.NAME_POINT_SIZE)
+        return font
+
+    @property
+    def button_height(self):
+        if self._button_height is None:
+            self._button_height = QtWidgets.QPushButton("Remove").sizeHint().height()
+
+        return self._button_height
+
+    def _button_rects(self, rect):
+        button_height = self.button_height
+        left = rect.right() - self.MARGIN - self.BUTTON_WIDTH
+        top = rect.center().y() - button_height - self.SPACING // 2
+
+        add = QtCore.QRect(left, top, self.BUTTON_WIDTH, button_height)
+        remove = add.translated(0, button_height + self.SPACING)
+        return add, remove
+
+    def sizeHint(self, option, index):
+        product = index.data(ProductListModel.ProductRole)
+        lines = len(formatting.product_lines(product))
+
+        name_height = QtGui.QFontMetrics(self._name_font(option)).height()
+        line_height = option.fontMetrics.height()
+
+        height = name_height + lines * (line_height + self.SPACING)
+        height = max(height, 2 * self.button_height + self.SPACING)
+        width = self.BUTTON_WIDTH + 2 * self.MARGIN
+
+        if self.thumbnail_loader is not None:
+            height = max(height, thumbnails.SIZE)
+            width += thumbnails.SIZE + self.MARGIN
+
+        return QtCore.QSize(width, height + 2 * self.MARGIN)
+
+    def paint(self, painter, option, index):
+        product = index.data(ProductListModel.ProductRole)
+        available = index.data(ProductListModel.AvailableRole)
+        style = (
+            option.widget.style() if option.widget else QtWidgets.QApplication.style()
+        )
+
+        painter.save()
+
+        # Pretend to be a StyledPanel frame
+        frame = option.rect.adjusted(1, 1, -1, -1)
+        painter.setPen(option.palette.mid().color())
+        painter.drawRect(frame)
+
+        text_rect = frame.adjusted(self.MARGIN, self.MARGIN, -self.MARGIN, -self.MARGIN)
+
+        # Only rows on screen get painted, so only they ask for their photo.
+        # When it's ready the loader repaints the viewport
+        if self.thumbnail_loader is not None:
+            size = QtCore.QSize(thumbnails.SIZE, thumbnails.SIZE)
+            pixmap = self.thumbnail_loader.pixmap(
+                product,
+                size,
+                option.widget.viewport() if option.widget is not None else None,
+            )
+            painter.drawPixmap(
+                text_rect.left() + (size.width() - pixmap.width()) // 2,
+                text_rect.center().y() - pixmap.height() // 2,
+                pixmap,
+            )
+            text_rect.setLeft(text_rect.left() + size.width() + self.MARGIN)
+
+        painter.setPen(option.palette.text().color())
+
+        name_font = self._name_font(option)
+        painter.setFont(name_font)
+        name_height = QtGui.QFontMetrics(name_font).height()
+        painter.drawText(
+            text_rect.adjusted(0, 0, 0, name_height - text_rect.height()),
+            QtCore.Qt.AlignLeft | QtCore.Qt.AlignVCenter,
+            product.pretty_name,
+        )
+
+        painter.setFont(option.font)
+        line_height = option.fontMetrics.height()
+        y = text_rect.top() + name_height + self.SPACING
+        for line in formatting.product_lines(product):
+            painter.drawText(
+                QtCore.QRect(text_rect.left(), y, text_rect.width(), line_height),
+                QtCore.Qt.AlignLeft | QtCore.Qt.AlignVCenter,
+                line,
+            )
+            y += line_height + self.SPACING
+
+        for which, rect in zip(("add", "remove"), self._button_rects(option.rect)):
+            button = QtWidgets.QStyleOptionButton()
+            button.rect = rect
+            button.text = "Add" if which == "add" else "Remove"
+            button.palette = QtGui.QPalette(option.palette)
+
+            if available:
+                button.state = QtWidgets.QStyle.State_Enabled
+                if self._pressed == (index.row(), which):
+                    button.state |= QtWidgets.QStyle.State_Sunken
+                else:
+                    button.state |= QtWidgets.QStyle.State_Raised
+            else:
+                button.state = QtWidgets.QStyle.State_None
+                button.palette.setCurrentColorGroup(QtGui.QPalette.Disabled)
+
+            style.drawControl(
+                QtWidgets.QStyle.CE_PushButton, button, painter, option.widget
+            )
+
+        painter.restore()
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() not in (
+            QtCore.QEvent.MouseButtonPress,
+            QtCore.QEvent.MouseButtonRelease,
+        ):
+            return super().editorEvent(event, model, option, index)
+
+        if not index.data(ProductListModel.AvailableRole):
+            return False
+
+        pos = event.position().toPoint()
+        add_rect, remove_rect = self._button_rects(option.rect)
+
+        if add_rect.contains(pos):
+            which = "add"
+        elif remove_rect.contains(pos):
+            which = "remove"
+        else:
+            which = None
+
+        # Redraw the row so the button looks pressed/unpressed
+        if option.widget is not None:
+            option.widget.update(index)
+
+        if event.type() == QtCore.QEvent.MouseButtonPress:
+            self._pressed = (index.row(), which) if which else None
+            return which is not None
+
+        # It only counts as a click if it's released on the same button it was pressed on
+        clicked = self._pressed == (index.row(), which) and which is not None
+        self._pressed = None
+
+        if clicked:
+            product = index.data(ProductListModel.ProductRole)
+            if which == "add":
+                self.add_clicked.emit(product)
+            else:
+                self.remove_clicked.emit(product)
+
+        return clicked
+
+
+class CatalogueLoader(QtCore.QThread):
+    """
+    Reads the catalogue file in the background and sends the products over in chunks,
+    so the window can show up before the file has been read.
+    """
+
+    # Category key, list of products
+    products_loaded = QtCore.Signal(str, list)
+
+    # Line, error message
+    record_failed = QtCore.Signal(int, str)
+
+    # A catalogue.CatalogueTracker of the rows the products came from, and the (size, mtime)
+    # of the file before it was read. For CatalogueWatcher.watch
+    loaded = QtCore.Signal(object, object)
+
+    def __init__(self, path: str, *args, snapshot_path: str | None = None):
+        """
+        If snapshot_path is given, a snapshot of the catalogue gets written there once it's
+        all loaded, so next time it doesn't need parsing.
+        """
+        super().__init__(*args)
+        self.path = path
+        self.snapshot_path = snapshot_path
+
+    def run(self):
+        loaded = {key: [] for key in catalogue.CATEGORY_CLASSES}
+        rows = {key: [] for key in catalogue.CATEGORY_CLASSES}
+        source = None
+        failed = False
+
+        try:
+            # Before reading, so edits made while it's being read make the snapshot stale
+            source = os.stat(self.path)
+
+            start = tracing.now()
+            for columns, errors in catalogue.iter_row_chunks(self.path):
+                products = catalogue.build_products(columns)
+                tracing.complete(
+                    "catalogue chunk", start, products=sum(map(len, products.values()))
+                )
+
+                for key, chunk in products.items():
+                    loaded[key].extend(chunk)
+                    rows[key].extend(columns[key])
+                    self.products_loaded.emit(key, chunk)
+
+                for error in errors:
+                    failed = True
+                    self.record_failed.emit(error.line, error.message)
+
+                if self.isInterruptionRequested():
+                    return
+
+                start = tracing.now()
+        except OSError as e:
+            # Line 0 because its the whole file thats wrong
+            self.record_failed.emit(0, str(e))
+            failed = True
+
+        # What the window has now, so changes to the file can be worked out from here.
+        # The bad records got skipped there too
+        self.loaded.emit(
+            catalogue.CatalogueTracker(rows),
+            None if source is None else (source.st_size, source.st_mtime_ns),
+        )
+        if source is None:
+            return
+
+        tracing.instant("catalogue loaded")
+
+        # A catalogue with mistakes doesn't get a snapshot, so they keep getting reported
+        # until someone fixes them
+        if self.snapshot_path is not None and not failed:
+            try:
+                snapshot.write(self.snapshot_path, loaded, source)
+            except OSError as e:
+                print(f"catalogue: couldn't write snapshot: {e}", file=sys.stderr)
+
+
+class CatalogueWatcher(QtCore.QThread):
+    """
+    Watches the catalogue file. When it changes it gets read again in the background and
+    compared with what was there before, and the window only gets told what changed.
+    Every run of the thread is one read of the file.
+    """
+
+    # catalogue.CatalogueDiff
+    changed = QtCore.Signal(object)
+
+    # The catalogue.CatalogueErrors of a file that wasn't used because of them
+    failed = QtCore.Signal(list)
+
+    # Editors tend to save in a few steps, so wait for them to finish
+    DEBOUNCE_MS = 300
+
+    def __init__(self, path: str, *args):
+        super().__init__(*args)
+        self.path = path
+
+        # The rows the window's products came from, see watch
+        self.tracker = None
+
+        # Size and modification time the last time it was read
+        self._stat = None
+
+        # Whether the file changed again while it was being read
+        self._again = False
+
+        self._watcher = QtCore.QFileSystemWatcher(self)
+        self._watcher.fileChanged.connect(self.file_changed)
+        self._watcher.directoryChanged.connect(self.file_changed)
+
+        self._debounce = QtCore.QTimer(self)
+        self._debounce.setSingleShot(True)
+        self._debounce.setInterval(self.DEBOUNCE_MS)
+        self._debounce.timeout.connect(self.reload)
+
+        self.finished.connect(self._run_again)
+
+    def watch(self, tracker: catalogue.CatalogueTracker, stat: tuple[int, int] | None):
+        """
+        Starts watching. tracker has the rows the window's products were made from, and
+        stat is the (size, mtime) of the file they were read from. If the file changed
+        since then it gets read again straight away
+        """
+        self.tracker = tracker
+        self._stat = stat
+
+        # The folder too, saving with a rename makes the watcher forget about the file
+        self._watcher.addPath(self.path)
+        self._watcher.addPath(os.path.dirname(os.path.abspath(self.path)))
+
+        if self._current_stat() != stat:
+            self.reload()
+
+    def stop(self):
+        self._watcher.removePaths(self._watcher.files() + self._watcher.directories())
+        self._debounce.stop()
+        self._again = False
+        self.wait()
+
+    def file_changed(self, _path):
+        if self.path not in self._watcher.files() and os.path.exists(self.path):
+            self._watcher.addPath(self.path)
+
+        # Anything else in the folder changing (like the order journal) doesn't count
+        if self._current_stat() != self._stat:
+            self._debounce.start()
+
+    def _current_stat(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+
+        return stat.st_size, stat.st_mtime_ns
+
+    def reload(self):
+        if self.isRunning():
+            self._again = True
+        else:
+            self.start()
+
+    def _run_again(self):
+        if self._again:
+            self._again = False
+            self.start()
+
+    def run(self):
+        stat = self._current_stat()
+        try:
+            columns, errors = catalogue.read_rows(self.path)
+        except OSError as e:
+            self.failed.emit([catalogue.CatalogueError(0, str(e))])
+            return
+
+        # A mistake could just as well be a half saved file, better to wait for a good one
+        # than to take out everything after it
+        if errors:
+            self.failed.emit(errors)
+            return
+
+        with tracing.span("catalogue diff"):
+            diff = self.tracker.diff(columns)
+
+        self._stat = stat
+        if diff:
+            self.changed.emit(diff)
+
+
+class FirstPaint(QtCore.QObject):
+    """
+    Puts the first paint in the startup trace, and when the event loop is free again after
+    it, which is when the shop can actually be used. Removes itself after that.
+    """
+
+    def eventFilter(self, obj, event):
+        if event.type() == QtCore.QEvent.Paint:
+            tracing.instant("first paint")
+            obj.removeEventFilter(self)
+            QtCore.QTimer.singleShot(0, lambda: tracing.instant("interactive"))
+
+        return False
+
+
+class StallMonitor(QtCore.QObject):
+    """
+    Ticks every INTERVAL ms and records how late each tick was. A late tick means the event
+    loop was busy with something else for that long, which is what feels like the till hanging.
+    """
+
+    INTERVAL = 50
+
+    # Late by more than this counts as a stall
+    STALL_MS = 100
+
+    def __init__(self, metrics: metrics.Metrics, *args):
+        super().__init__(*args)
+        self.metrics = metrics
+        self.histogram = metrics.histogram("event_loop_lateness")
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.setTimerType(QtCore.Qt.PreciseTimer)
+        self.timer.timeout.connect(self.tick)
+
+        self.elapsed = QtCore.QElapsedTimer()
+        self.elapsed.start()
+        self.timer.start(self.INTERVAL)
+
+    def tick(self):
+        late = max(self.elapsed.restart() - self.INTERVAL, 0)
+        self.histogram.record(late)
+
+        if late > self.STALL_MS:
+            self.metrics.count("event_loop_stalls")
+            self.metrics.count("event_loop_stalled_ms", late)
+
+
+class MetricsDock(QtWidgets.QDockWidget):
+    """
+    The debug dock, hidden until Ctrl+Shift+M. Publishes the metrics every second
+    (whether it's showing or not, the metrics server reads what gets published).
+    """
+
+    INTERVAL = 1000
+
+    def __init__(self, metrics: metrics.Metrics, *args):
+        super().__init__("Metrics", *args)
+        self.metrics = metrics
+        self.setObjectName("metrics_dock")
+
+        self.text = QtWidgets.QPlainTextEdit(self)
+        self.text.setReadOnly(True)
+        self.setWidget(self.text)
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.timeout.connect(self.publish)
+        self.timer.start(self.INTERVAL)
+
+    def publish(self):
+        snapshot = self.metrics.publish()
+
+        # No point making text nobody is looking at
+        if self.isVisible():
+            self.text.setPlainText(metrics.format_text(snapshot))
 
 
 class KaiUI(QtWidgets.QMainWindow):
@@ -291,187 +817,898 @@ class KaiUI(QtWidgets.QMainWindow):
         """
         return cls._ACCEPTABLE_KEYS
 
+    # Where the order sidebar rows keep their product
+    ORDER_PRODUCT_ROLE = QtCore.Qt.UserRole + 1
+
+    # The slots that get timed when there's metrics
+    INSTRUMENTED_SLOTS = [
+        "product_button_add_clicked",
+        "product_button_remove_clicked",
+        "day_combobox_currentIndexChanged",
+        "order_button_clicked",
+        "flush_order_info",
+        "switch_order",
+    ]
+
     def update_order_info(func):
-        """This decorator calls the function and then updates the listview and price label"""
+        """
+        This decorator runs the function as one batch, so however much it changes the order
+        the listview and price label only get updated once, at the end
+        """
 
+        @functools.wraps(func)
         def f(self, *args, **kwargs):
-            func(self, *args, **kwargs)
+            with self.batch_updates():
+                return func(self, *args, **kwargs)
 
-            self.update_order_listwidget()
-            self.update_price_label()
+        return f
 
     def __init__(
-        self, products: dict[str, list[Sandwich | Sushi | Drink | Special]], *args
+        self,
+        products: dict[str, list[Sandwich | Sushi | Drink | Special]],
+        *args,
+        virtualized: bool = False,
+        prefetch_tabs: bool = False,
+        submitter: submit.SubmissionQueue | None = None,
+        order_journal: journal.OrderJournal | None = None,
+        metrics: metrics.Metrics | None = None,
+        thumbnail_loader: thumbnails.ThumbnailLoader | None = None,
     ):
         """
         This init only creates the objects needed for the ui, method initUI creates the layouts and
         actually fits everything together.
+
+        If virtualized is True the tabs are list views that paint the products instead of having
+        a ProductInfo for every single one. Use it for big catalogues.
+
+        Tabs are only filled the first time they are opened. If prefetch_tabs is True the rest
+        get filled in one at a time whenever the event loop has nothing better to do.
+
+        Orders get handed to submitter when the order button is clicked. Without one they
+        just get thrown away, like they always used to.
+
+        Every change to the order gets written to order_journal if there is one.
+        Call restore_order once the products are in to get back what it had open.
+
+        With metrics, the slots in INSTRUMENTED_SLOTS get timed, the event loop gets watched
+        for stalls, and Ctrl+Shift+M shows what's been measured. Without it none of that exists.
+
+        Products get a photo from thumbnail_loader if there is one.
         """
         # Do the thing
         super().__init__(*args)
 
-        # The day used for specials
-        # TODO: Add getter and setter, checking if in dict
+        # Once for the whole app, instead of a stylesheet per widget
+        theme.install(QtWidgets.QApplication.instance())
+
+        # Before anything gets connected to the slots, or the connections get the untimed ones
+        self.metrics = metrics
+        if self.metrics is not None:
+            self.metrics.instrument(self, self.INSTRUMENTED_SLOTS)
+
+        # The day the order is for, a Day. It only changes through the order engine,
+        # see order_day_changed
         self.day = None
 
-        # This will use the product item as they key and the value will be how many of those
-        self.order = dict()
+        # Everything about the order itself lives in here, the window just shows it
+        self.order_engine = orders.OrderEngine()
+        self.order_engine.subscribe(self.order_changed)
+        self.order_engine.subscribe_day(self.order_day_changed)
+
+        # The other customers' orders, parked while this one is being done
+        self.order_sessions = orders.OrderSessions(self.order_engine)
+
+        # Product id -> product, made the first time a parked order needs its products back
+        self._products_by_id = None
+
+        # Changes to the order only get noted down, and put on screen once the event loop
+        # gets back around. So a burst of clicks (or a barcode scanner) is one update
+        self._order_dirty = set()
+        self._order_dirty_all = False
+
+        # The ones that went down to 0 along the way. If they came back they went to the end
+        # of the order, so their row has to go to the end too
+        self._order_emptied = set()
+        self._batch_depth = 0
+        self._order_flush_timer = QtCore.QTimer(self)
+        self._order_flush_timer.setSingleShot(True)
+        self._order_flush_timer.setInterval(0)
+        self._order_flush_timer.timeout.connect(self.flush_order_info)
+
+        self.submitter = submitter
+
+        self.order_journal = order_journal
+        if self.order_journal is not None:
+            self.order_journal.attach(self.order_engine)
+
+        # The day the buttons on the ProductInfos are enabled for
+        self.cards_day = None
+
+        # How many records of the catalogue file were no good
+        self.catalogue_errors = 0
+
+        # Filled in a bit at a time while the event loop has nothing to do, see
+        # index_next_chunk. Only once the search box gets used, most of the time nobody
+        # searches. Searches only run once everything is in it
+        self.search_index = search.ProductIndex()
+        self.search_used = False
+        self._search_index_timer = QtCore.QTimer(self)
+        self._search_index_timer.setSingleShot(True)
+        self._search_index_timer.setInterval(0)
+        self._search_index_timer.timeout.connect(self.index_next_chunk)
+
+        # Something was searched for before the index was ready, it runs once it is
+        self._search_waiting = False
+
+        # The products that match the search, as a search.ProductIndex bitset.
+        # None when nothing is being searched for
+        self.search_mask = None
+
+        # The search_mask each built tab is showing right now
+        self.search_applied = dict()
+
+        # The sidebar row of every product in the order, so a click only touches its own row
+        self.order_items = dict()
 
         # 'Declare' the private one to avoid any possible issues with the setter
         self._products = {}
         self.products = products
 
+        # What can't be ordered on which day, so changing the day only has to look at those
+        self.day_index = catalogue.DayIndex(self.products)
+        self.order_engine.day_index = self.day_index
+
+        self.virtualized = virtualized
+        self.prefetch_tabs = prefetch_tabs
+
+        # Keys of the tabs that have had setup_tab_widget called on them
+        self.built_tabs = set()
+
         self.products_tab = QtWidgets.QTabWidget(self)
 
         # A QWidget for every possible tab
-        self.products_tab_widgets = {
-            key: QtWidgets.QScrollArea(self) for key in self.ACCEPTABLE_KEYS
-        }
+        if self.virtualized:
+            self.products_tab_widgets = {
+                key: QtWidgets.QListView(self) for key in self.ACCEPTABLE_KEYS
+            }
+        else:
+            self.products_tab_widgets = {
+                key: QtWidgets.QScrollArea(self) for key in self.ACCEPTABLE_KEYS
+            }
+
+        # Only used when not virtualized, the ProductInfo of every row of every built tab
+        self.product_infos = dict()
+
+        # Only used when virtualized, one model per tab
+        self.products_models = {}
+        self.thumbnail_loader = thumbnail_loader
+        self.products_delegate = ProductDelegate(self)
+        self.products_delegate.thumbnail_loader = thumbnail_loader
+        self.products_delegate.add_clicked.connect(self.product_button_add_clicked)
+        self.products_delegate.remove_clicked.connect(
+            self.product_button_remove_clicked
+        )
+
+        self.products_main_widget = QtWidgets.QWidget(self)
+        self.search_lineedit = QtWidgets.QLineEdit(self)
+        self.search_vegan_checkbox = QtWidgets.QCheckBox(self)
+        self.search_vegetarian_checkbox = QtWidgets.QCheckBox(self)
+        self.search_sugar_free_checkbox = QtWidgets.QCheckBox(self)
+        self.search_day_combobox = QtWidgets.QComboBox(self)
+        self.search_country_combobox = QtWidgets.QComboBox(self)
 
         self.order_info_main_widget = QtWidgets.QWidget(self)
 
         self.order_info_day_combobox = QtWidgets.QComboBox(self)
+        self.order_info_orders_tabbar = QtWidgets.QTabBar(self)
+        self.order_info_new_button = QtWidgets.QPushButton(self)
         self.order_info_order_listwidget = QtWidgets.QListWidget(self)
         self.order_info_price_label = QtWidgets.QLabel(self)
         self.order_info_order_button = QtWidgets.QPushButton(self)
 
         self.initUI()
 
+    @property
+    def order(self) -> orders.Order:
+        """
+        The product is the key and the value is how many of those.
+        Change it through self.order_engine, not directly, or the sidebar won't know.
+        """
+        return self.order_engine.order
+
     def add_to_order(self, product: Product):
-        # This epic one liner will set the value to 1 if the key doesnt exist or increase it by 1 if it does
-        self.order[product] = self.order.get(product, 0) + 1
+        self.order_engine.add(product)
 
     def order_button_clicked(self):
-        # TODO: Export to json or smth, not my problem
-        self.order.clear()
-        self.update_order_listwidget()
-        self.update_price_label()
+        if not self.order:
+            return
+
+        if self.submitter is not None:
+            record = submit.order_record(self.order, self.order_engine.day)
+
+            # Never waits, if there's no room the order stays so it can be sent again
+            if not self.submitter.submit(record):
+                self.statusBar().showMessage(
+                    "Too many orders waiting to be sent, try again in a bit"
+                )
+                return
+
+            self.statusBar().showMessage(
+                f"Order sent ({self.submitter.depth} waiting)", 3000
+            )
+
+            if self.order_journal is not None:
+                self.order_journal.submitted(record["id"])
+
+        self.order_engine.clear()
+
+        # On to the next customer, the one next to it in the tabs
+        if self.order_sessions.parked:
+            tabbar = self.order_info_orders_tabbar
+            idx = tabbar.currentIndex()
+            self.switch_order(
+                tabbar.tabData(idx + 1 if idx + 1 < tabbar.count() else idx - 1)
+            )
+
+    def new_order_clicked(self):
+        """Parks the order and starts an empty one"""
+        # It's already a new one
+        if not self.order:
+            return
+
+        number = self.order_sessions.new()
+        self.order_info_orders_tabbar.addTab(f"#{number}")
+        self.order_info_orders_tabbar.setTabData(
+            self.order_info_orders_tabbar.count() - 1, number
+        )
+        self.switch_order(number)
+
+    def order_tab_changed(self, idx):
+        if idx >= 0:
+            self.switch_order(self.order_info_orders_tabbar.tabData(idx))
+
+    @update_order_info
+    def switch_order(self, number: int):
+        """
+        Parks the order and brings back the one called number. Only the products that aren't
+        the same in both change, so only their sidebar rows get touched
+        """
+        previous = self.order_sessions.active
+        dropped, missing = self.order_sessions.switch(number, self.products_by_id())
+
+        tabbar = self.order_info_orders_tabbar
+        with QtCore.QSignalBlocker(tabbar):
+            if dropped is not None:
+                tabbar.removeTab(self._order_tab_index(dropped))
+            elif previous != number:
+                parked = self.order_sessions.parked[previous]
+                tabbar.setTabToolTip(
+                    self._order_tab_index(previous),
+                    f"{len(parked)} products, {orders.format_cents(parked.total_cents)}",
+                )
+
+            idx = self._order_tab_index(number)
+            tabbar.setCurrentIndex(idx)
+            tabbar.setTabToolTip(idx, "")
+
+        if missing:
+            self.statusBar().showMessage(
+                f"{len(missing)} products of order #{number} aren't in the catalogue anymore"
+            )
+
+    def _order_tab_index(self, number: int) -> int:
+        tabbar = self.order_info_orders_tabbar
+        for idx in range(tabbar.count()):
+            if tabbar.tabData(idx) == number:
+                return idx
+
+        return -1
+
+    def products_by_id(self) -> dict[int, Product]:
+        if self._products_by_id is None:
+            self._products_by_id = {
+                p.id: p for products in self.products.values() for p in products
+            }
+
+        return self._products_by_id
+
+    @tracing.traced
+    @update_order_info
+    def restore_order(self):
+        """Puts back the order the journal had open last time, as far as the products allow"""
+        if self.order_journal is None:
+            return
+
+        day, items = self.order_journal.recovered
+        if items:
+            # Specials need their day before they can go in
+            if day is not None:
+                self.order_info_day_combobox.setCurrentIndex(
+                    self.order_info_day_combobox.findData(day)
+                )
+
+            wanted = dict()
+            for category, name in items:
+                wanted.setdefault(category, set()).add(name)
+
+            found = dict()
+            for category, names in wanted.items():
+                for product in self.products.get(category, []):
+                    if product.pretty_name in names:
+                        found.setdefault((category, product.pretty_name), product)
+
+            self.order_engine.apply(
+                (found[key], count) for key, count in items.items() if key in found
+            )
+
+            if len(found) < len(items):
+                self.statusBar().showMessage(
+                    f"{len(items) - len(found)} products of the last order aren't "
+                    "in the catalogue anymore"
+                )
+
+        # Whatever couldn't be found shouldn't come back next time either
+        self.order_journal.restart_from(self.order_engine)
 
     def product_button_add_clicked(self, product: Product):
         self.add_to_order(product)
-        self.update_order_listwidget()
-        self.update_price_label()
 
     def product_button_remove_clicked(self, product: Product):
-        # Nothing to do
-        if product not in self.order:
-            return
+        # The engine doesnt do anything if there's none of it
+        self.order_engine.remove(product)
 
-        # Remove one
-        self.order[product] -= 1
+    def order_changed(self, changes: orders.Changes):
+        """
+        Called by the order engine. Only notes down what changed, flush_order_info is what
+        brings the sidebar up to date
+        """
+        if changes is None:
+            self._order_dirty_all = True
+            self._order_dirty.clear()
+            self._order_emptied.clear()
+        elif not self._order_dirty_all:
+            for product, count in changes.items():
+                self._order_dirty.add(product)
+                if not count:
+                    self._order_emptied.add(product)
+
+        if not self._batch_depth and not self._order_flush_timer.isActive():
+            self._order_flush_timer.start()
+
+    @contextlib.contextmanager
+    def batch_updates(self):
+        """
+        Nothing in the sidebar gets updated until the with block is done, then it all
+        gets done at once. Can be nested
+        """
+        self._batch_depth += 1
+        try:
+            yield
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self.flush_order_info()
+
+    def flush_order_info(self):
+        """Puts whatever changed in the order since last time on screen"""
+        self._order_flush_timer.stop()
+
+        if self._order_dirty_all:
+            self.update_order_listwidget()
+        elif self._order_dirty:
+            self._update_order_rows()
+        else:
+            return
 
-        # If there is nothing left then there is no point in showing it
-        if self.order[product] == 0:
-            del self.order[product]
-        self.update_order_listwidget()
+        self._order_dirty_all = False
+        self._order_dirty.clear()
+        self._order_emptied.clear()
         self.update_price_label()
 
-    def update_order_listwidget(self):
-        self.order_info_order_listwidget.clear()
+    def _update_order_rows(self):
+        """update_order_row for everything in self._order_dirty, keeping the rows in order"""
+        quantities = self.order.quantities
+        listwidget = self.order_info_order_listwidget
+        new_rows = 0
+
+        for product in self._order_dirty:
+            count = quantities.get(product, 0)
+            item = self.order_items.get(product)
+
+            if item is not None and (not count or product in self._order_emptied):
+                del self.order_items[product]
+                listwidget.takeItem(listwidget.row(item))
+                item = None
 
-        # Add them in alphabetical order
-        for key, val in self.order.items():
-            # Only accept natural numbers
-            if not val > 0:
+            if not count:
                 continue
 
-            self.order_info_order_listwidget.addItem(f"{key.pretty_name} x{val}")
+            if item is None:
+                new_rows += 1
+            else:
+                item.setText(f"{product.pretty_name} x{count}")
 
-    def update_price_label(self):
-        price = 0
-        for product, num in self.order.items():
-            price += product.price * num
+        # Whatever got a new row is at the end of the order, in the order it went in
+        if new_rows:
+            tail = list(itertools.islice(reversed(quantities), new_rows))
+            for product in reversed(tail):
+                self.update_order_row(product)
+
+    def update_order_row(self, product: Product):
+        """
+        Makes the sidebar row of a single product match self.order, adding or removing the
+        row if needed. Everything else in the list is left alone.
+        """
+        count = self.order.get(product, 0)
+        item = self.order_items.get(product)
+
+        if count <= 0:
+            # Nothing left, so the row goes. Finding the row is done by Qt, not by us
+            if item is not None:
+                del self.order_items[product]
+                self.order_info_order_listwidget.takeItem(
+                    self.order_info_order_listwidget.row(item)
+                )
+        elif item is None:
+            item = QtWidgets.QListWidgetItem(f"{product.pretty_name} x{count}")
+
+            # The row remembers its product, so it never has to be worked out from the text
+            item.setData(self.ORDER_PRODUCT_ROLE, product)
+            self.order_items[product] = item
+            self.order_info_order_listwidget.addItem(item)
+        else:
+            item.setText(f"{product.pretty_name} x{count}")
+
+    def update_order_listwidget(self):
+        """
+        Throws away the whole sidebar and builds it again from self.order. The buttons use
+        update_order_row instead, this is for when the whole order changes at once.
+        """
+        self.order_info_order_listwidget.clear()
+        self.order_items.clear()
 
-        self.order_info_price_label.setText(f"Total: ${price:.02f}")
+        # Add them in the order they were added
+        for key in self.order:
+            self.update_order_row(key)
 
+    def update_price_label(self):
+        self.order_info_price_label.setText(
+            f"Total: {orders.format_cents(self.order_engine.total_cents)}"
+        )
+
+    @tracing.traced
     def setup_tab_widget(self, key):
         """
         Adds all the necessary widgets from the products dict to the products tab QWidget
         that has the same key
         """
+        if self.virtualized:
+            self.setup_tab_view(key)
+            return
+
         tab_widg = self.products_tab_widgets[key]
         tab_widg.setWidgetResizable(True)
 
         container_widget = QtWidgets.QWidget(tab_widg)
 
-        sub_products = self.products[key]
+        sub_products = self.products.setdefault(key, [])
         vbox = QtWidgets.QVBoxLayout()
 
+        product_infos = self.product_infos[key] = []
         for p in sub_products:
-            widg = ProductInfo(p, container_widget)
-
-            # Connect Add and Remove button signals
-            # This is done inside the object itself because on a for loop with a lambda function, the lambda
-            # would always call the connected function with the loop's last value. Not what we want.
-            # Doing it this way avoids that.
-            widg.set_add_button_clicked(self.product_button_add_clicked)
-            widg.set_remove_button_clicked(self.product_button_remove_clicked)
-            # widg.add_button.clicked.connect(lambda: self.product_button_add_clicked(widg.product))
-            # widg.remove_button.clicked.connect(lambda: self.product_button_remove_clicked(widg.product))
-
-            vbox.addWidget(widg)
+            product_infos.append(self.create_product_info(p, container_widget))
+            vbox.addWidget(product_infos[-1])
 
         container_widget.setLayout(vbox)
         tab_widg.setWidget(container_widget)
 
-    def find_product_by_pretty_name(self, listwidgetitem):
-        if listwidgetitem is None:
-            return None
+    def create_product_info(self, product: Product, parent) -> ProductInfo:
+        """Makes the ProductInfo for a product with its buttons hooked up"""
+        widg = ProductInfo(product, parent, thumbnail_loader=self.thumbnail_loader)
 
-        # Remove the product count
-        name = listwidgetitem.text()
-        name = name[: name.rfind("x") - 1]
+        # Connect Add and Remove button signals
+        # This is done inside the object itself because on a for loop with a lambda function, the lambda
+        # would always call the connected function with the loop's last value. Not what we want.
+        # Doing it this way avoids that.
+        widg.set_add_button_clicked(self.product_button_add_clicked)
+        widg.set_remove_button_clicked(self.product_button_remove_clicked)
+        # widg.add_button.clicked.connect(lambda: self.product_button_add_clicked(widg.product))
+        # widg.remove_button.clicked.connect(lambda: self.product_button_remove_clicked(widg.product))
 
-        for p in self.order:
-            if p.pretty_name == name:
-                return p
+        if product.days != ALL_DAYS:
+            widg.set_available(orders.is_available(product, self.cards_day))
 
-        return None
+        return widg
 
-    def day_combobox_currentTextChanged(self, txt):
-        # Check that all of the items can be ordered on this day
-        for idx in range(self.order_info_order_listwidget.count()):
-            # Get the obj
-            product = self.find_product_by_pretty_name(
-                self.order_info_order_listwidget.item(idx)
-            )
+    def extend_products(self, key: str, products: list[Product]):
+        """
+        Adds more products to a category, used while the catalogue is still loading.
+        Tabs that haven't been built yet just get a longer list for later.
+        """
+        assert key in self.ACCEPTABLE_KEYS, f"'{key}' is an unacceptable key."
+
+        if self._products_by_id is not None:
+            self._products_by_id.update((p.id, p) for p in products)
+
+        self._extend_products(key, products)
+        self.day_index.add(key, self.products[key])
+
+        # New ProductInfos start off shown, but they aren't in the search index yet.
+        # They get shown again once they are if they match
+        if self.search_mask is not None and key in self.built_tabs:
+            if not self.virtualized:
+                self.apply_search(key)
+
+        self.index_later()
+
+    def _extend_products(self, key: str, products: list[Product]):
+        if key not in self.built_tabs:
+            self.products.setdefault(key, []).extend(products)
+        elif self.virtualized:
+            # The model has the same list, it does the extending
+            self.products_models[key].extend(products)
+        else:
+            self.products[key].extend(products)
+
+            # The new ones go in a widget of their own that only gets added once it's full.
+            # Adding them one by one to the shown layout lays it all out again every time,
+            # which made big catalogues take quadratic time to load
+            container_widget = self.products_tab_widgets[key].widget()
+            batch = QtWidgets.QWidget()
+            batch_vbox = QtWidgets.QVBoxLayout(batch)
+            batch_vbox.setContentsMargins(0, 0, 0, 0)
+
+            product_infos = self.product_infos[key]
+            for p in products:
+                product_infos.append(self.create_product_info(p, batch))
+                batch_vbox.addWidget(product_infos[-1])
+
+            container_widget.layout().addWidget(batch)
+
+    def catalogue_record_failed(self, line: int, message: str):
+        self.catalogue_errors += 1
+        print(f"catalogue: line {line}: {message}", file=sys.stderr)
+        self.statusBar().showMessage(
+            f"{self.catalogue_errors} product(s) in the catalogue could not be loaded"
+        )
 
-            if isinstance(product, Special) and Day.name(product.day) != txt:
-                QtWidgets.QMessageBox.critical(
-                    None,
-                    "Can't change day",
-                    "One or more products in your order are not available on that day",
-                )
+    def catalogue_reload_failed(self, errors: list[catalogue.CatalogueError]):
+        for error in errors:
+            print(f"catalogue: line {error.line}: {error.message}", file=sys.stderr)
+
+        self.statusBar().showMessage(
+            f"The catalogue has {len(errors)} mistake(s), it wasn't reloaded"
+        )
+
+    @update_order_info
+    @tracing.traced
+    def apply_catalogue_diff(self, diff: catalogue.CatalogueDiff):
+        """
+        Brings the products up to date with a reloaded catalogue. Changed products get
+        changed in place, so the order keeps them and only their own cards get touched.
+        Removed ones leave the order, new ones go at the end of their tab.
+        """
+        # The search index has rows in it that are about to move, it gets made again after
+        searching = self.search_mask is not None
+        if searching:
+            self.search_mask = None
+            for key in self.built_tabs:
+                self.apply_search(key)
+
+        self.search_index = search.ProductIndex()
+        self.search_applied.clear()
+        self._products_by_id = None
+
+        changed = []
+        for key, updates in diff.changed.items():
+            products = self.products[key]
+            for row, new in updates:
+                product = products[row]
+                catalogue.update_product(product, new)
+                changed.append(product)
+                self._product_changed(key, row, product)
+
+            if key in self.built_tabs and self.virtualized:
+                self.products_models[key].products_changed([row for row, _ in updates])
+
+        removed = []
+        for key, rows in diff.removed.items():
+            removed.extend(self.products[key][row] for row in rows)
+            self._remove_products(key, rows)
+
+        gone = self.order_engine.products_changed(changed, removed)
+
+        for key, products in diff.added.items():
+            self._extend_products(key, products)
+
+        # What's gone shouldn't take up the cache, and a new product might have a photo now
+        # where one with the same name didn't before
+        if self.thumbnail_loader is not None:
+            self.thumbnail_loader.forget(removed)
+            for products in diff.added.values():
+                self.thumbnail_loader.forget(products)
+
+        # Rows moved and days might have changed, easier to work it all out again
+        self.day_index = catalogue.DayIndex(self.products)
+        self.order_engine.day_index = self.day_index
+        self.index_later()
+
+        if searching:
+            self.search_changed()
+
+        n_changed, n_removed, n_added = diff.counts()
+        message = f"Catalogue reloaded: {n_changed} changed, {n_added} new, {n_removed} removed"
+        if gone:
+            message += f", {len(gone)} taken out of the order"
+        self.statusBar().showMessage(message)
+
+    def _product_changed(self, key: str, row: int, product: Product):
+        # Virtualized tabs just get repainted, see apply_catalogue_diff
+        if key not in self.built_tabs or self.virtualized:
+            return
+
+        product_info = self.product_infos[key][row]
+        product_info.update_text()
+
+        # It might be for another day now
+        product_info.set_available(orders.is_available(product, self.cards_day))
+
+    def _remove_products(self, key: str, rows: list[int]):
+        """Takes out these rows of a category, they have to go from last to first"""
+        if key in self.built_tabs and self.virtualized:
+            # The model has the same list
+            self.products_models[key].remove(rows)
+            return
+
+        products = self.products[key]
+        for row in rows:
+            del products[row]
 
-                # Go back to where we were
-                self.order_info_day_combobox.setCurrentText(self.day)
+            if key in self.built_tabs:
+                self.product_infos[key].pop(row).deleteLater()
 
+    def build_tab(self, key):
+        """Calls setup_tab_widget for the tab, but only the first time"""
+        if key in self.built_tabs:
+            return
+
+        self.setup_tab_widget(key)
+        self.built_tabs.add(key)
+
+        # Catch up with whatever is being searched for
+        if self.search_mask is not None:
+            self.apply_search(key)
+
+    def products_tab_currentChanged(self, idx):
+        # -1 means there are no tabs
+        if idx < 0:
+            return
+
+        self.build_tab(self.products_tab_keys[idx])
+
+    def prefetch_next_tab(self):
+        """
+        Builds one tab that hasn't been opened yet and then schedules itself again.
+        One per go so the window stays responsive in between.
+        """
+        for key in self.products_tab_keys:
+            if key not in self.built_tabs:
+                self.build_tab(key)
+                QtCore.QTimer.singleShot(0, self.prefetch_next_tab)
                 return
 
+    def eventFilter(self, obj, event):
+        # Someone's about to search, the index can get going while they type
+        if obj is self.search_lineedit and event.type() == QtCore.QEvent.FocusIn:
+            self.search_used = True
+            self.index_later()
+
+        return super().eventFilter(obj, event)
+
+    def index_later(self):
+        """Gets the products that aren't in the search index yet put in it, bit by bit"""
+        if self.search_used and not self._search_index_timer.isActive():
+            self._search_index_timer.start()
+
+    def index_next_chunk(self):
+        """
+        Puts a few more products in the search index and schedules itself again until
+        they're all in. Making it in one go takes seconds with big catalogues
+        """
+        start = tracing.now()
+        done = self.search_index.catch_up(self.products, SEARCH_INDEX_CHUNK)
+        tracing.complete("search index chunk", start)
+
+        if not done:
+            self._search_index_timer.start()
+            return
+
+        self.update_country_filter()
+        if self._search_waiting or self.search_mask is not None:
+            self.search_changed()
+
+    def update_country_filter(self):
+        """Makes the country filter have every country there are specials from"""
+        combobox = self.search_country_combobox
+        countries = sorted(self.search_index.countries)
+        if countries == [combobox.itemData(i) for i in range(1, combobox.count())]:
+            return
+
+        current = combobox.currentData()
+        with QtCore.QSignalBlocker(combobox):
+            combobox.clear()
+            combobox.addItem("Any country", None)
+            for country in countries:
+                combobox.addItem(country, country)
+
+            if current is not None:
+                combobox.setCurrentIndex(max(0, combobox.findData(current)))
+
+    def search_changed(self):
+        """Runs the search box and filters through the index and shows only what matches"""
+        text = self.search_lineedit.text()
+        day = self.search_day_combobox.currentData()
+        country = self.search_country_combobox.currentData()
+
+        attributes = ProductAttribute(0)
+        if self.search_vegan_checkbox.isChecked():
+            attributes |= ProductAttribute.VEGAN
+        if self.search_vegetarian_checkbox.isChecked():
+            attributes |= ProductAttribute.VEGETARIAN
+
+        without = ProductAttribute(0)
+        if self.search_sugar_free_checkbox.isChecked():
+            without |= ProductAttribute.HAS_SUGAR
+
+        self.search_used = True
+        self._search_waiting = False
+        if (
+            not text.strip()
+            and not attributes
+            and not without
+            and day is None
+            and country is None
+        ):
+            self.search_mask = None
+        elif not self.search_index.is_complete(self.products):
+            # What's shown stays as it is until the index catches up
+            self._search_waiting = True
+            self.index_later()
+            return
+        else:
+            self.search_mask = self.search_index.query(
+                text, attributes=attributes, without=without, day=day, country=country
+            )
+
+        for key in self.built_tabs:
+            self.apply_search(key)
+
+    def apply_search(self, key: str):
+        """Makes a built tab show only the products in self.search_mask"""
+        new = self.search_mask
+        old = self.search_applied.get(key)
+        self.search_applied[key] = new
+
+        if old is None and new is None:
+            return
+
+        if self.virtualized:
+            self.products_models[key].set_visible_rows(
+                None if new is None else self.search_index.rows_in(new, key)
+            )
+            return
+
+        # Only show/hide the ProductInfos that actually change
+        everything = self.search_index.everything
+        old = everything if old is None else old
+        new = everything if new is None else new
+        changed = (old ^ new) & self.search_index.category_mask(key)
+
+        product_infos = self.product_infos[key]
+        rows = self.search_index.rows
+        for idx in search.iter_bits(changed & new):
+            product_infos[rows[idx]].setVisible(True)
+        for idx in search.iter_bits(changed & ~new):
+            product_infos[rows[idx]].setVisible(False)
+
+        # The ones that aren't in the index yet only show when nothing is searched for
+        for product_info in product_infos[self.search_index.indexed.get(key, 0) :]:
+            product_info.setVisible(self.search_mask is None)
+
+    def setup_tab_view(self, key):
+        """
+        Virtualized version of setup_tab_widget. Gives the list view a model over the
+        products list, the delegate does the rest.
+        """
+        view = self.products_tab_widgets[key]
+
+        model = ProductListModel(self.products.setdefault(key, []), view)
+        model.day = self.day
+        self.products_models[key] = model
+
+        view.setItemDelegate(self.products_delegate)
+
+        # Every product in a tab is the same type, so they all have the same height.
+        # This stops the view from asking for the size of every single row
+        view.setUniformItemSizes(True)
+
+        # Laying out goes through every row once (asking the model for each), so for big
+        # catalogues do it a batch at a time instead of all before the tab can show
+        view.setLayoutMode(QtWidgets.QListView.Batched)
+        view.setBatchSize(2000)
+
+        view.setVerticalScrollMode(QtWidgets.QAbstractItemView.ScrollPerPixel)
+        view.setSelectionMode(QtWidgets.QAbstractItemView.NoSelection)
+
+        # Last, some of the setters above lay the view out again if it has a model already
+        view.setModel(model)
+
+    def product_from_item(self, listwidgetitem):
+        """Gives back the product a row of the order sidebar is for"""
+        if listwidgetitem is None:
+            return None
+
+        return listwidgetitem.data(self.ORDER_PRODUCT_ROLE)
+
+    def day_combobox_currentIndexChanged(self, idx):
+        # The engine checks that all of the items can be ordered on this day
+        if not self.order_engine.set_day(self.order_info_day_combobox.itemData(idx)):
+            QtWidgets.QMessageBox.critical(
+                None,
+                "Can't change day",
+                "One or more products in your order are not available on that day",
+            )
+
+            # Go back to where we were
+            self.order_info_day_combobox.setCurrentIndex(
+                self.order_info_day_combobox.findData(self.day)
+            )
+
+        # If it did change, order_day_changed has done the rest
+
+    def order_day_changed(self, day: Day | None):
+        """
+        Called by the order engine. The day can change without the combobox too, like when
+        switching orders, so the combobox gets set from here
+        """
+        idx = self.order_info_day_combobox.findData(day)
+        if self.order_info_day_combobox.currentIndex() != idx:
+            with QtCore.QSignalBlocker(self.order_info_day_combobox):
+                self.order_info_day_combobox.setCurrentIndex(idx)
+
         # Update day
-        self.day = txt
+        self.day = day
+
+        self.update_availability()
 
-        # Disable buttons
-        # QtWidgets.QPushButton.setEnabled(False)
+    def update_availability(self):
+        """
+        Enables the buttons of what can be ordered on self.day and disables the rest.
+        Only the products that can be ordered on one of the days but not the other get touched
+        """
+        day = self.day
 
-        # In case there are no specials we just dont do anything
-        if "specials" not in self.products_tab_widgets:
+        # The delegate checks the model when it paints, it only needs telling what to repaint
+        if self.virtualized:
+            for key in self.built_tabs:
+                model = self.products_models[key]
+                model.set_day(day, self.day_index.changed_rows(key, model.day, day))
             return
 
-        specials_tab = self.products_tab_widgets["specials"]
-        product_info_widgets = [
-            specials_tab.widget().layout().itemAt(i).widget()
-            for i in range(specials_tab.widget().layout().count())
-        ]
+        if day is self.cards_day:
+            return
 
-        for product_info in product_info_widgets:
-            if Day.name(product_info.product.day) != self.day:
-                product_info.add_button.setEnabled(False)
-                product_info.remove_button.setEnabled(False)
-            else:
-                product_info.add_button.setEnabled(True)
-                product_info.remove_button.setEnabled(True)
+        for key in self.built_tabs:
+            product_infos = self.product_infos[key]
+            for row in self.day_index.changed_rows(key, self.cards_day, day):
+                product_info = product_infos[row]
+                product_info.set_available(
+                    orders.is_available(product_info.product, day)
+                )
+
+        self.cards_day = day
 
+    @tracing.traced
     def initUI(self):
         self.setWindowTitle("Kai")
 
@@ -482,15 +1719,57 @@ class KaiUI(QtWidgets.QMainWindow):
         for name, widg in self.products_tab_widgets.items():
             self.products_tab.addTab(widg, f"{name.capitalize()}")
 
-            # This puts the actual objects into it
-            self.setup_tab_widget(name)
+        # Same order as the tabs, so an index can be turned into a key
+        self.products_tab_keys = list(self.products_tab_widgets.keys())
+
+        # Only the tab you can see gets filled in now, the others wait until they are opened
+        self.products_tab.currentChanged.connect(self.products_tab_currentChanged)
+        self.products_tab_currentChanged(self.products_tab.currentIndex())
+
+        if self.prefetch_tabs:
+            QtCore.QTimer.singleShot(0, self.prefetch_next_tab)
 
         # Setting up central widget things
         self.setCentralWidget(QtWidgets.QWidget(self))
 
+        # Search box and filters go above the tabs
+        search_hbox = QtWidgets.QHBoxLayout()
+        self.search_lineedit.setPlaceholderText("Search products")
+        self.search_lineedit.setClearButtonEnabled(True)
+        self.search_lineedit.textChanged.connect(self.search_changed)
+        self.search_lineedit.installEventFilter(self)
+        search_hbox.addWidget(self.search_lineedit)
+
+        for checkbox, text in (
+            (self.search_vegan_checkbox, "Vegan"),
+            (self.search_vegetarian_checkbox, "Vegetarian"),
+            (self.search_sugar_free_checkbox, "No sugar"),
+        ):
+            checkbox.setText(text)
+            checkbox.toggled.connect(self.search_changed)
+            search_hbox.addWidget(checkbox)
+
+        # Only specials are for a day or from a country, so these only ever find specials
+        self.search_day_combobox.addItem("Any day", None)
+        for day in Day:
+            self.search_day_combobox.addItem(Day.name(day), day)
+        self.search_day_combobox.currentIndexChanged.connect(self.search_changed)
+        search_hbox.addWidget(self.search_day_combobox)
+
+        # The countries get filled in once the search index knows them
+        self.search_country_combobox.addItem("Any country", None)
+        self.search_country_combobox.currentIndexChanged.connect(self.search_changed)
+        search_hbox.addWidget(self.search_country_combobox)
+
+        products_vbox = QtWidgets.QVBoxLayout()
+        products_vbox.setContentsMargins(0, 0, 0, 0)
+        products_vbox.addLayout(search_hbox)
+        products_vbox.addWidget(self.products_tab)
+        self.products_main_widget.setLayout(products_vbox)
+
         # Main layout
         hbox = QtWidgets.QHBoxLayout()
-        hbox.addWidget(self.products_tab)
+        hbox.addWidget(self.products_main_widget)
 
         # This will make the product tabs occupy two thirds of the window width by default
         # and then grow more than the list widget
@@ -501,28 +1780,46 @@ class KaiUI(QtWidgets.QMainWindow):
         self.order_info_main_widget.setLayout(order_vbox)
 
         # Add stretch at the beggining to offset the stretch before the button
-        self.order_info_day_combobox.addItems(list(Day.name_dict.values()))
-        self.day = self.order_info_day_combobox.currentText()
+        # The items are the days themselves, the text is only for showing
+        for day in Day:
+            self.order_info_day_combobox.addItem(Day.name(day), day)
 
         # Update stuff
-        self.day_combobox_currentTextChanged(self.day)
+        self.day_combobox_currentIndexChanged(
+            self.order_info_day_combobox.currentIndex()
+        )
 
-        self.order_info_day_combobox.currentTextChanged.connect(
-            self.day_combobox_currentTextChanged
+        self.order_info_day_combobox.currentIndexChanged.connect(
+            self.day_combobox_currentIndexChanged
         )
         order_vbox.addWidget(self.order_info_day_combobox)
 
         order_vbox.addStretch(1)
 
-        # This line gives pep8 nightmares
+        # One tab per open order, the active one is the one in the sidebar
+        self.order_info_orders_tabbar.addTab("#1")
+        self.order_info_orders_tabbar.setTabData(0, self.order_sessions.active)
+        self.order_info_orders_tabbar.setExpanding(False)
+        self.order_info_orders_tabbar.setUsesScrollButtons(True)
+        self.order_info_orders_tabbar.setDocumentMode(True)
+        self.order_info_orders_tabbar.currentChanged.connect(self.order_tab_changed)
+
+        self.order_info_new_button.setText("New order")
+        self.order_info_new_button.setToolTip("Park this order and start another one")
+        self.order_info_new_button.clicked.connect(self.new_order_clicked)
+
+        orders_hbox = QtWidgets.QHBoxLayout()
+        orders_hbox.addWidget(self.order_info_orders_tabbar, 1)
+        orders_hbox.addWidget(self.order_info_new_button)
+        order_vbox.addLayout(orders_hbox)
+
         # It will remove one of the item you click on
-        # ListWidget only stores a string so i need to work back to find the corresponding product,
-        # once i do that i can just use the function for the button signal
-        self.order_info_order_listwidget.currentRowChanged.connect(
-            lambda x: self.product_button_remove_clicked(
-                self.find_product_by_pretty_name(
-                    self.order_info_order_listwidget.item(x)
-                )
+        # Every row carries its product, so it can go straight to the function for the button signal
+        # It's itemClicked and not currentRowChanged because the rows don't get rebuilt anymore,
+        # so clicking the same row twice has to count twice
+        self.order_info_order_listwidget.itemClicked.connect(
+            lambda item: self.product_button_remove_clicked(
+                self.product_from_item(item)
             )
         )
         order_vbox.addWidget(self.order_info_order_listwidget)
@@ -540,6 +1837,27 @@ class KaiUI(QtWidgets.QMainWindow):
         hbox.addWidget(self.order_info_main_widget)
         self.centralWidget().setLayout(hbox)
 
+        if self.metrics is not None:
+            self.setup_metrics()
+
+    def setup_metrics(self):
+        self.metrics.gauge("widgets", lambda: len(QtWidgets.QApplication.allWidgets()))
+        self.metrics.gauge("order_lines", lambda: len(self.order))
+        self.metrics.gauge(
+            "products", lambda: sum(len(p) for p in self.products.values())
+        )
+
+        self.stall_monitor = StallMonitor(self.metrics, self)
+
+        self.metrics_dock = MetricsDock(self.metrics, self)
+        self.addDockWidget(QtCore.Qt.RightDockWidgetArea, self.metrics_dock)
+        self.metrics_dock.hide()
+
+        toggle = QtGui.QShortcut(QtGui.QKeySequence("Ctrl+Shift+M"), self)
+        toggle.activated.connect(
+            lambda: self.metrics_dock.setVisible(not self.metrics_dock.isVisible())
+        )
+
     ## Setters/Setters
     @property
     def products(self):
@@ -555,58 +1873,230 @@ class KaiUI(QtWidgets.QMainWindow):
         self._products = products
 
 
+# Past this many products a widget per product takes seconds to build, so the tabs
+# get virtualized unless told otherwise
+VIRTUALIZE_OVER = 500
+
+# Products put in the search index per go of the event loop, about 10ms worth
+SEARCH_INDEX_CHUNK = 1000
+
+
 def main():
+    parser = argparse.ArgumentParser(description="A cool shop in Qt6 :D")
+    parser.add_argument(
+        "--virtualized",
+        action=argparse.BooleanOptionalAction,
+        help="paint products in list views instead of a widget per product. By default "
+        f"only for catalogues of more than {VIRTUALIZE_OVER} products",
+    )
+    parser.add_argument(
+        "--prefetch-tabs",
+        action="store_true",
+        help="fill in the tabs that haven't been opened yet while the shop is idle",
+    )
+    parser.add_argument(
+        "--catalogue",
+        default=os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), "catalogue.jsonl"
+        ),
+        help="JSON Lines or CSV file with the products (default: catalogue.jsonl)",
+    )
+    parser.add_argument(
+        "--no-snapshot",
+        action="store_true",
+        help="always parse the catalogue instead of using (or writing) its compiled snapshot",
+    )
+    parser.add_argument(
+        "--no-watch",
+        action="store_true",
+        help="don't reload the catalogue when its file changes",
+    )
+    parser.add_argument(
+        "--submit-to",
+        default=os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), "orders.jsonl"
+        ),
+        help="where orders go: a file to append to, http://host:port/path or unix:/socket/path "
+        "(default: orders.jsonl)",
+    )
+    parser.add_argument(
+        "--journal",
+        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "orders.wal"),
+        help="write-ahead log of the open order, so it survives a crash (default: orders.wal)",
+    )
+    parser.add_argument(
+        "--trace",
+        metavar="FILE",
+        default=os.environ.get(tracing.ENV_VAR),
+        help=f"write a Chrome trace of the startup to FILE when the shop closes "
+        f"(or set {tracing.ENV_VAR})",
+    )
+    parser.add_argument(
+        "--metrics",
+        action="store_true",
+        default=bool(os.environ.get("KAI_METRICS")),
+        help="time the slots and watch for stalls, Ctrl+Shift+M shows the numbers "
+        "(or set KAI_METRICS=1)",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="serve the metrics as JSON on http://127.0.0.1:PORT/metrics, implies --metrics",
+    )
+    parser.add_argument(
+        "--metrics-file",
+        metavar="FILE",
+        help="write the metrics to FILE as JSON when the shop closes, implies --metrics",
+    )
+    parser.add_argument(
+        "--images",
+        metavar="FOLDER",
+        help="product photos, as FOLDER/<category>/<product name>.png (or .jpg)",
+    )
+    parser.add_argument(
+        "--thumbnail-cache",
+        metavar="FOLDER",
+        help="where shrunk photos get saved so they load quicker next time "
+        "(default: .thumbnails in the --images folder)",
+    )
+    args = parser.parse_args()
+
+    shop_metrics = None
+    if args.metrics or args.metrics_port is not None or args.metrics_file:
+        shop_metrics = metrics.Metrics()
+
+    if args.trace:
+        tracing.enable()
+    else:
+        tracing.disable()
+
+    try:
+        submitter = submit.SubmissionQueue(submit.sink_for(args.submit_to))
+    except ValueError as e:
+        parser.error(str(e))
+
+    with tracing.span("QApplication"):
+        app = QtWidgets.QApplication()
+
+    thumbnail_loader = None
+    if args.images:
+        thumbnail_loader = thumbnails.ThumbnailLoader(
+            args.images,
+            cache_dir=args.thumbnail_cache or os.path.join(args.images, ".thumbnails"),
+        )
 
-    # NOTE: This is probably better done with a ProductCategory class but whatever
-    # TODO: Put all of this into a json, its giving me a headache just looking at it
-    # Vertically aligned code :D
-    # fmt:off
-    sandwiches = [
-        Sandwich("Ham & egg sandwich",    3.50                                                      ),
-        Sandwich("Chicken mayo sandwich", 3.50                                                      ),
-        Sandwich("Egg sandwich",          3.00,                          ProductAttribute.VEGETARIAN),
-        Sandwich("Beef sandwich",         3.80                                                      ),
-        Sandwich("Salad sandwich",        3.20, ProductAttribute.VEGAN | ProductAttribute.VEGETARIAN),
-    ]
+    with tracing.span("OrderJournal"):
+        order_journal = journal.OrderJournal(args.journal)
+
+    # If the catalogue hasn't changed since last time, its snapshot can just be mapped
+    snapshot_path = None if args.no_snapshot else snapshot.path_for(args.catalogue)
+    products = None
+    if snapshot_path is not None:
+        with tracing.span("snapshot.load"):
+            products = snapshot.load(snapshot_path, args.catalogue)
+
+    virtualized = args.virtualized
+    if virtualized is None:
+        if products is not None:
+            size = sum(map(len, products.values()))
+        else:
+            size = catalogue.estimate_size(args.catalogue)
+
+        virtualized = size > VIRTUALIZE_OVER
+
+    # Otherwise it starts off empty, and the loader fills it in once the window is up
+    with tracing.span("KaiUI"):
+        main = KaiUI(
+            products or {key: [] for key in KaiUI.ACCEPTABLE_KEYS},
+            virtualized=virtualized,
+            prefetch_tabs=args.prefetch_tabs,
+            submitter=submitter,
+            order_journal=order_journal,
+            metrics=shop_metrics,
+            thumbnail_loader=thumbnail_loader,
+        )
 
-    sushi = [
-        Sushi(SushiType.PIECES, "Chicken",         4.5,                                                       pieces=3),
-        Sushi(SushiType.PIECES, "Tuna",            4.5,                                                       pieces=3),
-        Sushi(SushiType.PIECES, "Avocado",         4.8, ProductAttribute.VEGAN | ProductAttribute.VEGETARIAN, pieces=3),
-        Sushi(SushiType.BOWL,   "Chicken rice",    5.5,                                                               ),
-        Sushi(SushiType.BOWL,   "Vegetarian rice", 5.5, ProductAttribute.VEGAN | ProductAttribute.VEGETARIAN          ),
-    ]
+    metrics_server = None
+    if args.metrics_port is not None:
+        try:
+            metrics_server = shop_metrics.serve(args.metrics_port)
+        except OSError as e:
+            print(
+                f"metrics: couldn't listen on {args.metrics_port}: {e}", file=sys.stderr
+            )
 
-    drinks = [
-        Drink("Soda can",              2.00, ProductAttribute.VEGAN | ProductAttribute.VEGETARIAN | ProductAttribute.HAS_SUGAR),
-        Drink("Aloe vera drink",       3.50,                          ProductAttribute.VEGETARIAN | ProductAttribute.HAS_SUGAR),
-        Drink("Chocolate Milk",        3.50,                                                        ProductAttribute.HAS_SUGAR),
-        Drink("Water Bottle",          2.50, ProductAttribute.VEGAN | ProductAttribute.VEGETARIAN                             ),
-        Drink("Instant hot chocolate", 1.50,                          ProductAttribute.VEGETARIAN | ProductAttribute.HAS_SUGAR),
-    ]
+    watcher = None
+    if not args.no_watch:
+        watcher = CatalogueWatcher(args.catalogue, main)
+        watcher.changed.connect(main.apply_catalogue_diff)
+        watcher.failed.connect(main.catalogue_reload_failed)
+
+    loader = None
+    if products is None:
+        loader = CatalogueLoader(args.catalogue, main, snapshot_path=snapshot_path)
+        loader.products_loaded.connect(main.extend_products)
+        loader.record_failed.connect(main.catalogue_record_failed)
+
+        # The order can only be put back once its products are there
+        loader.finished.connect(main.restore_order)
+
+        # Same for changes, they're changes to what the loader loaded
+        if watcher is not None:
+            loader.loaded.connect(watcher.watch)
+    else:
+        main.restore_order()
+
+        if watcher is not None:
+            # The snapshot has the rows it was made from, and the file they're from
+            source = next(iter(products.values())).snapshot
+            watcher.watch(
+                catalogue.CatalogueTracker(
+                    {key: category.rows() for key, category in products.items()}
+                ),
+                (source.source_size, source.source_mtime_ns),
+            )
 
-    specials = [
-        Special(Day.MONDAY,    "Samoa",               "Kale moa",             6.00,                                                        ProductAttribute.HAS_SUGAR                        ),
-        Special(Day.TUESDAY,   "South Africa",        "Potjiekos",            6.00,                                                                                     ProductAttribute.NONE),
-        Special(Day.WEDNESDAY, "New Zealand (Māori)", "Hangi",                6.00, ProductAttribute.VEGETARIAN | ProductAttribute.VEGAN                                                     ),
-        Special(Day.THURSDAY,  "India",               "Paneer tikka masala",  6.00, ProductAttribute.VEGETARIAN |                          ProductAttribute.HAS_SUGAR                        ),
-        Special(Day.FRIDAY,    "China",               "Chow mein",            6.00, ProductAttribute.VEGETARIAN | ProductAttribute.VEGAN                                                     ),
-    ]
-    # fmt:on
-
-    app = QtWidgets.QApplication()
-    main = KaiUI(
-        {
-            "sandwiches": sandwiches,
-            "sushi": sushi,
-            "drinks": drinks,
-            "specials": specials,
-        }
-    )
+    # Goes on the window, on the app it'd see every event there is
+    if args.trace:
+        main.installEventFilter(FirstPaint(main))
+
+    with tracing.span("show"):
+        main.show()
+
+    if loader is not None:
+        loader.start()
 
-    main.show()
     app.exec()
 
+    # Don't leave it running if the window gets closed halfway through loading
+    if loader is not None:
+        loader.requestInterruption()
+        loader.wait()
+
+    if watcher is not None:
+        watcher.stop()
+
+    order_journal.close()
+
+    if thumbnail_loader is not None:
+        thumbnail_loader.close()
+
+    if metrics_server is not None:
+        metrics_server.shutdown()
+
+    if args.metrics_file:
+        shop_metrics.publish()
+        shop_metrics.write(args.metrics_file)
+
+    # Whatever orders are still queued get sent before quitting
+    submitter.close(timeout=10)
+    stats = submitter.stats()
+    if stats["failed"] or stats["rejected"]:
+        print(f"submit: {stats}", file=sys.stderr)
+
+    if args.trace:
+        tracing.write(args.trace)
+
 
 if __name__ == "__main__":
     main()
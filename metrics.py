@@ -0,0 +1,249 @@
+##
+# metrics.py
+# 2026-10-18
+# Timing what the till does while it's being used, for when it feels slow and nobody knows why.
+
+# KaiUI - A cool little shop made for an assignment
+# Copyright (C) 2023  Sofia
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Nothing in here is on unless a Metrics gets made. Methods only get timed by instrument(),
+# which swaps them out on the one object, so without it there's nothing extra to call.
+
+from collections import Counter
+from collections.abc import Callable
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+
+# Upper bounds of the latency buckets in ms, anything slower goes in one last bucket
+BUCKETS_MS = [
+    0.01,
+    0.02,
+    0.05,
+    0.1,
+    0.2,
+    0.5,
+    1,
+    2,
+    5,
+    10,
+    20,
+    50,
+    100,
+    200,
+    500,
+    1000,
+    2000,
+    5000,
+]
+
+
+class Histogram:
+    """Latencies in ms, counted by bucket. Percentiles are the bucket's upper bound"""
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, ms: float):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, fraction: float) -> float | None:
+        if not self.count:
+            return None
+
+        wanted = fraction * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= wanted:
+                # The last bucket has no upper bound, the slowest one is the best guess
+                return BUCKETS_MS[i] if i < len(BUCKETS_MS) else self.max
+
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count if self.count else None,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": self.max,
+            "buckets_ms": BUCKETS_MS,
+            "counts": list(self.counts),
+        }
+
+
+class Metrics:
+    """
+    Histograms, counters and gauges. Everything gets recorded from the window's thread.
+    The gauges are worked out by publish(), also from the window's thread, and other threads
+    (like the metrics server) only ever read what was published last.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.histograms = {}
+        self.counters = Counter()
+
+        # name -> function giving the current value
+        self.gauges = {}
+
+        self.published = self.snapshot()
+
+    def histogram(self, name: str) -> Histogram:
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+
+        return histogram
+
+    def count(self, name: str, n: int = 1):
+        self.counters[name] += n
+
+    def gauge(self, name: str, func: Callable[[], float]):
+        self.gauges[name] = func
+
+    def timed(self, name: str, func: Callable) -> Callable:
+        """func, but every call of it goes in the histogram called name"""
+        histogram = self.histogram(name)
+        perf_counter = time.perf_counter
+
+        # wraps matters, Qt looks at the signature to see what arguments a slot takes
+        @functools.wraps(func)
+        def f(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.record((perf_counter() - start) * 1000)
+
+        return f
+
+    def instrument(self, obj, names: list[str]):
+        """
+        Times the methods called names of obj, on that object only. Has to be done before
+        they get connected to anything, connections keep whatever method they were given.
+        """
+        for name in names:
+            setattr(obj, name, self.timed(name, getattr(obj, name)))
+
+    def reset(self):
+        """
+        Forgets everything recorded so far, like a warm up. The histograms stay the same
+        objects, the timed methods hold on to theirs
+        """
+        for histogram in self.histograms.values():
+            histogram.reset()
+        self.counters.clear()
+
+    def snapshot(self) -> dict:
+        gauges = {}
+        for name, func in self.gauges.items():
+            try:
+                gauges[name] = func()
+            except Exception as e:
+                gauges[name] = f"error: {e}"
+
+        return {
+            "pid": os.getpid(),
+            "uptime_s": time.time() - self.started,
+            "histograms": {
+                name: histogram.summary() for name, histogram in self.histograms.items()
+            },
+            "counters": dict(self.counters),
+            "gauges": gauges,
+        }
+
+    def publish(self) -> dict:
+        # Replacing the whole dict is atomic, so readers never see half of one
+        self.published = self.snapshot()
+        return self.published
+
+    def write(self, path: str):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.published, f, indent=1)
+
+        os.replace(tmp, path)
+
+    def serve(self, port: int, host: str = "127.0.0.1"):
+        """
+        Serves the last published metrics as JSON on http://host:port/metrics, from a thread.
+        Gives the server, call shutdown() on it to stop.
+        """
+        # Only imported when it's used, its slow to import
+        import http.server
+
+        metrics = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") not in ("", "/metrics"):
+                    self.send_error(404)
+                    return
+
+                body = json.dumps(metrics.published).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = http.server.ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(
+            target=server.serve_forever, name="metrics server", daemon=True
+        ).start()
+        return server
+
+
+def format_text(snapshot: dict) -> str:
+    """The snapshot as a few lines of text, for the debug dock"""
+    lines = []
+    for name, h in sorted(snapshot["histograms"].items()):
+        if not h["count"]:
+            continue
+
+        lines.append(
+            f"{name}: {h['count']} calls, mean {h['mean_ms']:.2f} ms, "
+            f"p95 <= {h['p95_ms']} ms, max {h['max_ms']:.2f} ms"
+        )
+
+    for name, value in sorted(snapshot["counters"].items()):
+        lines.append(f"{name}: {value}")
+
+    for name, value in sorted(snapshot["gauges"].items()):
+        lines.append(f"{name}: {value}")
+
+    return "\n".join(lines) or "Nothing yet"
@@ -0,0 +1,118 @@
+##
+# order_server.py
+# 2026-10-18
+# A stand-in for wherever orders get submitted to. Writes what it gets to a file.
+
+# KaiUI - A cool little shop made for an assignment
+# Copyright (C) 2023  Sofia
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Speaks both of the network sinks in submit.py, e.g.
+#   python order_server.py --http 127.0.0.1:8765 received.jsonl
+#   python order_server.py --unix /tmp/orders.sock received.jsonl
+# and then start the shop with --submit-to http://127.0.0.1:8765/orders (or unix:/tmp/orders.sock)
+
+import argparse
+import http.server
+import os
+import socketserver
+import sys
+import threading
+
+
+class _HttpHandler(http.server.BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.received(body)
+
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class UnixBatchHandler(socketserver.StreamRequestHandler):
+    """
+    The other end of submit.UnixSocketSink. Hands every batch to server.received(body)
+    and answers "ok <count>" once that's returned
+    """
+
+    def handle(self):
+        lines = []
+        for line in self.rfile:
+            # A blank line ends the batch
+            if line.strip():
+                lines.append(line)
+                continue
+
+            self.server.received(b"".join(lines))
+            self.wfile.write(f"ok {len(lines)}\n".encode())
+            lines = []
+
+
+class _Received:
+    """Mixed into the stand-in servers, writes what they get to a file"""
+
+    def received(self, body: bytes):
+        with self.lock:
+            self.out.write(body)
+            self.out.flush()
+
+
+class StandInHttpServer(_Received, http.server.ThreadingHTTPServer):
+    def __init__(self, address, out):
+        super().__init__(address, _HttpHandler)
+        self.out = out
+        self.lock = threading.Lock()
+
+
+class StandInUnixServer(_Received, socketserver.ThreadingUnixStreamServer):
+    def __init__(self, path, out):
+        super().__init__(path, UnixBatchHandler)
+        self.out = out
+        self.lock = threading.Lock()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Stand-in order server, writes the orders it gets to a file"
+    )
+    where = parser.add_mutually_exclusive_group(required=True)
+    where.add_argument("--http", metavar="HOST:PORT", help="listen for http POSTs")
+    where.add_argument("--unix", metavar="PATH", help="listen on a unix socket")
+    parser.add_argument("out", help="file to append the orders to")
+    args = parser.parse_args()
+
+    with open(args.out, "ab") as out:
+        if args.http:
+            host, _, port = args.http.rpartition(":")
+            server = StandInHttpServer((host or "127.0.0.1", int(port)), out)
+        else:
+            server = StandInUnixServer(args.unix, out)
+
+        print(f"listening on {args.http or args.unix}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            if args.unix:
+                os.unlink(args.unix)
+
+
+if __name__ == "__main__":
+    main()
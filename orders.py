@@ -0,0 +1,415 @@
+##
+# orders.py
+# 2026-10-18
+# What's in an order and how much it costs. No Qt here so it can run without a window.
+
+# KaiUI - A cool little shop made for an assignment
+# Copyright (C) 2023  Sofia
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from array import array
+from collections import Counter
+from collections.abc import Callable, Iterable, Mapping
+
+from products import Day, Product, available_on
+
+# What observers get told. The products whose quantity changed and what it is now,
+# 0 meaning its gone. None means the whole order changed and should be looked at again
+Changes = dict[Product, int] | None
+
+
+def price_cents(product: Product) -> int:
+    """The price of a product in whole cents, so totals can be added up exactly"""
+    return round(product.price * 100)
+
+
+def format_cents(cents: int) -> str:
+    sign = "-" if cents < 0 else ""
+    cents = abs(cents)
+    return f"{sign}${cents // 100}.{cents % 100:02d}"
+
+
+def price_order(quantities: dict[Product, int]) -> int:
+    """The total of a bunch of products in cents, without making an order for them"""
+    return sum(price_cents(product) * count for product, count in quantities.items())
+
+
+def is_available(product: Product, day: Day | None) -> bool:
+    return available_on(product.days, day)
+
+
+def diff_counts(old: Mapping[int, int], new: Mapping[int, int]) -> dict[int, int]:
+    """How much of each product to add (or remove if negative) to get from old to new"""
+    diff = {}
+    for product_id in old.keys() | new.keys():
+        delta = new.get(product_id, 0) - old.get(product_id, 0)
+        if delta:
+            diff[product_id] = delta
+
+    return diff
+
+
+class Order:
+    """
+    How many of each product, and the total. The total is kept up to date as things get added
+    and removed, so it never needs adding up again.
+    """
+
+    def __init__(self):
+        # In the order they were first added
+        self.quantities = dict()
+        self.total_cents = 0
+
+        # Product id -> product, of what's in the order. The keys can be and-ed with sets of
+        # ids in one go, like the ids of what can't be ordered on some day
+        self.by_id = dict()
+
+    def __len__(self):
+        return len(self.quantities)
+
+    def __iter__(self):
+        return iter(self.quantities)
+
+    def __contains__(self, product):
+        return product in self.quantities
+
+    def __getitem__(self, product):
+        return self.quantities[product]
+
+    def get(self, product: Product, default: int = 0) -> int:
+        return self.quantities.get(product, default)
+
+    def items(self):
+        return self.quantities.items()
+
+    def counts(self) -> Counter:
+        """The order as product id -> quantity. Plain ints, so it can go anywhere"""
+        return Counter(
+            {product.id: count for product, count in self.quantities.items()}
+        )
+
+    def change(self, product: Product, delta: int) -> int:
+        """
+        Adds delta of a product (removes if it's negative), never going under 0.
+        Gives back the new quantity.
+        """
+        count = self.quantities.get(product, 0)
+        new = max(count + delta, 0)
+
+        if new == count:
+            return new
+
+        self.total_cents += price_cents(product) * (new - count)
+
+        if new:
+            self.quantities[product] = new
+            if not count:
+                self.by_id[product.id] = product
+        else:
+            del self.quantities[product]
+            del self.by_id[product.id]
+
+        return new
+
+    def clear(self):
+        self.quantities.clear()
+        self.by_id.clear()
+        self.total_cents = 0
+
+    def reprice(self):
+        """Adds the total up again, for when the prices of the products changed"""
+        self.total_cents = price_order(self.quantities)
+
+
+class OrderEngine:
+    """
+    Owns the current order and the rules about it, mostly which day it is for.
+    Anything that wants to know when the order changes (like the window) subscribes to it.
+    """
+
+    def __init__(self, day: Day | None = None, day_index=None):
+        """
+        day_index is a catalogue.DayIndex of the products that get ordered, it makes
+        checking the whole order against a day one set operation. Without one every
+        product gets asked
+        """
+        self.order = Order()
+        self.day = day
+        self.day_index = day_index
+        self._observers = []
+        self._day_observers = []
+
+    def subscribe(self, callback: Callable[[Changes], None]):
+        self._observers.append(callback)
+
+    def unsubscribe(self, callback: Callable[[Changes], None]):
+        self._observers.remove(callback)
+
+    def subscribe_day(self, callback: Callable[[Day | None], None]):
+        """For things that need to know when the day changes, like the order journal"""
+        self._day_observers.append(callback)
+
+    def _notify(self, changes: Changes):
+        if changes == {}:
+            return
+
+        for callback in self._observers:
+            callback(changes)
+
+    def can_order(self, product: Product) -> bool:
+        return is_available(product, self.day)
+
+    def add(self, product: Product, count: int = 1) -> bool:
+        """Adds some of a product. Gives False (and does nothing) if it can't be ordered today"""
+        if not self.can_order(product):
+            return False
+
+        self._notify({product: self.order.change(product, count)})
+        return True
+
+    def remove(self, product: Product, count: int = 1):
+        """Removes some of a product, if there's none of it already nothing happens"""
+        if product not in self.order:
+            return
+
+        self._notify({product: self.order.change(product, -count)})
+
+    def apply(self, events: Iterable[tuple[Product, int]]) -> Changes:
+        """
+        Applies a whole batch of (product, delta) events, delta being how many to add
+        (negative to remove). Same result as doing them one at a time, but the order only
+        changes once per product, and observers only hear about it once at the end.
+        Adding products that can't be ordered today is skipped.
+        """
+        counts = {}
+        get = self.order.quantities.get
+
+        for product, delta in events:
+            count = counts.get(product)
+            if count is None:
+                count = get(product, 0)
+
+            if delta > 0 and not self.can_order(product):
+                continue
+
+            counts[product] = max(count + delta, 0)
+
+        changes = {}
+        for product, count in counts.items():
+            if count != get(product, 0):
+                changes[product] = self.order.change(product, count - get(product, 0))
+
+        self._notify(changes)
+        return changes
+
+    def apply_counts(
+        self, diff: Mapping[int, int], products: Mapping[int, Product]
+    ) -> list[int]:
+        """
+        apply, but with a diff_counts of product ids. products finds the product of an id.
+        Gives back the ids it couldn't find, those are skipped.
+        """
+        missing = [product_id for product_id in diff if product_id not in products]
+        self.apply(
+            (products[product_id], delta)
+            for product_id, delta in diff.items()
+            if product_id in products
+        )
+        return missing
+
+    def clear(self):
+        self.order.clear()
+        self._notify(None)
+
+    def products_changed(
+        self, changed: Iterable[Product], removed: Iterable[Product] = ()
+    ) -> list[Product]:
+        """
+        For when products got changed in place (like a new price) or taken out of the
+        catalogue. Removed ones leave the order, and so do changed ones that can't be ordered
+        today anymore. Gives back the ones that had to leave.
+        """
+        quantities = self.order.quantities
+        gone = [p for p in removed if p in quantities]
+        gone += [p for p in changed if p in quantities and not self.can_order(p)]
+
+        changes = {}
+        for product in gone:
+            changes[product] = self.order.change(product, -quantities[product])
+
+        self.order.reprice()
+
+        # The counts didn't change, but what they cost (or look like) did
+        for product in changed:
+            if product in quantities:
+                changes[product] = quantities[product]
+
+        self._notify(changes)
+        return gone
+
+    def unavailable_on(self, day: Day | None) -> list[Product]:
+        """The products in the order that couldn't be ordered on day"""
+        if self.day_index is None:
+            return [p for p in self.order if not is_available(p, day)]
+
+        # Nothing to check, and it saves working out the ids for a day nobody orders on
+        by_id = self.order.by_id
+        if not by_id:
+            return []
+
+        # Goes through the order's ids, not through everything that can't be ordered
+        unavailable = self.day_index.unavailable_ids(day).intersection(by_id)
+        return [by_id[i] for i in unavailable]
+
+    def set_day(self, day: Day | None) -> bool:
+        """
+        Changes the day, unless something in the order isn't available that day.
+        Gives back if it changed.
+        """
+        if self.unavailable_on(day):
+            return False
+
+        if day is not self.day:
+            self.day = day
+            for callback in self._day_observers:
+                callback(day)
+
+        return True
+
+    @property
+    def total_cents(self) -> int:
+        return self.order.total_cents
+
+
+class ParkedOrder:
+    """
+    An order put aside while someone else gets served. Only product ids and quantities in
+    two arrays, in the order they went in, so a parked order is a few hundred bytes
+    however many of them there are, and doesn't hold on to any products.
+    """
+
+    __slots__ = ("number", "day", "ids", "quantities", "total_cents")
+
+    def __init__(self, number: int, day: Day | None = None):
+        self.number = number
+        self.day = day
+        self.ids = array("q")
+        self.quantities = array("q")
+
+        # What it cost when it got parked, the prices might have changed since
+        self.total_cents = 0
+
+    @classmethod
+    def from_order(cls, number: int, order: Order, day: Day | None) -> "ParkedOrder":
+        parked = cls(number, day)
+        for product, count in order.items():
+            parked.ids.append(product.id)
+            parked.quantities.append(count)
+
+        parked.total_cents = order.total_cents
+        return parked
+
+    def __len__(self):
+        return len(self.ids)
+
+    def counts(self) -> dict[int, int]:
+        """Product id -> quantity, in the order they went in"""
+        return dict(zip(self.ids, self.quantities))
+
+
+class OrderSessions:
+    """
+    The orders open on a till. The active one is the engine's order, the others are parked.
+    Switching only applies the difference to the engine, so observers only hear about
+    the products that aren't the same in both, and parked orders cost the active one nothing.
+    """
+
+    def __init__(self, engine: OrderEngine):
+        self.engine = engine
+
+        # Number of the active order
+        self.active = 1
+        self._next_number = 2
+
+        # Number -> ParkedOrder, oldest first
+        self.parked = {}
+
+    def __len__(self):
+        return len(self.parked) + 1
+
+    def new(self) -> int:
+        """Makes an empty parked order, gives its number. switch to it to start on it"""
+        number = self._next_number
+        self._next_number += 1
+        self.parked[number] = ParkedOrder(number, self.engine.day)
+        return number
+
+    def switch(
+        self, number: int, products: Mapping[int, Product]
+    ) -> tuple[int | None, list[int]]:
+        """
+        Parks the active order and makes the parked one called number active. products finds
+        the product of an id. An empty active order isn't worth parking and just goes.
+        Gives back the number of the order that went (None if it got parked), and the ids
+        of products that aren't in the catalogue anymore, those are left out.
+        The products come back in the order they were parked in.
+        """
+        if number == self.active:
+            return None, []
+
+        target = self.parked.pop(number)
+        order = self.engine.order
+        current = order.counts()
+        wanted = target.counts()
+        diff = diff_counts(current, wanted)
+
+        # Products in both keep their place, as long as everything before them is in the
+        # same place too. From the first one that isn't, they're taken out and put back
+        # after, so they end up in the parked order's order
+        kept = [i for i in current if i in wanted]
+        placeable = [i for i in wanted if i in products]
+        same = 0
+        while same < min(len(kept), len(placeable)) and kept[same] == placeable[same]:
+            same += 1
+
+        moved = kept[same:]
+        for i in moved:
+            diff[i] = -current[i]
+
+        dropped = None
+        if order:
+            self.parked[self.active] = ParkedOrder.from_order(
+                self.active, order, self.engine.day
+            )
+        else:
+            dropped = self.active
+
+        self.active = number
+
+        # Out with what isn't wanted first, then whatever was left in can't stop the day
+        # changing, and the new ones go in the order they were added to the parked order
+        missing = self.engine.apply_counts(
+            {i: delta for i, delta in diff.items() if delta < 0}, products
+        )
+        self.engine.set_day(target.day)
+        diff.update((i, wanted[i]) for i in moved)
+        missing += self.engine.apply_counts(
+            {i: diff[i] for i in wanted if diff.get(i, 0) > 0}, products
+        )
+        return dropped, missing
+
+    def drop(self, number: int):
+        """Throws away a parked order"""
+        del self.parked[number]
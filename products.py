@@ -0,0 +1,354 @@
+##
+# products.py
+# 2026-10-18
+# The products the shop sells, without any Qt in sight.
+
+# KaiUI - A cool little shop made for an assignment
+# Copyright (C) 2023  Sofia
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from enum import Flag, Enum, auto
+import hashlib
+import sys
+
+
+class SushiType(Enum):
+    PIECES = auto()
+    BOWL = auto()
+
+
+class ProductAttribute(Flag):
+    NONE = auto()
+    VEGAN = auto()
+    VEGETARIAN = auto()
+    HAS_SUGAR = auto()
+
+
+class Day(Enum):
+    MONDAY = auto()
+    TUESDAY = auto()
+    WEDNESDAY = auto()
+    THURSDAY = auto()
+    FRIDAY = auto()
+    SATURDAY = auto()
+    SUNDAY = auto()
+
+    @classmethod
+    def name(cls, day):
+        return cls._names.get(day, "Unknown")
+
+    @classmethod
+    def from_name(cls, name):
+        """The opposite of Day.name, gives None if it isn't a day"""
+        return cls._days_by_name.get(name)
+
+    @classmethod
+    @property
+    def name_dict(cls):
+        # Same dict every time, please dont change it
+        return cls._names
+
+
+# These are made once here and not in the methods because Day.name gets called a lot.
+# They can't go in the class body or they'd become members of the enum
+Day._names = {
+    Day.MONDAY: "Monday",
+    Day.TUESDAY: "Tuesday",
+    Day.WEDNESDAY: "Wednesday",
+    Day.THURSDAY: "Thursday",
+    Day.FRIDAY: "Friday",
+    Day.SATURDAY: "Saturday",
+    Day.SUNDAY: "Sunday",
+}
+Day._days_by_name = {name: day for day, name in Day._names.items()}
+
+# The days a product can be ordered on are a bitmask, bit i being the i-th Day
+DAY_BITS = {day: 1 << i for i, day in enumerate(Day)}
+ALL_DAYS = (1 << len(DAY_BITS)) - 1
+
+# Without a day only what can be ordered any day can be ordered
+DAY_BITS[None] = ALL_DAYS
+
+
+def available_on(days: int, day: Day | None) -> bool:
+    """If a product that can be ordered on days (a mask of DAY_BITS) can be on day"""
+    bit = DAY_BITS[day]
+    return days & bit == bit
+
+
+def check_column(column: list, type_: type, message: str):
+    """
+    Does the same check as the setters, but for a whole column at once. Only the distinct
+    types in it get looked at, so it's one pass in C instead of an isinstance per product.
+    """
+    for t in set(map(type, column)):
+        if not issubclass(t, type_):
+            # Only bother finding out where it is when something is wrong
+            row = next(i for i, v in enumerate(column) if not isinstance(v, type_))
+            raise ValueError(f"{message} (row {row})")
+
+
+def product_id(cls: type, name: str) -> int:
+    """
+    The id of the product of type cls with pretty_name name. It comes from the name and not
+    from when the product was made, so it's the same every time the catalogue is loaded, in
+    every process. Fits in a signed 64 bit int.
+    """
+    data = f"{cls.__name__}/{name}".encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little") >> 1
+
+
+class Product:
+    """
+    Products are equal if they have the same id, so the same product from two loads of the
+    catalogue is the same dict key. Which means the name shouldn't change while a product
+    is in a dict.
+    """
+
+    # No __dict__ per product, there can be a lot of them
+    __slots__ = ("_name", "_price", "_attributes", "_id")
+
+    # The days it can be ordered on, as a mask of DAY_BITS. Anything that's only sold on
+    # some days says so here, and the rest of the shop goes by this
+    days = ALL_DAYS
+
+    def __init__(
+        self,
+        name: str,
+        price: float,
+        attributes: ProductAttribute = ProductAttribute.NONE,
+    ):
+        self.attributes = attributes | ProductAttribute.NONE
+        self.name = name
+        self.price = price
+
+    @classmethod
+    def bulk_create(
+        cls,
+        names: list[str],
+        prices: list[float],
+        attributes: list[ProductAttribute] | None = None,
+    ) -> list["Product"]:
+        """
+        Makes a whole list of products from columns, same arguments as __init__ but as lists.
+        The columns are checked all at once instead of going through the setters for every
+        single product, and names are interned so repeated ones share memory.
+        """
+        return list(cls._bulk_new(names, prices, attributes))
+
+    @classmethod
+    def _bulk_new(cls, names, prices, attributes):
+        if attributes is None:
+            attributes = [ProductAttribute.NONE] * len(names)
+
+        if not len(names) == len(prices) == len(attributes):
+            raise ValueError("All columns must be the same length")
+
+        check_column(names, str, "Name must be type string")
+        check_column(prices, float, "Price must be type float")
+        check_column(
+            attributes, ProductAttribute, "Attribute must be type ProductAttribure"
+        )
+
+        # There's only a handful of different attribute combinations, no need to | them all
+        attributes_or_none = {a: a | ProductAttribute.NONE for a in set(attributes)}
+
+        new = cls.__new__
+        for name, price, attrs in zip(map(sys.intern, names), prices, attributes):
+            product = new(cls)
+            product._name = name
+            product._price = price
+            product._attributes = attributes_or_none[attrs]
+            yield product
+
+    @property
+    def id(self) -> int:
+        # Only worked out the first time it's needed, most products never go in a dict
+        try:
+            id_ = self._id
+        except AttributeError:
+            id_ = None
+
+        if id_ is None:
+            # The pretty name, so a bowl and a plate of the same sushi aren't the same
+            id_ = self._id = product_id(type(self), self.pretty_name)
+
+        return id_
+
+    def __hash__(self):
+        # Straight from the slot when it's there, this gets called a lot
+        try:
+            id_ = self._id
+        except AttributeError:
+            id_ = None
+
+        return id_ if id_ is not None else self.id
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+
+        if not isinstance(other, Product):
+            return NotImplemented
+
+        return self.id == other.id
+
+    @property
+    def pretty_name(self):
+        return self.name
+
+    @property
+    def name(self):
+        return self._name
+
+    @name.setter
+    def name(self, new):
+        if not isinstance(new, str):
+            raise ValueError("Name must be type string")
+        self._name = new
+        self._id = None
+
+    @property
+    def price(self):
+        return self._price
+
+    @price.setter
+    def price(self, new):
+        if not isinstance(new, float):
+            raise ValueError("Price must be type float")
+        self._price = new
+
+    @property
+    def attributes(self):
+        return self._attributes
+
+    @attributes.setter
+    def attributes(self, new):
+        if not isinstance(new, ProductAttribute):
+            raise ValueError("Attribute must be type ProductAttribure")
+        self._attributes = new
+
+
+class Sandwich(Product):
+    __slots__ = ()
+
+
+class Sushi(Product):
+    __slots__ = ("type", "pieces")
+
+    def __init__(self, type_: SushiType, *args, pieces: int = 0):
+        super().__init__(*args)
+        self.type = type_
+
+        if self.type is SushiType.PIECES:
+            self.pieces = pieces
+
+    @classmethod
+    def bulk_create(
+        cls,
+        types: list[SushiType],
+        names: list[str],
+        prices: list[float],
+        attributes: list[ProductAttribute] | None = None,
+        pieces: list[int] | None = None,
+    ) -> list["Sushi"]:
+        if pieces is None:
+            pieces = [0] * len(types)
+
+        if not len(types) == len(pieces) == len(names):
+            raise ValueError("All columns must be the same length")
+
+        check_column(types, SushiType, "Type must be type SushiType")
+        check_column(pieces, int, "Pieces must be type int")
+
+        products = []
+        for product, type_, n in zip(
+            cls._bulk_new(names, prices, attributes), types, pieces
+        ):
+            product.type = type_
+            if type_ is SushiType.PIECES:
+                product.pieces = n
+            products.append(product)
+
+        return products
+
+    @property
+    def pretty_name(self):
+        if self.type is SushiType.BOWL:
+            return f"{self.name} bowl"
+        elif self.type is SushiType.PIECES:
+            return f"{self.name} sushi ({self.pieces} pcs)"
+
+
+class Drink(Product):
+    __slots__ = ()
+
+
+class Special(Product):
+    __slots__ = ("_day", "_country")
+
+    def __init__(self, day: Day, country: str, *args):
+        super().__init__(*args)
+        self.day = day
+        self.country = country
+
+    @classmethod
+    def bulk_create(
+        cls,
+        days: list[Day],
+        countries: list[str],
+        names: list[str],
+        prices: list[float],
+        attributes: list[ProductAttribute] | None = None,
+    ) -> list["Special"]:
+        if not len(days) == len(countries) == len(names):
+            raise ValueError("All columns must be the same length")
+
+        check_column(days, Day, "Day must be type Day")
+        check_column(countries, str, "country must be type str")
+
+        products = []
+        for product, day, country in zip(
+            cls._bulk_new(names, prices, attributes), days, map(sys.intern, countries)
+        ):
+            product._day = day
+            product._country = country
+            products.append(product)
+
+        return products
+
+    @property
+    def country(self):
+        return self._country
+
+    @country.setter
+    def country(self, new):
+        if not isinstance(new, str):
+            raise ValueError("country must be type str")
+        self._country = new
+
+    @property
+    def day(self):
+        return self._day
+
+    @day.setter
+    def day(self, new):
+        if not isinstance(new, Day):
+            raise ValueError("Day must be type Day")
+        self._day = new
+
+    @property
+    def days(self):
+        return DAY_BITS[self._day]
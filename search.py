@@ -0,0 +1,331 @@
+##
+# search.py
+# 2026-10-18
+# Finding products by name and filtering them by what's in them, without looking at every one.
+
+# KaiUI - A cool little shop made for an assignment
+# Copyright (C) 2023  Sofia
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Every product gets an id, in the order they were added. Results are python ints used as
+# bitsets, bit i being product i. And-ing two of them is done in C, so filters are basically free.
+
+from array import array
+from collections.abc import Iterator
+from itertools import chain
+import re
+
+from products import ProductAttribute, Day, Product, Special
+
+# Attributes that can be filtered on
+ATTRIBUTES = [
+    ProductAttribute.VEGAN,
+    ProductAttribute.VEGETARIAN,
+    ProductAttribute.HAS_SUGAR,
+]
+
+# How many trigram bitsets to keep around before starting again
+TRIGRAM_CACHE_SIZE = 4096
+
+_NONZERO = re.compile(rb"[^\x00]")
+
+# Which bits are set in every possible byte
+_BYTE_BITS = [
+    tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)
+]
+
+
+def iter_bits(mask: int) -> Iterator[int]:
+    """Every bit that is set, from the lowest up"""
+    data = mask.to_bytes((mask.bit_length() + 7) // 8, "little")
+
+    # Let the regex skip over all the empty bytes, it's a lot faster than a loop
+    for match in _NONZERO.finditer(data):
+        base = match.start() * 8
+        for bit in _BYTE_BITS[data[match.start()]]:
+            yield base + bit
+
+
+class Bitmap:
+    """A bitset that can be grown cheaply one bit at a time, and turned into an int when needed"""
+
+    __slots__ = ("_bytes", "_int")
+
+    def __init__(self):
+        self._bytes = bytearray()
+        self._int = 0
+
+    def set(self, bit: int):
+        idx = bit >> 3
+        if idx >= len(self._bytes):
+            self._bytes.extend(bytes(idx - len(self._bytes) + 1))
+
+        self._bytes[idx] |= 1 << (bit & 7)
+        self._int = None
+
+    def update(self, bits: list[int]):
+        """Sets a lot of bits at once, a lot quicker than set for every one"""
+        if not bits:
+            return
+
+        data = self._bytes
+        size = (max(bits) >> 3) + 1
+        if size > len(data):
+            data.extend(bytes(size - len(data)))
+
+        for bit in bits:
+            data[bit >> 3] |= 1 << (bit & 7)
+        self._int = None
+
+    def __int__(self):
+        if self._int is None:
+            self._int = int.from_bytes(self._bytes, "little")
+
+        return self._int
+
+
+def mask_from_ids(ids) -> int:
+    ids = list(ids)
+    if not ids:
+        return 0
+
+    data = bytearray((max(ids) >> 3) + 1)
+    for i in ids:
+        data[i >> 3] |= 1 << (i & 7)
+
+    return int.from_bytes(data, "little")
+
+
+class ProductIndex:
+    """
+    Trigram index over pretty_name plus bitsets for the attributes and special days/countries.
+    Queries of less than three letters match the start of words instead.
+
+    The trigrams are kept by where they are in the name. A name has the text in it if it has
+    the first trigram somewhere and each of the others one further along, so that can be
+    worked out by and-ing bitsets, without looking at any names.
+    """
+
+    def __init__(self):
+        # id -> (category key, row in that category)
+        self.keys = []
+        self.rows = array("I")
+
+        # Trigram -> {where it is in the name: ids}
+        self.trigrams = {}
+        self.prefixes = {}
+
+        # Trigram lists turned into bitsets, only for the ones that have been searched for.
+        # Keyed by (trigram, where), where being None for anywhere in the name
+        self._trigram_masks = {}
+
+        # Category -> how many of its rows are in the index
+        self.indexed = {}
+
+        self.categories = {}
+        self.attributes = {attribute: Bitmap() for attribute in ATTRIBUTES}
+        self.days = {day: Bitmap() for day in Day}
+        self.countries = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def everything(self) -> int:
+        return (1 << len(self.keys)) - 1
+
+    def add(self, key: str, products: list[Product], first_row: int = 0):
+        """
+        Adds products from a category. first_row is the row of the first one, for when the
+        category already had some.
+        """
+        trigrams = self.trigrams
+        first_id = len(self.keys)
+
+        # The bitsets get their bits set all at once after, collected here by bitset
+        prefixes = {}
+        by_attributes = {}
+        days = {}
+        countries = {}
+
+        for idx, product in enumerate(products, first_id):
+            name = product.pretty_name.casefold()
+
+            for i in range(len(name) - 2):
+                positions = trigrams.get(name[i : i + 3])
+                if positions is None:
+                    positions = trigrams[name[i : i + 3]] = {}
+
+                posting = positions.get(i)
+                if posting is None:
+                    posting = positions[i] = array("I")
+                posting.append(idx)
+
+            # There's only so many one and two letter prefixes, so they're bitsets already
+            for word in name.split():
+                prefixes.setdefault(word[:1], []).append(idx)
+                if len(word) > 1:
+                    prefixes.setdefault(word[:2], []).append(idx)
+
+            by_attributes.setdefault(product.attributes, []).append(idx)
+
+            if isinstance(product, Special):
+                days.setdefault(product.day, []).append(idx)
+                countries.setdefault(product.country, []).append(idx)
+
+        self.keys.extend([key] * len(products))
+        self.rows.extend(range(first_row, first_row + len(products)))
+        self.categories.setdefault(key, Bitmap()).update(
+            range(first_id, len(self.keys))
+        )
+
+        for prefix, ids in prefixes.items():
+            self.prefixes.setdefault(prefix, Bitmap()).update(ids)
+
+        # Checking the flags once per combination, they're slow to and
+        for flags, ids in by_attributes.items():
+            for attribute in ATTRIBUTES:
+                if flags & attribute:
+                    self.attributes[attribute].update(ids)
+
+        for day, ids in days.items():
+            self.days[day].update(ids)
+        for country, ids in countries.items():
+            self.countries.setdefault(country, Bitmap()).update(ids)
+
+        self.indexed[key] = first_row + len(products)
+
+        # New ids might be in any of them
+        self._trigram_masks.clear()
+
+    def catch_up(
+        self, products: dict[str, list[Product]], limit: int | None = None
+    ) -> bool:
+        """
+        Adds whatever in products isn't in the index yet, but no more than limit of them so
+        it can be done a bit at a time. True once everything is in.
+        """
+        for key, category in products.items():
+            first_row = self.indexed.get(key, 0)
+            if first_row >= len(category):
+                continue
+
+            if limit is None:
+                self.add(key, category[first_row:], first_row)
+                continue
+
+            if limit <= 0:
+                return False
+
+            new = category[first_row : first_row + limit]
+            self.add(key, new, first_row)
+            limit -= len(new)
+
+        return self.is_complete(products)
+
+    def is_complete(self, products: dict[str, list[Product]]) -> bool:
+        """Whether everything in products is in the index"""
+        indexed = self.indexed
+        return all(indexed.get(key, 0) >= len(p) for key, p in products.items())
+
+    def trigram_mask(self, trigram: str, where: int | None = None) -> int:
+        """The bitset of the names with trigram at where in them, or anywhere for None"""
+        mask = self._trigram_masks.get((trigram, where))
+        if mask is None:
+            if len(self._trigram_masks) >= TRIGRAM_CACHE_SIZE:
+                self._trigram_masks.clear()
+
+            positions = self.trigrams.get(trigram, {})
+            if where is None:
+                mask = mask_from_ids(chain.from_iterable(positions.values()))
+            else:
+                mask = mask_from_ids(positions.get(where, ()))
+            self._trigram_masks[(trigram, where)] = mask
+
+        return mask
+
+    def match_text(self, text: str, mask: int | None = None) -> int:
+        """
+        The bitset of products with text in their name. If mask is given only the products
+        in it can match, which is a lot less to and with when it's small.
+        """
+        if mask is None:
+            mask = self.everything
+
+        text = text.casefold().strip()
+        if not text or not mask:
+            return mask
+
+        if len(text) < 3:
+            return mask & int(self.prefixes.get(text, Bitmap()))
+
+        trigrams = [text[i : i + 3] for i in range(len(text) - 2)]
+        if any(trigram not in self.trigrams for trigram in trigrams):
+            # Nothing has this bit of the text in it
+            return 0
+
+        if len(trigrams) == 1:
+            return mask & self.trigram_mask(trigrams[0])
+
+        # Every place the text could start, the trigrams that follow have to be right after
+        matches = 0
+        rest = list(enumerate(trigrams[1:], 1))
+        for start in self.trigrams[trigrams[0]]:
+            found = mask & self.trigram_mask(trigrams[0], start)
+            for offset, trigram in rest:
+                if not found:
+                    break
+                found &= self.trigram_mask(trigram, start + offset)
+
+            matches |= found
+
+        return matches
+
+    def query(
+        self,
+        text: str = "",
+        attributes: ProductAttribute | None = None,
+        without: ProductAttribute | None = None,
+        day: Day | None = None,
+        country: str | None = None,
+    ) -> int:
+        """
+        The bitset of products that match everything given. attributes have to all be there,
+        the ones in without can't be. day and country only ever match specials.
+        """
+        mask = self.everything
+
+        # The bitsets first, they're cheap and leave less to and with after
+        for attribute in ATTRIBUTES:
+            if attributes is not None and attributes & attribute:
+                mask &= int(self.attributes[attribute])
+            if without is not None and without & attribute:
+                mask &= ~int(self.attributes[attribute])
+
+        if day is not None:
+            mask &= int(self.days[day])
+
+        if country is not None:
+            mask &= int(self.countries.get(country, Bitmap()))
+
+        return self.match_text(text, mask)
+
+    def category_mask(self, key: str) -> int:
+        return int(self.categories.get(key, Bitmap()))
+
+    def rows_in(self, mask: int, key: str) -> list[int]:
+        """The rows of a category that are in the mask, in order"""
+        rows = self.rows
+        return sorted(rows[i] for i in iter_bits(mask & self.category_mask(key)))
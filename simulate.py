@@ -0,0 +1,831 @@
+##
+# simulate.py
+# 2026-10-18
+# Uses the real window like a busy till would for as long as you want, and says what got slow or leaked.
+
+# KaiUI - A cool little shop made for an assignment
+# Copyright (C) 2023  Sofia
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Usage:
+#   python simulate.py                                  a minute of random clicking, as a table
+#   python simulate.py --duration 3600 --rate 50        an hour of it, 50 things a second
+#   python simulate.py --record session.jsonl           and save what it did
+#   python simulate.py --script session.jsonl --loop    do exactly that again, over and over
+#   python simulate.py --output report.json             the whole report as JSON
+#
+# bench.py times single things in a fresh window. This is for what only shows up after a
+# while: memory that keeps growing, widgets that never get deleted, signals connected
+# twice, the sidebar getting slower the longer the shift goes on.
+#
+# Everything goes through the widgets like a person would: clicking the Add and Remove
+# buttons (or the painted ones in the virtualized lists), switching tabs, typing in the
+# search box, picking a day and clicking Order. Orders really get submitted, to a file in
+# a temporary folder, and the open order really gets journaled there too.
+#
+# A script is JSON Lines, one event per line:
+#   {"event": "add", "category": "drinks", "name": "Cola"}
+#   {"event": "remove", "category": "drinks", "name": "Cola"}
+#   {"event": "burst", "category": "sushi", "clicks": [["add", "Maki bowl"], ["remove", "Maki bowl"]]}
+#   {"event": "tab", "category": "specials"}
+#   {"event": "search", "text": "veg"}
+#   {"event": "day", "day": "Tuesday"}
+#   {"event": "submit"}
+#   {"event": "park"}
+#   {"event": "switch", "order": 2}
+#
+# Products go by their pretty name, a sushi bowl and its pieces have the same plain name.
+#
+# Exits with 1 if anything leaked, so it can run unattended.
+
+import argparse
+import gc
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from collections import Counter
+
+EVENTS = ["add", "remove", "burst", "tab", "search", "day", "submit", "park", "switch"]
+
+# How often each event happens when they're picked at random
+WEIGHTS = {
+    "add": 50,
+    "remove": 15,
+    "burst": 5,
+    "tab": 10,
+    "search": 5,
+    "day": 5,
+    "submit": 10,
+    "park": 3,
+    "switch": 3,
+}
+
+# Events a second, and for how long
+RATE = 20
+DURATION = 60
+
+# Clicks in a burst, like a barcode scanner or someone hammering the button
+BURST = 20
+
+# Seconds between memory samples
+SAMPLE_EVERY = 5
+
+# Types of Python object that grew by more than this count as leaking
+OBJECT_GROWTH = 1000
+
+# Types that come and go with the order and the submitted orders, not leaks
+TRANSIENT_TYPES = {"dict", "list", "tuple", "str", "int", "float", "bytes", "cell"}
+
+
+def weights(text: str) -> dict:
+    """event=weight,event=weight into a dict, on top of the defaults"""
+    result = dict(WEIGHTS)
+    for part in text.split(","):
+        if not part:
+            continue
+
+        event, _, weight = part.partition("=")
+        if event not in EVENTS:
+            raise argparse.ArgumentTypeError(f"unknown event '{event}'")
+        result[event] = float(weight)
+
+    return result
+
+
+def rss_kb() -> int:
+    """How much memory the process uses right now, in KiB"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, IndexError):
+        # Not Linux. This is the peak and not the current, close enough for growth
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def object_counts() -> Counter:
+    gc.collect()
+    return Counter(type(o).__name__ for o in gc.get_objects())
+
+
+def lambdas() -> int:
+    """
+    Lambdas made by ProductInfo still alive, its connections are made of them. Only those,
+    other lambdas come and go with whatever else is running (like the journal's thread)
+    """
+    return sum(
+        1
+        for o in gc.get_objects()
+        if type(o).__name__ == "function"
+        and o.__name__ == "<lambda>"
+        and o.__qualname__.startswith("ProductInfo.")
+    )
+
+
+class RandomSession:
+    """Makes up events from what's on the till right now, so removes remove things that are there"""
+
+    def __init__(self, window, rnd: random.Random, event_weights: dict):
+        self.window = window
+        self.rnd = rnd
+        self.events = [e for e in EVENTS if event_weights.get(e, 0) > 0]
+        self.weights = [event_weights[e] for e in self.events]
+
+        # Categories with something in them
+        self.categories = [key for key, p in window.products.items() if p]
+
+        from products import Day
+
+        self.days = list(Day.name_dict.values())
+
+    def product(self, category: str | None = None):
+        category = category or self.rnd.choice(self.categories)
+        return category, self.rnd.choice(self.window.products[category]).pretty_name
+
+    def in_order(self):
+        if not self.window.order:
+            return self.product()
+
+        from catalogue import CATEGORY_KEYS
+
+        product = self.rnd.choice(list(self.window.order))
+        return CATEGORY_KEYS[type(product)], product.pretty_name
+
+    def __iter__(self):
+        while True:
+            yield self.next()
+
+    def next(self) -> dict:
+        if not self.categories:
+            return {"event": "submit"}
+
+        event = self.rnd.choices(self.events, self.weights)[0]
+
+        if event in ("add", "remove"):
+            category, name = self.product() if event == "add" else self.in_order()
+            return {"event": event, "category": category, "name": name}
+
+        if event == "burst":
+            category = self.rnd.choice(self.categories)
+            clicks = [
+                [
+                    "add" if self.rnd.random() < 0.75 else "remove",
+                    self.product(category)[1],
+                ]
+                for _ in range(BURST)
+            ]
+            return {"event": "burst", "category": category, "clicks": clicks}
+
+        if event == "tab":
+            return {"event": "tab", "category": self.rnd.choice(self.categories)}
+
+        if event == "search":
+            # Half the time the search gets cleared, otherwise the start of a product's name
+            text = ""
+            if self.rnd.random() < 0.5:
+                name = self.product()[1]
+                text = name[: self.rnd.randint(1, min(len(name), 5))]
+            return {"event": "search", "text": text}
+
+        if event == "day":
+            return {"event": "day", "day": self.rnd.choice(self.days)}
+
+        if event == "park":
+            return {"event": "park"}
+
+        if event == "switch":
+            sessions = self.window.order_sessions
+            numbers = list(sessions.parked) or [sessions.active]
+            return {"event": "switch", "order": self.rnd.choice(numbers)}
+
+        return {"event": "submit"}
+
+
+def read_script(path: str, loop: bool):
+    with open(path, encoding="utf-8") as f:
+        events = [json.loads(line) for line in f if line.strip()]
+
+    if not events:
+        return
+
+    while True:
+        yield from events
+        if not loop:
+            return
+
+
+class Simulator:
+    """Does events to a KaiUI through its widgets, and times them"""
+
+    def __init__(self, app, window, metrics):
+        from PySide6 import QtCore, QtTest
+
+        self.QtCore = QtCore
+        self.QtTest = QtTest
+        self.app = app
+        self.window = window
+        self.metrics = metrics
+
+        # (category, pretty name) -> product, for scripts. Not the plain name, a sushi bowl
+        # and its pieces share it. The pretty name is what the id comes from, so it's unique
+        self.by_name = {
+            (key, p.pretty_name): p
+            for key, products in window.products.items()
+            for p in products
+        }
+
+        # Row of every product in its category, for finding its card
+        self.rows = {
+            p: row
+            for products in window.products.values()
+            for row, p in enumerate(products)
+        }
+
+        self.late = 0
+
+    def run(self, events, rate: float, duration: float | None, sample, progress=None):
+        """
+        Does events, rate a second, until there are none left or duration seconds are up.
+        sample() gets called every SAMPLE_EVERY seconds
+        """
+        interval = 1 / rate
+        start = time.perf_counter()
+        due = start
+        next_sample = start + SAMPLE_EVERY
+
+        # Checked before taking the next event, so a script carries on where it stopped
+        events = iter(events)
+        while duration is None or time.perf_counter() - start < duration:
+            event = next(events, None)
+            if event is None:
+                break
+
+            # Keep the event loop going while waiting, timers and all
+            now = time.perf_counter()
+            if now < due:
+                self.idle(due)
+            elif now - due > interval:
+                self.late += 1
+
+            self.do(event)
+            due += interval
+
+            if time.perf_counter() >= next_sample:
+                sample()
+                next_sample += SAMPLE_EVERY
+                if progress is not None:
+                    progress(time.perf_counter() - start)
+
+        return time.perf_counter() - start
+
+    def idle(self, until: float):
+        while True:
+            left = until - time.perf_counter()
+            if left <= 0:
+                return
+
+            self.app.processEvents(
+                self.QtCore.QEventLoop.AllEvents, max(int(left * 1000), 1)
+            )
+            time.sleep(min(left, 0.002))
+
+    def do(self, event: dict):
+        kind = event.get("event")
+        func = getattr(self, f"do_{kind}", None)
+        if func is None:
+            self.metrics.count("sim.unknown_events")
+            return
+
+        start = time.perf_counter()
+        func(event)
+
+        # Whatever got posted (the sidebar update, repaints) is part of how long it took
+        self.app.processEvents()
+        self.metrics.histogram(f"sim.{kind}").record(
+            (time.perf_counter() - start) * 1000
+        )
+        self.metrics.count(f"sim.{kind}")
+
+    def product(self, category: str, name: str):
+        product = self.by_name.get((category, name))
+        if product is None:
+            self.metrics.count("sim.missing_products")
+        return product
+
+    def show_tab(self, category: str):
+        keys = self.window.products_tab_keys
+        if category in keys:
+            self.window.products_tab.setCurrentIndex(keys.index(category))
+
+    def click(self, category: str, product, which: str):
+        """Clicks the product's Add or Remove button, scrolling to it first"""
+        self.show_tab(category)
+        row = self.rows[product]
+        Qt = self.QtCore.Qt
+        window = self.window
+
+        if window.virtualized:
+            model = window.products_models[category]
+            view_row = model.view_row(row)
+            if view_row is None or not model.is_available(product):
+                # Searched away, or a special on the wrong day, there's nothing to click
+                self.metrics.count("sim.blocked_clicks")
+                return
+
+            view = window.products_tab_widgets[category]
+            index = model.index(view_row)
+            view.scrollTo(index)
+            add_rect, remove_rect = window.products_delegate._button_rects(
+                view.visualRect(index)
+            )
+            rect = add_rect if which == "add" else remove_rect
+            self.QtTest.QTest.mouseClick(
+                view.viewport(), Qt.LeftButton, pos=rect.center()
+            )
+            return
+
+        card = window.product_infos[category][row]
+        button = card.add_button if which == "add" else card.remove_button
+        if card.isHidden() or not button.isEnabled():
+            self.metrics.count("sim.blocked_clicks")
+            return
+
+        window.products_tab_widgets[category].ensureWidgetVisible(card)
+        self.QtTest.QTest.mouseClick(button, Qt.LeftButton)
+
+    def do_add(self, event):
+        product = self.product(event["category"], event["name"])
+        if product is not None:
+            self.click(event["category"], product, "add")
+
+    def do_remove(self, event):
+        product = self.product(event["category"], event["name"])
+        if product is not None:
+            self.click(event["category"], product, "remove")
+
+    def do_burst(self, event):
+        # No event loop in between, they all land before the sidebar gets to update
+        for which, name in event["clicks"]:
+            product = self.product(event["category"], name)
+            if product is not None:
+                self.click(event["category"], product, which)
+
+    def do_tab(self, event):
+        self.show_tab(event["category"])
+
+    def do_search(self, event):
+        self.window.search_lineedit.setText(event["text"])
+
+    def do_day(self, event):
+        from products import Day
+
+        day = Day.from_name(event["day"])
+
+        # The window would pop up a message box and wait for someone to close it
+        if day is None or self.window.order_engine.unavailable_on(day):
+            self.metrics.count("sim.blocked_days")
+            return
+
+        combobox = self.window.order_info_day_combobox
+        combobox.setCurrentIndex(combobox.findData(day))
+
+    def do_park(self, event):
+        self.QtTest.QTest.mouseClick(
+            self.window.order_info_new_button, self.QtCore.Qt.LeftButton
+        )
+
+    def do_switch(self, event):
+        idx = self.window._order_tab_index(event["order"])
+        if idx < 0:
+            self.metrics.count("sim.missing_orders")
+            return
+
+        self.window.order_info_orders_tabbar.setCurrentIndex(idx)
+
+    def do_submit(self, event):
+        self.QtTest.QTest.mouseClick(
+            self.window.order_info_order_button, self.QtCore.Qt.LeftButton
+        )
+
+
+class Leaks:
+    """Counts the things that shouldn't keep growing, to compare before and after"""
+
+    def __init__(self, window):
+        from PySide6 import QtCore, QtWidgets
+
+        self.QtCore = QtCore
+        self.QtWidgets = QtWidgets
+        self.window = window
+
+    def flush(self):
+        # Widgets that were deleteLater'd only really go once the deferred deletes run
+        app = self.QtWidgets.QApplication.instance()
+        app.processEvents()
+        app.sendPostedEvents(None, self.QtCore.QEvent.DeferredDelete)
+        app.processEvents()
+
+    def connections(self) -> dict:
+        """Receivers of the signals the window connects to, by what they are"""
+        clicked = self.QtCore.SIGNAL("clicked()")
+        window = self.window
+
+        buttons = Counter()
+        doubled = 0
+        for cards in window.product_infos.values():
+            for card in cards:
+                for button in (card.add_button, card.remove_button):
+                    n = button.receivers(clicked)
+                    buttons[n] += 1
+                    doubled += n > 1
+
+        return {
+            "card_buttons": sum(n * count for n, count in buttons.items()),
+            "card_buttons_connected_more_than_once": doubled,
+            "order_button": window.order_info_order_button.receivers(clicked),
+            "day_combobox": window.order_info_day_combobox.receivers(
+                self.QtCore.SIGNAL("currentIndexChanged(int)")
+            ),
+            "search": window.search_lineedit.receivers(
+                self.QtCore.SIGNAL("textChanged(QString)")
+            ),
+            "delegate_add": window.products_delegate.receivers(
+                self.QtCore.SIGNAL("add_clicked(PyObject)")
+            ),
+            "order_observers": len(window.order_engine._observers),
+            "day_observers": len(window.order_engine._day_observers),
+            "lambdas": lambdas(),
+        }
+
+    def snapshot(self) -> dict:
+        self.flush()
+        window = self.window
+        return {
+            "widgets": len(self.QtWidgets.QApplication.allWidgets()),
+            "cards": sum(len(cards) for cards in window.product_infos.values()),
+            "order_rows": window.order_info_order_listwidget.count(),
+            "order_items": len(window.order_items),
+            "order_lines": len(window.order),
+            "connections": self.connections(),
+            "objects": object_counts(),
+        }
+
+    @staticmethod
+    def compare(before: dict, after: dict) -> dict:
+        """What grew, ignoring what's meant to grow with the order"""
+        found = {}
+
+        # New cards are allowed, the sidebar rows are items and not widgets
+        extra = (
+            after["widgets"] - before["widgets"] - (after["cards"] - before["cards"])
+        )
+        if extra > 0:
+            found["widgets"] = extra
+
+        # A row without an order line, or a line without a row
+        if after["order_rows"] != after["order_lines"]:
+            found["order_rows"] = after["order_rows"] - after["order_lines"]
+        if after["order_items"] != after["order_lines"]:
+            found["order_items"] = after["order_items"] - after["order_lines"]
+
+        for name, n in after["connections"].items():
+            grew = n - before["connections"].get(name, 0)
+            if name in ("card_buttons", "lambdas"):
+                # Two per new card is what they should have
+                grew -= 2 * (after["cards"] - before["cards"])
+            if grew > 0:
+                found[f"connections.{name}"] = grew
+
+        if after["connections"]["card_buttons_connected_more_than_once"]:
+            found["connections.card_buttons_connected_more_than_once"] = after[
+                "connections"
+            ]["card_buttons_connected_more_than_once"]
+
+        objects = {}
+        for name, n in (after["objects"] - before["objects"]).most_common():
+            if n < OBJECT_GROWTH:
+                break
+            if name not in TRANSIENT_TYPES:
+                objects[name] = n
+        if objects:
+            found["objects"] = objects
+
+        return found
+
+
+def make_window(args, folder: str):
+    import bench
+    import catalogue
+    import journal
+    import main
+    import metrics
+    import submit
+
+    if args.catalogue:
+        products = {key: [] for key in main.KaiUI.ACCEPTABLE_KEYS}
+        loaded, errors = catalogue.load(args.catalogue)
+        for error in errors:
+            print(f"simulate: {error}", file=sys.stderr)
+        for key, more in loaded.items():
+            products[key].extend(more)
+    else:
+        products = bench.make_products(args.products, args.seed)
+
+    size = sum(map(len, products.values()))
+    virtualized = args.virtualized
+    if virtualized is None:
+        virtualized = size > main.VIRTUALIZE_OVER
+
+    shop_metrics = metrics.Metrics()
+    submitter = submit.SubmissionQueue(
+        submit.JournalSink(os.path.join(folder, "orders.jsonl"))
+    )
+    order_journal = None
+    if not args.no_journal:
+        order_journal = journal.OrderJournal(os.path.join(folder, "orders.wal"))
+
+    window = main.KaiUI(
+        products,
+        virtualized=virtualized,
+        submitter=submitter,
+        order_journal=order_journal,
+        metrics=shop_metrics,
+    )
+    return window, shop_metrics, submitter, order_journal
+
+
+def simulate(args) -> dict:
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+    from PySide6 import QtWidgets
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+    with tempfile.TemporaryDirectory(prefix="kai-simulate-") as folder:
+        window, shop_metrics, submitter, order_journal = make_window(args, folder)
+        window.show()
+
+        # Every tab built and the search index made, so the baseline has them all
+        # and building them doesn't look like a leak
+        for key in window.ACCEPTABLE_KEYS:
+            window.build_tab(key)
+        window.search_lineedit.setText("a")
+        window.search_lineedit.setText("")
+
+        # Made the first time an order is sent
+        window.statusBar()
+        app.processEvents()
+
+        simulator = Simulator(app, window, shop_metrics)
+        leaks = Leaks(window)
+
+        if args.script:
+            events = read_script(args.script, args.loop)
+        else:
+            events = RandomSession(window, random.Random(args.seed), args.weights)
+
+        recording = None
+        if args.record:
+            recording = open(args.record, "w", encoding="utf-8")
+            events = record(events, recording)
+
+        # The warm up and the real run share it, so a script doesn't start over
+        events = iter(events)
+
+        # Warm up first, caches filling up and Qt making things the first time they're
+        # needed aren't leaks
+        if args.warmup:
+            simulator.run(events, args.rate * 4, args.warmup, lambda: None)
+
+        before = leaks.snapshot()
+        samples = []
+
+        def sample():
+            samples.append(
+                {
+                    "s": round(time.perf_counter() - started, 1),
+                    "rss_kb": rss_kb(),
+                    "widgets": len(QtWidgets.QApplication.allWidgets()),
+                    "order_lines": len(window.order),
+                }
+            )
+
+        def progress(elapsed):
+            if not args.quiet:
+                last = samples[-1]
+                print(
+                    f"simulate: {elapsed:.0f}s, {last['rss_kb'] / 1024:.1f} MB, "
+                    f"{last['widgets']} widgets, {last['order_lines']} lines",
+                    file=sys.stderr,
+                )
+
+        # Only what happens from here on goes in the report. Counting every object just
+        # now would look like the event loop stalled too
+        shop_metrics.reset()
+        simulator.late = 0
+        window.stall_monitor.elapsed.restart()
+
+        started = time.perf_counter()
+        sample()
+        elapsed = simulator.run(events, args.rate, args.duration, sample, progress)
+        sample()
+
+        if recording is not None:
+            recording.close()
+
+        # Before anything else, counting objects for the leaks would look like a stall
+        snapshot = shop_metrics.snapshot()
+
+        after = leaks.snapshot()
+        found = Leaks.compare(before, after)
+
+        submitter.close(timeout=10)
+        if order_journal is not None:
+            order_journal.close()
+
+        # Closing the window should take every widget it made with it
+        window.deleteLater()
+        leaks.flush()
+        left = len(QtWidgets.QApplication.allWidgets())
+        if left:
+            found["widgets_after_close"] = left
+
+    histograms = snapshot["histograms"]
+    report = {
+        "seconds": elapsed,
+        "virtualized": simulator.window.virtualized,
+        "events": {
+            name[len("sim.") :]: summary
+            for name, summary in histograms.items()
+            if name.startswith("sim.")
+        },
+        "slots": {
+            name: summary
+            for name, summary in histograms.items()
+            if not name.startswith("sim.")
+        },
+        "counters": snapshot["counters"],
+        "late_events": simulator.late,
+        "submitted": submitter.stats(),
+        "memory": {
+            "start_kb": samples[0]["rss_kb"],
+            "end_kb": samples[-1]["rss_kb"],
+            "peak_kb": max(s["rss_kb"] for s in samples),
+            "growth_kb": samples[-1]["rss_kb"] - samples[0]["rss_kb"],
+            "samples": samples,
+        },
+        "before": {k: v for k, v in before.items() if k != "objects"},
+        "after": {k: v for k, v in after.items() if k != "objects"},
+        "leaks": found,
+    }
+    return report
+
+
+def record(events, f):
+    """Passes events on, writing each one to f first"""
+    for event in events:
+        f.write(json.dumps(event) + "\n")
+        yield event
+
+
+def print_report(report: dict):
+    print(
+        f"{report['seconds']:.1f}s, "
+        f"{'virtualized' if report['virtualized'] else 'widgets'}, "
+        f"{report['late_events']} events late\n"
+    )
+    print(
+        f"{'event':<34} {'count':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+        f"{'max ms':>9}"
+    )
+    for group in ("events", "slots"):
+        for name, h in sorted(report[group].items()):
+            if not h["count"]:
+                continue
+            print(
+                f"{name:<34} {h['count']:>7} {h['p50_ms']:>8} {h['p95_ms']:>8} "
+                f"{h['p99_ms']:>8} {h['max_ms']:>9.2f}"
+            )
+
+    memory = report["memory"]
+    print(
+        f"\nmemory: {memory['start_kb'] / 1024:.1f} MB -> {memory['end_kb'] / 1024:.1f} MB "
+        f"(peak {memory['peak_kb'] / 1024:.1f} MB, "
+        f"{memory['growth_kb'] / 1024:+.1f} MB)"
+    )
+
+    counters = report["counters"]
+    print(
+        f"stalls: {counters.get('event_loop_stalls', 0)} "
+        f"({counters.get('event_loop_stalled_ms', 0)} ms)"
+    )
+    submitted = report["submitted"]
+    print(
+        f"orders: {submitted['submitted']} submitted, {submitted['written']} written, "
+        f"{submitted['rejected']} rejected, {submitted['failed']} failed"
+    )
+    print(
+        f"widgets: {report['before']['widgets']} -> {report['after']['widgets']}, "
+        f"lambdas: {report['before']['connections']['lambdas']} -> "
+        f"{report['after']['connections']['lambdas']}"
+    )
+
+    if report["leaks"]:
+        print("\nleaks:")
+        for name, value in report["leaks"].items():
+            print(f"  {name}: {value}")
+    else:
+        print("\nno leaks")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Uses KaiUI offscreen for a while and reports latency and leaks"
+    )
+    parser.add_argument(
+        "--products",
+        type=int,
+        default=200,
+        help="size of the made up catalogue (default: %(default)s)",
+    )
+    parser.add_argument("--catalogue", help="use this catalogue file instead")
+    parser.add_argument(
+        "--virtualized",
+        action=argparse.BooleanOptionalAction,
+        help="force virtualized tabs on or off, by default it's the same as the shop",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=RATE,
+        help="events a second (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=DURATION,
+        help="seconds to run for, 0 for until the script runs out (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--warmup",
+        type=float,
+        default=5,
+        help="seconds of events before the baseline is taken (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--weights",
+        type=weights,
+        default=WEIGHTS,
+        help="how often each event happens, like add=50,submit=0 (default: %s)"
+        % ",".join(f"{e}={w}" for e, w in WEIGHTS.items()),
+    )
+    parser.add_argument("--seed", type=int, default=0, help="for the random events")
+    parser.add_argument("--script", help="JSON Lines of events to do instead")
+    parser.add_argument(
+        "--loop", action="store_true", help="start the script over when it runs out"
+    )
+    parser.add_argument("--record", help="write the events that got done here")
+    parser.add_argument(
+        "--no-journal", action="store_true", help="don't journal the open order"
+    )
+    parser.add_argument("--output", help="write the report here as JSON")
+    parser.add_argument(
+        "--quiet", action="store_true", help="no progress while it's running"
+    )
+    args = parser.parse_args()
+
+    if args.duration <= 0:
+        if not args.script or args.loop:
+            parser.error("--duration 0 only makes sense with a --script that ends")
+        args.duration = None
+
+    report = simulate(args)
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+
+    if report["leaks"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,435 @@
+##
+# snapshot.py
+# 2026-10-18
+# A compiled, binary copy of the catalogue that can be memory mapped instead of parsed.
+
+# KaiUI - A cool little shop made for an assignment
+# Copyright (C) 2023  Sofia
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Layout of the file, everything little endian:
+#   header          see HEADER below
+#   category ends   u32 per category, in CATEGORY_CLASSES order. Products are sorted by category
+#   name            u32 per product, index into the string table
+#   price           f64 per product
+#   attributes      u8 per product, ProductAttribute value
+#   sushi type      u8 per product, SushiType value or 0
+#   pieces          u32 per product
+#   day             u8 per product, Day value or 0
+#   country         u32 per product, index into the string table or NO_STRING
+#   string offsets  u32 per string plus one for the end
+#   string blob     all the strings, utf-8, one after the other
+# Every section starts on an 8 byte boundary so the columns can be cast straight from the map.
+
+from collections.abc import MutableSequence
+import mmap
+import os
+import struct
+import sys
+
+from products import (
+    SushiType,
+    ProductAttribute,
+    Day,
+    Product,
+    Sushi,
+    Special,
+    ALL_DAYS,
+    DAY_BITS,
+)
+from catalogue import CATEGORY_CLASSES
+
+MAGIC = b"KAIS"
+VERSION = 1
+
+# magic, version, source size, source mtime (ns), products, strings, string blob size
+HEADER = struct.Struct("<4sIQQIII")
+
+NO_STRING = 0xFFFFFFFF
+
+# Extension added to the catalogue file's name to get the snapshot's
+SUFFIX = ".kaisnap"
+
+# (name, struct format) of every column, in the order they are in the file
+COLUMNS = [
+    ("name", "I"),
+    ("price", "d"),
+    ("attributes", "B"),
+    ("sushi_type", "B"),
+    ("pieces", "I"),
+    ("day", "B"),
+    ("country", "I"),
+]
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def path_for(source: str) -> str:
+    return source + SUFFIX
+
+
+def _pad(size: int) -> int:
+    return -size % 8
+
+
+def write(path: str, products: dict[str, list[Product]], source: os.stat_result):
+    """
+    Compiles the products into a snapshot at path. source is the os.stat of the catalogue
+    from before it was read, its size and mtime get stored so the snapshot can tell when
+    the catalogue has changed since. If it changed while it was being read, that's since.
+    Written to a temporary file first, a half written snapshot should never be loaded.
+    """
+    strings = {}
+
+    def string_index(s):
+        # Same string, same index
+        return strings.setdefault(s, len(strings))
+
+    columns = {name: [] for name, _ in COLUMNS}
+    category_ends = []
+
+    for key in CATEGORY_CLASSES:
+        for p in products.get(key, []):
+            columns["name"].append(string_index(p.name))
+            columns["price"].append(p.price)
+            columns["attributes"].append(p.attributes.value)
+
+            if isinstance(p, Sushi):
+                columns["sushi_type"].append(p.type.value)
+                columns["pieces"].append(getattr(p, "pieces", 0))
+            else:
+                columns["sushi_type"].append(0)
+                columns["pieces"].append(0)
+
+            if isinstance(p, Special):
+                columns["day"].append(p.day.value)
+                columns["country"].append(string_index(p.country))
+            else:
+                columns["day"].append(0)
+                columns["country"].append(NO_STRING)
+
+        category_ends.append(len(columns["name"]))
+
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = [0]
+    for s in encoded:
+        offsets.append(offsets[-1] + len(s))
+
+    n = len(columns["name"])
+
+    sections = [
+        struct.pack(f"<{len(category_ends)}I", *category_ends),
+        *(struct.pack(f"<{n}{fmt}", *columns[name]) for name, fmt in COLUMNS),
+        struct.pack(f"<{len(offsets)}I", *offsets),
+        b"".join(encoded),
+    ]
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(
+            HEADER.pack(
+                MAGIC,
+                VERSION,
+                source.st_size,
+                source.st_mtime_ns,
+                n,
+                len(encoded),
+                offsets[-1],
+            )
+        )
+        f.write(b"\0" * _pad(HEADER.size))
+
+        for section in sections:
+            f.write(section)
+            f.write(b"\0" * _pad(len(section)))
+
+    os.replace(tmp, path)
+
+
+class Snapshot:
+    """
+    A memory mapped snapshot. Nothing gets read until it's asked for, products included,
+    so opening one costs the same no matter how big the catalogue is.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            try:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Can't map an empty file
+                raise SnapshotError(f"{path} is empty")
+
+        if len(self._map) < HEADER.size:
+            raise SnapshotError(f"{path} is too short")
+
+        (
+            magic,
+            version,
+            self.source_size,
+            self.source_mtime_ns,
+            self.size,
+            n_strings,
+            blob_size,
+        ) = HEADER.unpack_from(self._map)
+
+        if magic != MAGIC or version != VERSION:
+            raise SnapshotError(f"{path} is not a version {VERSION} snapshot")
+
+        # The columns are cast straight from the map, which uses the machine's byte order
+        if sys.byteorder != "little":
+            raise SnapshotError(
+                "snapshots can only be mapped on little endian machines"
+            )
+
+        view = memoryview(self._map)
+        offset = HEADER.size + _pad(HEADER.size)
+
+        def take(fmt, count):
+            nonlocal offset
+            size = struct.calcsize(fmt) * count
+            if offset + size > len(view):
+                raise SnapshotError(f"{path} is truncated")
+
+            section = view[offset : offset + size].cast(fmt)
+            offset += size + _pad(size)
+            return section
+
+        self.category_ends = take("I", len(CATEGORY_CLASSES))
+        self.columns = {name: take(fmt, self.size) for name, fmt in COLUMNS}
+        self._string_offsets = take("I", n_strings + 1)
+        self._strings = take("B", blob_size)
+
+        # Decoded strings, so the same name doesn't get decoded over and over
+        self._string_cache = {}
+
+        # The enums by value, looking them up by calling them is slow
+        self._attributes = {}
+        self._sushi_types = {t.value: t for t in SushiType}
+        self.days = {d.value: d for d in Day}
+
+    def is_fresh(self, source: str) -> bool:
+        """If the catalogue file is still the one this was made from"""
+        try:
+            stat = os.stat(source)
+        except OSError:
+            return False
+
+        return (
+            stat.st_size == self.source_size
+            and stat.st_mtime_ns == self.source_mtime_ns
+        )
+
+    def string(self, idx: int) -> str:
+        s = self._string_cache.get(idx)
+        if s is None:
+            start = self._string_offsets[idx]
+            end = self._string_offsets[idx + 1]
+            s = sys.intern(bytes(self._strings[start:end]).decode("utf-8"))
+            self._string_cache[idx] = s
+
+        return s
+
+    def attributes(self, value: int) -> ProductAttribute:
+        attributes = self._attributes.get(value)
+        if attributes is None:
+            attributes = self._attributes[value] = ProductAttribute(value)
+
+        return attributes
+
+    def day(self, row: int) -> Day | None:
+        return self.days.get(self.columns["day"][row])
+
+    def product(self, category: str, row: int) -> Product:
+        """
+        Makes the product at row (counting from the start of the file, not the category).
+        The columns were checked when the snapshot was written, so the setters get skipped.
+        """
+        cls = CATEGORY_CLASSES[category]
+        columns = self.columns
+
+        p = cls.__new__(cls)
+        p._name = self.string(columns["name"][row])
+        p._price = columns["price"][row]
+        p._attributes = self.attributes(columns["attributes"][row])
+
+        if cls is Sushi:
+            p.type = self._sushi_types[columns["sushi_type"][row]]
+            if p.type is SushiType.PIECES:
+                p.pieces = columns["pieces"][row]
+        elif cls is Special:
+            p._day = self.days[columns["day"][row]]
+            p._country = self.string(columns["country"][row])
+
+        return p
+
+    def categories(self) -> dict[str, "SnapshotProducts"]:
+        """The products dict for KaiUI, every category is a lazy list"""
+        products = {}
+        start = 0
+        for key, end in zip(CATEGORY_CLASSES, self.category_ends):
+            products[key] = SnapshotProducts(self, key, range(start, end))
+            start = end
+
+        return products
+
+
+class SnapshotProducts(MutableSequence):
+    """
+    One category of a snapshot that acts like the list of products it replaces.
+    Products only get made the first time they're asked for, and then kept, so the same
+    row always gives back the same product.
+    """
+
+    def __init__(self, snapshot: Snapshot, key: str, rows: range):
+        self.snapshot = snapshot
+        self.key = key
+
+        # Which row of the snapshot every item is
+        self._rows = rows
+
+        # Products that have been made so far, by index
+        self._made = {}
+
+        # Only once something gets inserted or removed, this becomes a list with either
+        # a product or a row number (for products that havent been made yet) per item
+        self._items = None
+
+    def __len__(self):
+        return len(self._rows) if self._items is None else len(self._items)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+
+        if self._items is not None:
+            item = self._items[idx]
+            if isinstance(item, int):
+                item = self._items[idx] = self.snapshot.product(self.key, item)
+
+            return item
+
+        # Raises the IndexError for us, and makes negative indexes positive
+        row = self._rows[idx]
+        idx = row - self._rows.start
+
+        product = self._made.get(idx)
+        if product is None:
+            product = self._made[idx] = self.snapshot.product(self.key, row)
+
+        return product
+
+    def _unpack(self):
+        """Turns it into a real list, the rows can't just be worked out anymore"""
+        if self._items is None:
+            self._items = [self._made.get(i, row) for i, row in enumerate(self._rows)]
+            self._made = {}
+
+        return self._items
+
+    def __setitem__(self, idx, product):
+        self._unpack()[idx] = product
+
+    def __delitem__(self, idx):
+        del self._unpack()[idx]
+
+    def insert(self, idx, product):
+        self._unpack().insert(idx, product)
+
+    def rows(self) -> list[tuple]:
+        """
+        The rows catalogue.parse_record gave for these products when the snapshot was
+        written, for catalogue.CatalogueTracker. Read off the columns, so the products
+        don't get made
+        """
+        snapshot = self.snapshot
+        columns = {
+            name: column[self._rows.start : self._rows.stop].tolist()
+            for name, column in snapshot.columns.items()
+        }
+        names = list(map(snapshot.string, columns["name"]))
+        attributes = list(map(snapshot.attributes, columns["attributes"]))
+
+        cls = CATEGORY_CLASSES[self.key]
+        if cls is Sushi:
+            types = [snapshot._sushi_types[t] for t in columns["sushi_type"]]
+            return list(
+                zip(types, names, columns["price"], attributes, columns["pieces"])
+            )
+        elif cls is Special:
+            days = [snapshot.days[d] for d in columns["day"]]
+            countries = list(map(snapshot.string, columns["country"]))
+            return list(zip(days, countries, names, columns["price"], attributes))
+
+        return list(zip(names, columns["price"], attributes))
+
+    def limited_days(self, first_row: int = 0) -> dict[int, int]:
+        """
+        Index -> days of the products that can't be ordered every day, for
+        catalogue.DayIndex. Read off the day column, so the products don't get made
+        """
+        cls = CATEGORY_CLASSES[self.key]
+
+        # Only specials have a day of their own, the rest can be ordered whenever
+        # their class says
+        if cls is not Special:
+            if cls.days == ALL_DAYS:
+                return {}
+
+            return dict.fromkeys(range(first_row, len(self)), cls.days)
+
+        if self._items is None:
+            days = self.snapshot.columns["day"][
+                self._rows.start + first_row : self._rows.stop
+            ]
+            limited = {
+                idx: DAY_BITS[self.snapshot.days[value]]
+                for idx, value in enumerate(days.tolist(), first_row)
+            }
+
+            # Ones that have been made might have been changed since
+            for idx, product in self._made.items():
+                if idx >= first_row:
+                    limited[idx] = product.days
+
+            return limited
+
+        limited = {}
+        for idx in range(first_row, len(self._items)):
+            item = self._items[idx]
+            if isinstance(item, int):
+                limited[idx] = DAY_BITS[self.snapshot.day(item)]
+            else:
+                limited[idx] = item.days
+
+        return limited
+
+
+def load(path: str, source: str) -> dict[str, SnapshotProducts] | None:
+    """
+    Gives the products from the snapshot at path, or None if there isn't one that matches
+    the catalogue at source. In that case the catalogue has to be parsed again.
+    """
+    try:
+        snapshot = Snapshot(path)
+    except (OSError, SnapshotError):
+        return None
+
+    if not snapshot.is_fresh(source):
+        return None
+
+    return snapshot.categories()
@@ -0,0 +1,347 @@
+##
+# submit.py
+# 2026-10-18
+# Sending finished orders somewhere, from a background thread so the window never waits on it.
+
+# KaiUI - A cool little shop made for an assignment
+# Copyright (C) 2023  Sofia
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Every order is one line of JSON. Where they go is a sink:
+#   a file path     appended to the file, fsynced once per batch
+#   http://...      POSTed a batch at a time as JSON Lines
+#   unix:/path      written to a unix socket a batch at a time, each batch ending with a
+#                   blank line. The other end answers "ok <count>"
+# order_server.py is a stand-in server for the last two, for testing.
+#
+# The http and socket modules are only imported when they're used. Between them they take
+# longer to import than the rest of the shop, and most tills only ever write to a file.
+
+from collections import deque
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+from products import Day
+from catalogue import CATEGORY_KEYS
+import orders
+
+# How many orders can be waiting before submit starts saying no
+QUEUE_SIZE = 1000
+
+# The most orders written in one go
+BATCH_SIZE = 100
+
+# How long the worker waits for more orders to fill a batch once it has one
+BATCH_WAIT = 0.005
+
+# How many tries a batch gets before it's given up on, and the wait before the first retry
+RETRIES = 5
+RETRY_WAIT = 0.1
+
+# How many of the latest latencies the stats are worked out from
+LATENCY_SAMPLES = 1000
+
+# Put on the queue to tell the worker to stop
+_STOP = object()
+
+
+def order_record(order: orders.Order, day: Day | None) -> dict:
+    """
+    Everything about an order that needs sending, as plain data. It doesn't point back into
+    the order, so the order can be cleared straight after.
+    """
+    return {
+        "id": os.urandom(16).hex(),
+        "created": time.time(),
+        "day": Day.name(day) if day is not None else None,
+        "items": [
+            {
+                "category": CATEGORY_KEYS.get(type(product)),
+                "name": product.name,
+                "pretty_name": product.pretty_name,
+                "product_id": product.id,
+                "price_cents": orders.price_cents(product),
+                "quantity": count,
+            }
+            for product, count in order.items()
+        ],
+        "total_cents": order.total_cents,
+    }
+
+
+def encode(record: dict) -> bytes:
+    return json.dumps(record, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+class JournalSink:
+    """Appends the orders to a file. Nothing is said to be written until it's been fsynced"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def write(self, lines: list[bytes]):
+        if self._file is None:
+            self._file = open(self.path, "ab")
+
+        # One write and one fsync for the whole batch, the fsync is the slow bit
+        self._file.write(b"".join(lines))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class HttpSink:
+    """POSTs each batch to a url as JSON Lines, anything other than a 2xx is a failure"""
+
+    def __init__(self, url: str, timeout: float = 5):
+        import urllib.parse
+
+        self.url = urllib.parse.urlsplit(url)
+        if self.url.scheme != "http":
+            raise ValueError(f"only http urls are supported, not {url!r}")
+
+        self.timeout = timeout
+        self._connection = None
+
+    def write(self, lines: list[bytes]):
+        import http.client
+
+        if self._connection is None:
+            self._connection = http.client.HTTPConnection(
+                self.url.hostname, self.url.port or 80, timeout=self.timeout
+            )
+
+        try:
+            self._connection.request(
+                "POST",
+                self.url.path or "/",
+                body=b"".join(lines),
+                headers={"Content-Type": "application/x-ndjson"},
+            )
+            response = self._connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException) as e:
+            # Start over with a new connection next time
+            self.close()
+            raise OSError(f"couldn't send orders to {self.url.geturl()}: {e}")
+
+        if not 200 <= response.status < 300:
+            raise OSError(
+                f"{self.url.geturl()} said {response.status} {response.reason}"
+            )
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+class UnixSocketSink:
+    """Writes each batch to a unix socket, then waits for it to say how many it got"""
+
+    def __init__(self, path: str, timeout: float = 5):
+        self.path = path
+        self.timeout = timeout
+        self._socket = None
+        self._reader = None
+
+    def write(self, lines: list[bytes]):
+        import socket
+
+        try:
+            if self._socket is None:
+                self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self._socket.settimeout(self.timeout)
+                self._socket.connect(self.path)
+                self._reader = self._socket.makefile("rb")
+
+            self._socket.sendall(b"".join(lines) + b"\n")
+            reply = self._reader.readline()
+        except OSError as e:
+            self.close()
+            raise OSError(f"couldn't send orders to {self.path}: {e}")
+
+        if reply.strip() != f"ok {len(lines)}".encode():
+            self.close()
+            raise OSError(f"{self.path} said {reply!r}")
+
+    def close(self):
+        if self._reader is not None:
+            self._reader.close()
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+            self._reader = None
+
+
+def sink_for(target: str):
+    """Makes the sink for a --submit-to value, see the top of the file"""
+    if target.startswith("http://"):
+        return HttpSink(target)
+
+    if target.startswith("unix:"):
+        return UnixSocketSink(target.removeprefix("unix:"))
+
+    return JournalSink(target)
+
+
+class SubmissionQueue:
+    """
+    Takes orders from the window and hands them to a sink from its own thread, a batch at
+    a time. submit never waits: if the queue is full it just says so.
+    """
+
+    def __init__(
+        self,
+        sink,
+        maxsize: int = QUEUE_SIZE,
+        batch_size: int = BATCH_SIZE,
+        batch_wait: float = BATCH_WAIT,
+    ):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+
+        # (time it was submitted, record)
+        self._queue = queue.Queue(maxsize)
+
+        self.lock = threading.Lock()
+        self.submitted = 0
+        self.written = 0
+        self.rejected = 0
+        self.failed = 0
+        self.batches = 0
+
+        # Seconds from submit until the sink had it, only the latest ones
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+        self._thread = threading.Thread(
+            target=self._run, name="order submission", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, record: dict) -> bool:
+        """Queues an order to be sent. Gives False if there's no room for it"""
+        try:
+            self._queue.put_nowait((time.perf_counter(), record))
+        except queue.Full:
+            with self.lock:
+                self.rejected += 1
+            return False
+
+        with self.lock:
+            self.submitted += 1
+        return True
+
+    @property
+    def depth(self) -> int:
+        """How many orders are waiting to be sent"""
+        return self._queue.qsize()
+
+    def stats(self) -> dict:
+        with self.lock:
+            latencies = sorted(self.latencies)
+            stats = {
+                "depth": self.depth,
+                "submitted": self.submitted,
+                "written": self.written,
+                "rejected": self.rejected,
+                "failed": self.failed,
+                "batches": self.batches,
+            }
+
+        for name, fraction in (("p50", 0.5), ("p95", 0.95), ("max", 1)):
+            stats[f"latency_{name}_ms"] = (
+                latencies[min(int(len(latencies) * fraction), len(latencies) - 1)]
+                * 1000
+                if latencies
+                else None
+            )
+
+        return stats
+
+    def _next_batch(self) -> tuple[list, bool]:
+        """Waits for at least one order, then takes whatever else turns up soon after"""
+        batch = []
+        stop = False
+
+        item = self._queue.get()
+        deadline = time.perf_counter() + self.batch_wait
+
+        while True:
+            if item is _STOP:
+                stop = True
+                break
+
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                break
+
+            try:
+                item = self._queue.get(timeout=max(deadline - time.perf_counter(), 0))
+            except queue.Empty:
+                break
+
+        return batch, stop
+
+    def _write(self, batch: list) -> bool:
+        lines = [encode(record) for _, record in batch]
+        wait = RETRY_WAIT
+
+        for attempt in range(RETRIES):
+            try:
+                self.sink.write(lines)
+                return True
+            except OSError as e:
+                print(f"submit: {e}", file=sys.stderr)
+                if attempt < RETRIES - 1:
+                    time.sleep(wait)
+                    wait *= 2
+
+        return False
+
+    def _run(self):
+        stop = False
+        while not stop:
+            batch, stop = self._next_batch()
+            if not batch:
+                continue
+
+            ok = self._write(batch)
+            done = time.perf_counter()
+
+            with self.lock:
+                self.batches += 1
+                if ok:
+                    self.written += len(batch)
+                    self.latencies.extend(done - submitted for submitted, _ in batch)
+                else:
+                    self.failed += len(batch)
+
+        self.sink.close()
+
+    def close(self, timeout: float | None = None):
+        """Sends what's still queued and stops the thread. Does wait, so not from the window"""
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
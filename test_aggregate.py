@@ -0,0 +1,65 @@
+import json
+import time
+
+import aggregate
+
+
+def record(order_id, day, items):
+    return json.dumps(
+        {
+            "id": order_id,
+            "created": time.time(),
+            "day": day,
+            "items": [
+                {
+                    "category": category,
+                    "name": name,
+                    "product_id": product_id,
+                    "price_cents": cents,
+                    "quantity": quantity,
+                }
+                for product_id, category, name, cents, quantity in items
+            ],
+            "total_cents": sum(item[3] * item[4] for item in items),
+        }
+    ).encode("utf-8")
+
+
+def test_mixed_days_and_categories():
+    aggregator = aggregate.Aggregator(shards=2)
+    try:
+        aggregator.ingest(
+            [
+                record("a", "Monday", [(1, "sushi", "Salmon", 500, 2)]),
+                record("b", None, [(2, None, "Mystery", 300, 1)]),
+                record("c", None, [(1, "sushi", "Salmon", 500, 1)]),
+                record("a", "Monday", [(1, "sushi", "Salmon", 500, 2)]),
+            ]
+        )
+        summary = aggregator.summary()
+    finally:
+        aggregator.close()
+
+    assert summary["orders"] == 3
+    assert summary["duplicates"] == 1
+    assert [day["day"] for day in summary["days"]] == [None, "Monday"]
+
+    no_day = summary["days"][0]
+    assert no_day["orders"] == 2
+    assert {p["product_id"]: p["quantity"] for p in no_day["products"]} == {1: 1, 2: 1}
+
+
+def test_same_name_is_two_products():
+    table = {}
+    aggregate.fold(
+        table,
+        [
+            ("2026-10-18", "Monday", 1, "sushi", "Salmon (8 pieces)", 2, 500),
+            ("2026-10-18", "Monday", 2, "sushi", "Salmon bowl", 1, 650),
+            ("2026-10-18", "Monday", 1, "sushi", "Salmon (8 pieces)", 1, 500),
+        ],
+    )
+
+    bucket = table["2026-10-18", "Monday"]
+    assert bucket[1][:2] == [3, 1500]
+    assert bucket[2][:2] == [1, 650]
@@ -0,0 +1,125 @@
+import os
+
+from products import Day, Drink, Sandwich, Sushi, SushiType
+import journal
+import orders
+
+COLA = Drink("Cola", 2.5)
+HAM = Sandwich("Ham", 6.0)
+PIECES = Sushi(SushiType.PIECES, "Salmon", 8.0, pieces=6)
+BOWL = Sushi(SushiType.BOWL, "Salmon", 12.0)
+
+
+def session(path, events, day=None):
+    """Opens the journal, does events to an engine attached to it and closes it"""
+    order_journal = journal.OrderJournal(str(path))
+    recovered = order_journal.recovered
+
+    engine = orders.OrderEngine()
+    order_journal.attach(engine)
+    if day is not None:
+        engine.set_day(day)
+    engine.apply(events)
+
+    order_journal.close()
+    return recovered
+
+
+def recovered(path):
+    order_journal = journal.OrderJournal(str(path))
+    order_journal.close()
+    return order_journal.recovered
+
+
+def test_replays_what_was_written(tmp_path):
+    path = tmp_path / "orders.wal"
+    assert session(path, [(COLA, 1), (HAM, 2), (PIECES, 1), (BOWL, 3)]) == (None, {})
+
+    day, items = recovered(path)
+    assert day is None
+    assert items == {
+        ("drinks", "Cola"): 1,
+        ("sandwiches", "Ham"): 2,
+        journal.product_key(PIECES): 1,
+        journal.product_key(BOWL): 3,
+    }
+
+
+def test_torn_tail_is_cut_off(tmp_path):
+    path = tmp_path / "orders.wal"
+    session(path, [(COLA, 1), (HAM, 2)])
+    good = os.path.getsize(path)
+    session(path, [(COLA, 5)], day=Day.FRIDAY)
+    assert os.path.getsize(path) > good
+
+    # The second frame only half made it to disk
+    with open(path, "r+b") as f:
+        f.truncate(good + (os.path.getsize(path) - good) // 2)
+
+    day, items = recovered(path)
+    assert day is None
+    assert items == {("drinks", "Cola"): 1, ("sandwiches", "Ham"): 2}
+    assert os.path.getsize(path) == good
+
+    # And it carries on from there
+    session(path, [(HAM, 1)])
+    assert recovered(path) == (None, {("drinks", "Cola"): 1, ("sandwiches", "Ham"): 1})
+
+
+def test_corrupt_frame_is_cut_off(tmp_path):
+    path = tmp_path / "orders.wal"
+    session(path, [(COLA, 1)])
+    good = os.path.getsize(path)
+    session(path, [(HAM, 2)])
+
+    with open(path, "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        last = f.read(1)
+        f.seek(-1, os.SEEK_END)
+        f.write(bytes([last[0] ^ 0xFF]))
+
+    assert recovered(path) == (None, {("drinks", "Cola"): 1})
+    assert os.path.getsize(path) == good
+
+
+def test_clear_starts_a_new_log(tmp_path):
+    path = tmp_path / "orders.wal"
+    order_journal = journal.OrderJournal(str(path))
+    engine = orders.OrderEngine()
+    order_journal.attach(engine)
+
+    engine.apply([(COLA, 1), (HAM, 2)])
+    order_journal.submitted("abc")
+    engine.clear()
+    engine.apply([(BOWL, 1)])
+    order_journal.close()
+
+    reopened = journal.OrderJournal(str(path))
+    reopened.close()
+    assert reopened.recovered == (None, {journal.product_key(BOWL): 1})
+    assert reopened.last_submitted == "abc"
+
+
+def test_keeps_going_when_a_new_log_cant_be_started(tmp_path, monkeypatch):
+    path = tmp_path / "orders.wal"
+    write_atomic = journal._write_atomic
+    fails = [1]
+
+    def flaky(target, data):
+        if target == str(path) and fails[0]:
+            fails[0] -= 1
+            raise OSError("disk full")
+        write_atomic(target, data)
+
+    monkeypatch.setattr(journal, "_write_atomic", flaky)
+
+    order_journal = journal.OrderJournal(str(path), commit_interval=0.01)
+    engine = orders.OrderEngine()
+    order_journal.attach(engine)
+    engine.apply([(COLA, 1)])
+    engine.clear()
+    engine.apply([(HAM, 2)])
+    order_journal.close()
+
+    assert not fails[0]
+    assert recovered(path) == (None, {("sandwiches", "Ham"): 2})
@@ -0,0 +1,121 @@
+from products import Day, Drink, Sandwich, Special, Sushi, SushiType
+import orders
+
+
+def make_products():
+    return [
+        Drink("Cola", 2.5),
+        Drink("Water", 1.0),
+        Sandwich("Ham", 6.0),
+        Sandwich("Cheese", 5.5),
+        Sushi(SushiType.PIECES, "Salmon", 8.0, pieces=6),
+        Sushi(SushiType.BOWL, "Salmon", 12.0),
+        Special(Day.MONDAY, "South Africa", "Potjiekos", 15.0),
+    ]
+
+
+def by_id(products):
+    return {p.id: p for p in products}
+
+
+def test_sushi_sharing_a_name_are_different_products():
+    pieces, bowl = make_products()[4:6]
+    assert pieces.id != bowl.id
+    assert pieces != bowl
+
+
+def test_apply_is_the_same_as_one_at_a_time():
+    cola, water, ham, cheese, *_ = make_products()
+    events = [(cola, 2), (ham, 1), (cola, -1), (water, -3), (cheese, 4), (ham, -5)]
+
+    one_by_one = orders.OrderEngine()
+    for product, delta in events:
+        if delta > 0:
+            one_by_one.add(product, delta)
+        else:
+            one_by_one.remove(product, -delta)
+
+    batched = orders.OrderEngine()
+    heard = []
+    batched.subscribe(heard.append)
+    changes = batched.apply(events)
+
+    assert dict(batched.order.items()) == dict(one_by_one.order.items())
+    assert batched.total_cents == one_by_one.total_cents == 250 + 2200
+    assert list(batched.order) == [cola, cheese]
+
+    # Once at the end, and only the products that changed (ham went in and out again)
+    assert heard == [changes]
+    assert changes == {cola: 1, cheese: 4}
+
+
+def test_apply_skips_what_cant_be_ordered_today():
+    *_, potjiekos = make_products()
+    engine = orders.OrderEngine(Day.TUESDAY)
+
+    assert engine.apply([(potjiekos, 1)]) == {}
+    assert not engine.order
+
+    engine.set_day(Day.MONDAY)
+    engine.apply([(potjiekos, 1)])
+    assert not engine.set_day(Day.TUESDAY)
+    assert engine.day is Day.MONDAY
+
+
+def test_switch_keeps_both_orders():
+    products = make_products()
+    cola, water, ham, cheese, pieces, bowl, potjiekos = products
+    engine = orders.OrderEngine(Day.MONDAY)
+    sessions = orders.OrderSessions(engine)
+
+    engine.apply([(potjiekos, 1), (ham, 2), (pieces, 1)])
+    first = sessions.active
+    total = engine.total_cents
+
+    second = sessions.new()
+    assert sessions.switch(second, by_id(products)) == (None, [])
+    assert not engine.order
+
+    engine.set_day(None)
+    engine.apply([(ham, 1), (bowl, 1), (cola, 3)])
+
+    sessions.switch(first, by_id(products))
+    assert engine.day is Day.MONDAY
+    assert engine.total_cents == total
+
+    # Back in the order they were added, even the ones in both orders
+    assert list(engine.order.items()) == [(potjiekos, 1), (ham, 2), (pieces, 1)]
+
+    sessions.switch(second, by_id(products))
+    assert engine.day is None
+    assert list(engine.order.items()) == [(ham, 1), (bowl, 1), (cola, 3)]
+
+
+def test_switch_from_empty_drops_it():
+    products = make_products()
+    engine = orders.OrderEngine()
+    sessions = orders.OrderSessions(engine)
+
+    second = sessions.new()
+    dropped, _ = sessions.switch(second, by_id(products))
+    assert dropped == 1
+    assert len(sessions) == 1
+
+
+def test_switch_leaves_out_products_that_are_gone():
+    products = make_products()
+    cola, water, *_ = products
+    engine = orders.OrderEngine()
+    sessions = orders.OrderSessions(engine)
+
+    engine.apply([(cola, 1), (water, 2)])
+    second = sessions.new()
+    sessions.switch(second, by_id(products))
+
+    catalogue = by_id(products)
+    del catalogue[water.id]
+    dropped, missing = sessions.switch(1, catalogue)
+
+    assert dropped == second
+    assert missing == [water.id]
+    assert list(engine.order.items()) == [(cola, 1)]
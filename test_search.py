@@ -0,0 +1,139 @@
+import random
+
+from products import Day, Drink, ProductAttribute, Sandwich, Special, Sushi, SushiType
+import search
+
+WORDS = ["salmon", "tuna", "ham", "cheese", "cola", "lemon", "melon", "mango", "nonna"]
+
+ATTRIBUTES = [
+    ProductAttribute.NONE,
+    ProductAttribute.VEGAN | ProductAttribute.VEGETARIAN,
+    ProductAttribute.VEGETARIAN,
+    ProductAttribute.HAS_SUGAR,
+]
+
+
+def make_products(size: int = 300, seed: int = 0) -> dict:
+    rnd = random.Random(seed)
+    days = list(Day)
+    products = {"drinks": [], "sandwiches": [], "sushi": [], "specials": []}
+
+    for i in range(size):
+        name = " ".join(rnd.choices(WORDS, k=rnd.randint(1, 3))) + f" {i}"
+        attributes = rnd.choice(ATTRIBUTES)
+        kind = i % 4
+        if kind == 0:
+            products["drinks"].append(Drink(name, 1.0, attributes))
+        elif kind == 1:
+            products["sandwiches"].append(Sandwich(name, 1.0, attributes))
+        elif kind == 2:
+            type_ = rnd.choice(list(SushiType))
+            products["sushi"].append(Sushi(type_, name, 1.0, attributes, pieces=6))
+        else:
+            country = rnd.choice(["Italy", "Peru"])
+            products["specials"].append(
+                Special(rnd.choice(days), country, name, 1.0, attributes)
+            )
+
+    return products
+
+
+def brute_force(products, text="", attributes=None, without=None, day=None, country=None):
+    """What query should give, by looking at every product"""
+    text = text.casefold().strip()
+    found = set()
+
+    for key, category in products.items():
+        for row, p in enumerate(category):
+            name = p.pretty_name.casefold()
+            if len(text) < 3:
+                if text and not any(word.startswith(text) for word in name.split()):
+                    continue
+            elif text not in name:
+                continue
+
+            if attributes is not None and (p.attributes & attributes) != attributes:
+                continue
+            if without is not None and p.attributes & without:
+                continue
+
+            if day is not None or country is not None:
+                if not isinstance(p, Special):
+                    continue
+                if day is not None and p.day is not day:
+                    continue
+                if country is not None and p.country != country:
+                    continue
+
+            found.add((key, row))
+
+    return found
+
+
+def results(index, products, mask):
+    return {(key, row) for key in products for row in index.rows_in(mask, key)}
+
+
+def test_query_matches_brute_force():
+    products = make_products()
+    index = search.ProductIndex()
+    assert index.catch_up(products)
+
+    queries = [
+        {},
+        {"text": "sal"},
+        {"text": "SALMON"},
+        {"text": "on"},
+        {"text": "m"},
+        {"text": "lemon melon"},
+        {"text": "non"},
+        {"text": "nonna 1"},
+        {"text": "bowl"},
+        {"text": "pcs"},
+        {"text": "zzz"},
+        {"attributes": ProductAttribute.VEGAN},
+        {"text": "ma", "without": ProductAttribute.HAS_SUGAR},
+        {"day": Day.FRIDAY},
+        {"text": "tuna", "day": Day.MONDAY, "country": "Peru"},
+        {"country": "Nowhere"},
+    ]
+    for query in queries:
+        assert results(index, products, index.query(**query)) == brute_force(
+            products, **query
+        ), query
+
+
+def test_catch_up_a_bit_at_a_time():
+    products = make_products(100)
+    index = search.ProductIndex()
+
+    steps = 0
+    while not index.catch_up(products, limit=7):
+        steps += 1
+    assert steps > 1
+    assert len(index) == 100
+
+    for text in ("mel", "ham 4", "co"):
+        assert results(index, products, index.query(text)) == brute_force(
+            products, text
+        )
+
+
+def test_new_rows_get_found():
+    products = make_products(40)
+    index = search.ProductIndex()
+    index.catch_up(products)
+
+    products["drinks"].append(Drink("Ginger beer", 3.0))
+    assert not index.is_complete(products)
+    index.catch_up(products)
+
+    assert index.rows_in(index.query("ginger"), "drinks") == [
+        len(products["drinks"]) - 1
+    ]
+
+
+def test_iter_bits():
+    bits = [0, 7, 8, 9, 63, 64, 1000]
+    assert list(search.iter_bits(search.mask_from_ids(bits))) == bits
+    assert list(search.iter_bits(0)) == []
@@ -0,0 +1,45 @@
+##
+# theme.py
+# 2026-10-18
+# How the shop looks, in one stylesheet that gets set once for the whole app.
+
+# KaiUI - A cool little shop made for an assignment
+# Copyright (C) 2023  Sofia
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Widgets get an object name (or a property) and the stylesheet picks them out by it,
+# instead of every widget having a stylesheet of its own. Qt parses a stylesheet every time
+# one gets set, so with thousands of product cards that adds up.
+
+# Point size of product names. The delegate draws them itself, so it needs the number too
+NAME_POINT_SIZE = 15
+
+STYLESHEET = f"""
+QLabel#product_name {{
+    font-size: {NAME_POINT_SIZE}pt;
+}}
+"""
+
+# Set on the app once the stylesheet is in, so it only goes in once
+_PROPERTY = "kai_theme"
+
+
+def install(app):
+    """Adds the shop's stylesheet to app, keeping whatever stylesheet it had already"""
+    if app.property(_PROPERTY):
+        return
+
+    app.setStyleSheet(app.styleSheet() + STYLESHEET)
+    app.setProperty(_PROPERTY, True)
@@ -0,0 +1,301 @@
+##
+# thumbnails.py
+# 2026-10-18
+# Product photos, decoded and shrunk off the window's thread so scrolling never waits on them.
+
+# KaiUI - A cool little shop made for an assignment
+# Copyright (C) 2023  Sofia
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# The photos live in a folder, one per product: <folder>/<category>/<product name>.png
+# (or .jpg, .jpeg, .webp). There's nowhere in the catalogue to say where a photo is, so the
+# name is all there is to go on. Products without a photo just keep the placeholder.
+#
+# Nothing asks for a photo until it gets painted, and Qt only paints what's on screen, so
+# only the cards that can actually be seen ever get one decoded. Decoding happens in a
+# QThreadPool into a QImage (QPixmaps can only be made on the window's thread), and the
+# result goes in the QPixmapCache, which throws out whatever was used longest ago once it's
+# full. Shrunk copies get saved in a cache folder too, so next time it's a small png to
+# read instead of a big photo to decode.
+
+from collections.abc import Iterable
+import hashlib
+import os
+import threading
+
+from PySide6 import QtCore, QtGui
+
+from catalogue import CATEGORY_KEYS
+from products import Product
+
+EXTENSIONS = [".png", ".jpg", ".jpeg", ".webp"]
+
+# Width and height of a thumbnail in pixels, photos are shrunk to fit keeping their shape
+SIZE = 64
+
+# How much the QPixmapCache can hold in KiB. It's shared by the whole app
+CACHE_KB = 32 * 1024
+
+# Threads decoding at once, more than this and they'd just fight over the disk
+THREADS = 2
+
+# Requests waiting for a thread. Past this the oldest get dropped, they've most likely
+# been scrolled past already, and get asked for again if they're painted again
+MAX_WAITING = 64
+
+
+def image_stem(product: Product) -> str:
+    """Where the photo of a product would be in the folder, without the extension"""
+    category = CATEGORY_KEYS.get(type(product), "other")
+
+    # A slash in a name shouldn't turn into a folder
+    name = product.name.replace("/", "_").replace(os.sep, "_")
+    return os.path.join(category, name)
+
+
+def cache_name(source: str, size: QtCore.QSize) -> str:
+    """
+    The cached thumbnail of source at size. The modification time is part of it, so a
+    changed photo gets a new thumbnail instead of the old one
+    """
+    stat = os.stat(source)
+    key = (
+        f"{os.path.abspath(source)}|{stat.st_mtime_ns}|{stat.st_size}"
+        f"|{size.width()}x{size.height()}"
+    )
+    return hashlib.sha1(key.encode("utf-8")).hexdigest() + ".png"
+
+
+def find_source(folder: str, stem: str) -> str | None:
+    for extension in EXTENSIONS:
+        path = os.path.join(folder, stem + extension)
+        if os.path.isfile(path):
+            return path
+
+    return None
+
+
+def load(
+    folder: str, stem: str, size: QtCore.QSize, cache_dir: str | None
+) -> QtGui.QImage:
+    """
+    The thumbnail for stem, shrunk to fit in size. Gives a null QImage if there's no photo
+    or it can't be read. Safe to call from any thread
+    """
+    source = find_source(folder, stem)
+    if source is None:
+        return QtGui.QImage()
+
+    cached = None
+    if cache_dir is not None:
+        try:
+            cached = os.path.join(cache_dir, cache_name(source, size))
+        except OSError:
+            return QtGui.QImage()
+
+        image = QtGui.QImage(cached)
+        if not image.isNull():
+            return image
+
+    reader = QtGui.QImageReader(source)
+    reader.setAutoTransform(True)
+
+    # Telling the reader the size up front lets jpegs decode straight to it,
+    # which is a lot quicker than decoding the whole photo and shrinking it after
+    original = reader.size()
+    if original.isValid():
+        reader.setScaledSize(original.scaled(size, QtCore.Qt.KeepAspectRatio))
+
+    image = reader.read()
+    if image.isNull():
+        return image
+
+    # Some formats ignore setScaledSize
+    if image.width() > size.width() or image.height() > size.height():
+        image = image.scaled(
+            size, QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation
+        )
+
+    if cached is not None:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp = f"{cached}.{os.getpid()}.{threading.get_ident()}.tmp"
+            if image.save(tmp, "PNG"):
+                os.replace(tmp, cached)
+        except OSError:
+            # Just slower next time
+            pass
+
+    return image
+
+
+class _Signals(QtCore.QObject):
+    # Cache key, image. Emitted from the pool's threads, arrives on the window's
+    decoded = QtCore.Signal(str, QtGui.QImage)
+
+
+class _Decode(QtCore.QRunnable):
+    def __init__(self, signals: _Signals, key: str, folder, stem, size, cache_dir):
+        super().__init__()
+
+        # Kept by the ThumbnailLoader until it's done, so it can still be taken back
+        self.setAutoDelete(False)
+
+        self.signals = signals
+        self.key = key
+        self.args = (folder, stem, size, cache_dir)
+
+    def run(self):
+        self.signals.decoded.emit(self.key, load(*self.args))
+
+
+class ThumbnailLoader(QtCore.QObject):
+    """
+    Gives out thumbnails from the QPixmapCache, and gets the missing ones decoded in the
+    background. Widgets that asked for one that wasn't ready get repainted when it is.
+    """
+
+    def __init__(self, folder: str, *args, cache_dir: str | None = None):
+        """cache_dir is where shrunk copies get saved, None to not save them"""
+        super().__init__(*args)
+        self.folder = folder
+        self.cache_dir = cache_dir
+
+        QtGui.QPixmapCache.setCacheLimit(max(QtGui.QPixmapCache.cacheLimit(), CACHE_KB))
+
+        # Its own pool, so a pile of photos doesn't hold up anything else using the global one
+        self.pool = QtCore.QThreadPool(self)
+        self.pool.setMaxThreadCount(THREADS)
+
+        self._signals = _Signals(self)
+        self._signals.decoded.connect(self._decoded)
+
+        # Cache key -> _Decode still waiting or running, oldest first
+        self._pending = {}
+
+        # Cache key -> widgets to repaint once it's ready
+        self._waiting = {}
+
+        # Cache keys of products that don't have a photo, so they aren't looked for again
+        self._missing = set()
+
+        # Newer requests get a higher priority, the ones just scrolled to matter most
+        self._priority = 0
+
+        # Size -> placeholder pixmap
+        self._placeholders = {}
+
+        # (width, height) of every size asked for, so forget knows which keys there are
+        self._sizes = set()
+
+    @staticmethod
+    def key(product: Product, size: QtCore.QSize) -> str:
+        return f"kai-thumbnail:{image_stem(product)}@{size.width()}x{size.height()}"
+
+    def placeholder(self, size: QtCore.QSize) -> QtGui.QPixmap:
+        pixmap = self._placeholders.get((size.width(), size.height()))
+        if pixmap is None:
+            pixmap = QtGui.QPixmap(size)
+            pixmap.fill(QtGui.QColor(0, 0, 0, 0))
+
+            painter = QtGui.QPainter(pixmap)
+            painter.setRenderHint(QtGui.QPainter.Antialiasing)
+            painter.setPen(QtCore.Qt.NoPen)
+            painter.setBrush(QtGui.QColor(128, 128, 128, 48))
+            painter.drawRoundedRect(QtCore.QRectF(pixmap.rect()), 6, 6)
+            painter.end()
+
+            self._placeholders[(size.width(), size.height())] = pixmap
+
+        return pixmap
+
+    def pixmap(
+        self, product: Product, size: QtCore.QSize, widget=None
+    ) -> QtGui.QPixmap:
+        """
+        The thumbnail of product, or the placeholder if it isn't ready (or there isn't one).
+        If it isn't ready it gets decoded, and widget gets repainted once it is.
+        Only call it from paint code, that's what keeps it to what's on screen.
+        """
+        key = self.key(product, size)
+        self._sizes.add((size.width(), size.height()))
+
+        pixmap = QtGui.QPixmapCache.find(key)
+        if pixmap is not None:
+            return pixmap
+
+        if key in self._missing:
+            return self.placeholder(size)
+
+        if widget is not None:
+            widgets = self._waiting.setdefault(key, [])
+            if widget not in widgets:
+                widgets.append(widget)
+
+        if key not in self._pending:
+            self._request(key, product, size)
+
+        return self.placeholder(size)
+
+    def _request(self, key: str, product: Product, size: QtCore.QSize):
+        if len(self._pending) >= MAX_WAITING:
+            oldest = next(iter(self._pending))
+
+            # Only works if it hasn't started yet, if it has it can just finish
+            if self.pool.tryTake(self._pending[oldest]):
+                del self._pending[oldest]
+                self._waiting.pop(oldest, None)
+
+        task = _Decode(
+            self._signals, key, self.folder, image_stem(product), size, self.cache_dir
+        )
+        self._pending[key] = task
+
+        self._priority += 1
+        self.pool.start(task, self._priority)
+
+    def _decoded(self, key: str, image: QtGui.QImage):
+        self._pending.pop(key, None)
+
+        if image.isNull():
+            self._missing.add(key)
+        else:
+            QtGui.QPixmapCache.insert(key, QtGui.QPixmap.fromImage(image))
+
+        for widget in self._waiting.pop(key, []):
+            try:
+                widget.update()
+            except RuntimeError:
+                # It got deleted while waiting
+                pass
+
+    def forget(self, products: Iterable[Product]):
+        """
+        Throws away the thumbnails of products, and whether they had one, for products that
+        left the catalogue or came into it. The ones on disk stay, they're keyed by
+        modification time anyway
+        """
+        for product in products:
+            for width, height in self._sizes:
+                key = self.key(product, QtCore.QSize(width, height))
+                QtGui.QPixmapCache.remove(key)
+                self._missing.discard(key)
+
+    def close(self):
+        """Drops whatever hasn't started and waits for the rest"""
+        self.pool.clear()
+        self.pool.waitForDone()
+        self._pending.clear()
+        self._waiting.clear()
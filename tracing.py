@@ -0,0 +1,158 @@
+##
+# tracing.py
+# 2026-10-18
+# A startup trace, to see where the time goes before the shop is usable.
+
+# KaiUI - A cool little shop made for an assignment
+# Copyright (C) 2023  Sofia
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# The trace is written in the Chrome trace event format, open it in chrome://tracing or
+# https://ui.perfetto.dev. Nothing is recorded unless KAI_TRACE is set or enable() gets
+# called, main.py does that before its imports when it's started with --trace, so they
+# make it into the trace too. While it's off everything costs one if, which matters for
+# bench.py and simulate.py that import main and would otherwise trace forever.
+
+import functools
+import json
+import os
+import threading
+import time
+
+# Set to a file name to get a trace without passing --trace
+ENV_VAR = "KAI_TRACE"
+
+_EPOCH = time.perf_counter_ns()
+
+_enabled = bool(os.environ.get(ENV_VAR))
+_events = []
+_lock = threading.Lock()
+
+# Threads that have had their name put in the trace
+_named_threads = set()
+
+
+def now() -> int:
+    """Microseconds since tracing was imported, what the trace uses for time"""
+    return (time.perf_counter_ns() - _EPOCH) // 1000
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+    with _lock:
+        _events.clear()
+
+
+def _add(event: dict):
+    thread = threading.current_thread()
+    event["pid"] = os.getpid()
+    event["tid"] = thread.ident
+
+    with _lock:
+        if thread.ident not in _named_threads:
+            _named_threads.add(thread.ident)
+            _events.append(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": event["pid"],
+                    "tid": thread.ident,
+                    "args": {"name": thread.name},
+                }
+            )
+
+        _events.append(event)
+
+
+def complete(name: str, start: int, **args):
+    """Records name as having taken from start (from now()) until now"""
+    if not _enabled:
+        return
+
+    _add({"name": name, "ph": "X", "ts": start, "dur": now() - start, "args": args})
+
+
+def instant(name: str, **args):
+    """Records something that happened at a point in time, like the first paint"""
+    if not _enabled:
+        return
+
+    _add({"name": name, "ph": "i", "s": "p", "ts": now(), "args": args})
+
+
+class span:
+    """
+    Records how long the with block takes:
+        with tracing.span("setup_tab_widget", key=key):
+            ...
+    """
+
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name: str, **args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        if _enabled:
+            self.start = now()
+        return self
+
+    def __exit__(self, *exc):
+        if _enabled:
+            complete(self.name, self.start, **self.args)
+
+
+def traced(func):
+    """
+    Decorator that records every call of func like span does. Simple arguments (strings and
+    numbers) go in the trace too, like the key of setup_tab_widget.
+    """
+
+    @functools.wraps(func)
+    def f(*args, **kwargs):
+        if not _enabled:
+            return func(*args, **kwargs)
+
+        start = now()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            complete(
+                func.__qualname__,
+                start,
+                args=[a for a in args if isinstance(a, (str, int, float))],
+            )
+
+    return f
+
+
+def write(path: str):
+    with _lock:
+        events = list(_events)
+
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)